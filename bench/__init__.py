@@ -0,0 +1,3 @@
+# bench/
+# Benchmarks reprodutíveis sem baixar os arquivos da RFB: dados sintéticos no formato dos ZIPs
+# oficiais (bench.synth) e medições da ingestão (bench.ingest), gravadas em JSON para comparar commits.
@@ -0,0 +1,207 @@
+# bench/ingest.py
+# Benchmark da ingestão sobre dados sintéticos (bench.synth), etapa por etapa:
+#   extract  (extract_tabular_from_zip: ZIP -> CSV UTF-8 em streaming)
+#   parquet  (read_csv_semicolon_to_parquet: CSV -> Parquet)
+#   table    (ensure_table_from_parquet: Parquet -> tabela DuckDB, uma vez por dataset)
+# Para cada escala e etapa: linhas, bytes lidos/gravados, tempo, linhas/s, MB/s e pico de RSS.
+# O resultado vai para JSON (com o commit atual) para comparar regressões entre commits.
+#
+#   python -m bench.ingest --scales 0.0001 0.001 --out bench_ingest.json
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import duckdb
+
+from bench import synth
+from lib import cache, db, loaders
+from lib.schema import DATASETS
+from lib.telemetry import peak_rss
+
+
+# ------------------------------------------------------------------------------
+# Medições
+# ------------------------------------------------------------------------------
+def _size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+
+def _stage(scale: float, dataset: str, stage: str, rows: int, bytes_in: int, bytes_out: int,
+           seconds: float, rss: dict) -> dict:
+    return {
+        "scale": scale, "dataset": dataset, "stage": stage, "rows": rows,
+        "bytes_in": bytes_in, "bytes_out": bytes_out, "seconds": round(seconds, 4),
+        "rows_per_s": round(rows / seconds, 1) if seconds else None,
+        "mb_per_s": round(bytes_in / 2**20 / seconds, 2) if seconds else None,
+        "peak_rss_mb": rss["peak_rss_mb"],
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ------------------------------------------------------------------------------
+# Execução
+# ------------------------------------------------------------------------------
+def run_scale(scale: float, work: Path, datasets: List[str], seed: int = 42, threads: int | None = None) -> List[dict]:
+    """Gera os ZIPs da escala em 'work' e mede as três etapas para cada dataset."""
+    results = []
+    zips = work / "zips"
+    t0 = time.perf_counter()
+    paths = synth.generate(zips, scale, seed, datasets)
+    gen_s = time.perf_counter() - t0
+    results.append({"scale": scale, "dataset": "*", "stage": "generate", "seconds": round(gen_s, 4),
+                    "bytes_out": sum(_size(p) for p in paths)})
+
+    for dataset in datasets:
+        table, keywords = DATASETS[dataset]["table"], DATASETS[dataset]["keywords"]
+        ds_dir = work / "parquet" / dataset
+        ds_dir.mkdir(parents=True, exist_ok=True)
+        rows_total = 0
+        for zip_path in sorted(p for p in paths if p.stem.rstrip("0123456789") == DATASETS[dataset]["rfb_file"]):
+            csv_path = work / f"{zip_path.stem}.utf8.csv"
+            with peak_rss() as rss:
+                t0 = time.perf_counter()
+                loaders.extract_tabular_from_zip(zip_path, prefer_keywords=keywords, out_path=csv_path)
+                secs = time.perf_counter() - t0
+            csv_bytes = _size(csv_path)
+            with peak_rss() as rss_pq:
+                t0 = time.perf_counter()
+                pq_path = loaders.read_csv_semicolon_to_parquet(
+                    csv_path, dataset, encoding="utf-8", out_path=ds_dir / f"{zip_path.stem}.parquet", threads=threads,
+                )
+                secs_pq = time.perf_counter() - t0
+            rows = loaders.parquet_rows(pq_path)
+            rows_total += rows
+            results.append(_stage(scale, f"{dataset}/{zip_path.stem}", "extract", rows, _size(zip_path),
+                                  csv_bytes, secs, rss))
+            results.append(_stage(scale, f"{dataset}/{zip_path.stem}", "parquet", rows, csv_bytes,
+                                  loaders.parquet_bytes(pq_path), secs_pq, rss_pq))
+            csv_path.unlink(missing_ok=True)
+
+        db_before = _size(Path(db.DB_PATH))
+        with peak_rss() as rss:
+            t0 = time.perf_counter()
+            loaders.ensure_table_from_parquet(table, ds_dir, replace=True)
+            secs = time.perf_counter() - t0
+        with db.writer() as con:
+            con.execute("CHECKPOINT")
+        results.append(_stage(scale, dataset, "table", rows_total, loaders.parquet_bytes(ds_dir),
+                              _size(Path(db.DB_PATH)) - db_before, secs, rss))
+    return results
+
+
+def _totals(results: List[dict]) -> List[dict]:
+    """Soma por escala e etapa (todas as partes e datasets)."""
+    acc: dict = {}
+    for r in results:
+        if r["stage"] == "generate":
+            continue
+        t = acc.setdefault((r["scale"], r["stage"]), {
+            "scale": r["scale"], "stage": r["stage"], "rows": 0, "bytes_in": 0, "bytes_out": 0,
+            "seconds": 0.0, "peak_rss_mb": 0.0,
+        })
+        for k in ("rows", "bytes_in", "bytes_out", "seconds"):
+            t[k] += r[k]
+        t["peak_rss_mb"] = max(t["peak_rss_mb"], r["peak_rss_mb"])
+    for t in acc.values():
+        t["seconds"] = round(t["seconds"], 4)
+        t["rows_per_s"] = round(t["rows"] / t["seconds"], 1) if t["seconds"] else None
+        t["mb_per_s"] = round(t["bytes_in"] / 2**20 / t["seconds"], 2) if t["seconds"] else None
+    return list(acc.values())
+
+
+def run(
+    scales: List[float],
+    datasets: List[str] | None = None,
+    out: str | Path | None = None,
+    workdir: str | Path | None = None,
+    seed: int = 42,
+    threads: int | None = None,
+    keep: bool = False,
+) -> dict:
+    """
+    Roda o benchmark em cada escala, cada uma num diretório e banco DuckDB próprios (o banco e o
+    cache do app em data/ não são tocados), e grava o relatório JSON em 'out' (se informado).
+    """
+    datasets = datasets or list(DATASETS)
+    base = Path(workdir or tempfile.mkdtemp(prefix="cnpj_bench_"))
+    report = {
+        "meta": {
+            "benchmark": "ingest",
+            "commit": git_commit(),
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "engine": loaders.INGEST_ENGINE,
+            "schema_mode": loaders.SCHEMA_MODE,
+            "partitioned": loaders.PARTITIONED_STORAGE,
+            "seed": seed,
+            "threads": threads,
+        },
+        "results": [],
+    }
+    version_path = cache.VERSION_PATH
+    try:
+        for scale in scales:
+            work = base / f"scale_{scale:g}"
+            shutil.rmtree(work, ignore_errors=True)
+            work.mkdir(parents=True)
+            db.configure(path=work / "bench.duckdb")
+            cache.VERSION_PATH = work / "dataset_version"
+            report["results"] += run_scale(scale, work, datasets, seed, threads)
+            db.close()
+            if not keep:
+                shutil.rmtree(work, ignore_errors=True)
+    finally:
+        cache.VERSION_PATH = version_path
+        db.configure(path=loaders.DB_PATH)
+        if not keep and workdir is None:
+            shutil.rmtree(base, ignore_errors=True)
+    report["totals"] = _totals(report["results"])
+    if out:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        Path(out).write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+    return report
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Benchmark da ingestão (ZIP -> CSV -> Parquet -> DuckDB).")
+    ap.add_argument("--scales", nargs="+", type=float, default=[0.0001, 0.001])
+    ap.add_argument("--datasets", nargs="*", choices=list(DATASETS))
+    ap.add_argument("--out", default="bench_ingest.json")
+    ap.add_argument("--workdir", help="diretório de trabalho (padrão: temporário)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--threads", type=int, help="threads do DuckDB na conversão")
+    ap.add_argument("--keep", action="store_true", help="mantém ZIPs, Parquets e bancos gerados")
+    args = ap.parse_args(argv)
+    report = run(args.scales, args.datasets, args.out, args.workdir, args.seed, args.threads, args.keep)
+    for t in report["totals"]:
+        print(f"escala {t['scale']:g} {t['stage']:8s} {t['rows']:>12,} linhas {t['seconds']:9.2f}s "
+              f"{t['rows_per_s'] or 0:>14,.0f} linhas/s {t['mb_per_s'] or 0:8.1f} MB/s pico {t['peak_rss_mb']:.0f} MB")
+    print(f"relatório: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
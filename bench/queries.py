@@ -0,0 +1,240 @@
+# bench/queries.py
+# Benchmark das consultas das páginas (lib/queries) sobre bancos sintéticos (bench.synth) de vários tamanhos.
+# Cada cenário roda como a página roda: primeira página (lib.loaders.page_sql: ORDER BY chave LIMIT n + 1)
+# mais a contagem limitada (count_sql); o relatório roda as suas quatro consultas.
+#   frio:   banco reaberto antes de cada execução (buffers do DuckDB vazios; o cache do SO não é limpo)
+#   quente: execuções repetidas na mesma instância
+# O cache de resultados do app (lib/cache) fica de fora: as consultas vão direto ao DuckDB.
+# Por cenário: p50/p95/p99 da latência, linhas varridas e tempo de CPU (profiling JSON do DuckDB),
+# linhas devolvidas e pico de RSS. O relatório vai para JSON, como em bench.ingest.
+#
+#   python -m bench.queries --scales 0.0005 0.005 --runs 20 --out bench_queries.json
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import duckdb
+
+from bench import ingest
+from lib import cache, db, derived, loaders, queries, search
+from lib.schema import DATASETS
+
+Statement = Tuple[str, list]
+
+
+# ------------------------------------------------------------------------------
+# Cenários
+# ------------------------------------------------------------------------------
+def _paged(consulta: Tuple[str, list, List[str]]) -> List[Statement]:
+    """O que a página executa ao buscar: a primeira página e a contagem total limitada."""
+    sql, params, key = consulta
+    return [loaders.page_sql(sql, params, key), (loaders.count_sql(sql), list(params))]
+
+
+def _amostra(con: duckdb.DuckDBPyConnection) -> dict:
+    """Valores reais do banco para os filtros (CNPJ do meio da tabela, CNAE mais comum)."""
+    n = con.execute("SELECT COUNT(*) FROM estabelecimentos").fetchone()[0]
+    cnpj14 = con.execute("SELECT cnpj14 FROM estabelecimentos ORDER BY cnpj14 LIMIT 1 OFFSET ?", (n // 2,)).fetchone()[0]
+    cnae = con.execute(
+        "SELECT cnae FROM estabelecimento_cnae GROUP BY cnae ORDER BY COUNT(*) DESC, cnae LIMIT 1"
+    ).fetchone()[0]
+    return {"cnpj14": cnpj14, "cnpj_basico": cnpj14[:8], "cnae": str(cnae)}
+
+
+# nome -> função(amostra) com as instruções do cenário
+CENARIOS: Dict[str, Callable[[dict], List[Statement]]] = {
+    "cnpj_prefixo": lambda a: _paged(queries.consulta_geral(cnpj=a["cnpj_basico"])),
+    "cnpj_completo": lambda a: _paged(queries.consulta_geral(cnpj=a["cnpj14"])),
+    "nome_contem": lambda a: _paged(queries.consulta_geral(nome="padaria sao")),
+    "uf_cnae": lambda a: _paged(queries.consulta_geral(uf="SP", cnae_code=a["cnae"])),
+    "cnae_descricao": lambda a: _paged(queries.consulta_geral(cnae_desc="padaria")),
+    "estabelecimentos_uf_cnae": lambda a: _paged(queries.estabelecimentos(uf="SP", cnae=a["cnae"])),
+    "empresas_razao": lambda a: _paged(queries.empresas(razao="silva ltda")),
+    "socios_nome": lambda a: _paged(queries.socios(nome="maria santos")),
+    "simples_mei": lambda a: _paged(queries.simples(opcao_mei="S")),
+    "relatorio": lambda a: list(queries.relatorio(a["cnpj_basico"]).values()),
+}
+
+
+# ------------------------------------------------------------------------------
+# Medição
+# ------------------------------------------------------------------------------
+def percentile(values: List[float], p: float) -> float | None:
+    """Percentil por posição mais próxima (p em 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+@contextmanager
+def _profiled_cursor(profile: Path) -> Iterator[duckdb.DuckDBPyConnection]:
+    with db.reader() as con:
+        con.execute("PRAGMA enable_profiling = 'json'")
+        con.execute(f"PRAGMA profiling_output = '{profile.as_posix()}'")
+        yield con
+
+
+def _execute(con: duckdb.DuckDBPyConnection, statements: List[Statement], profile: Path) -> dict:
+    """Executa as instruções do cenário; tempo de parede total e somas do profiling de cada uma."""
+    out = {"seconds": 0.0, "rows_scanned": 0, "cpu_time": 0.0, "rows_returned": 0}
+    for sql, params in statements:
+        t0 = time.perf_counter()
+        table = con.execute(sql, params).arrow()
+        out["seconds"] += time.perf_counter() - t0
+        out["rows_returned"] += table.num_rows
+        prof = json.loads(profile.read_text(encoding="utf-8"))
+        out["rows_scanned"] += prof.get("cumulative_rows_scanned", 0)
+        out["cpu_time"] += prof.get("cpu_time", 0.0)
+    return out
+
+
+def _summary(scale: float, name: str, mode: str, runs: List[dict], rss: dict) -> dict:
+    ms = [r["seconds"] * 1000 for r in runs]
+    return {
+        "scale": scale, "scenario": name, "mode": mode, "runs": len(runs),
+        "p50_ms": round(percentile(ms, 50), 3), "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3), "mean_ms": round(sum(ms) / len(ms), 3),
+        "rows_scanned": max(r["rows_scanned"] for r in runs),
+        "cpu_time_s": round(sum(r["cpu_time"] for r in runs) / len(runs), 4),
+        "rows_returned": runs[-1]["rows_returned"],
+        "peak_rss_mb": rss["peak_rss_mb"],
+    }
+
+
+def build_database(scale: float, work: Path, seed: int = 42) -> List[dict]:
+    """Gera e carrega um mês sintético completo em db.DB_PATH, com índices de busca e derivadas."""
+    stats = ingest.run_scale(scale, work, list(DATASETS), seed)
+    for table in search.FONTES:
+        search.build_index(table)
+    derived.rebuild_for(*[DATASETS[d]["table"] for d in DATASETS])
+    with db.writer() as con:
+        con.execute("CHECKPOINT")
+    return stats
+
+
+def run_scale(scale: float, work: Path, scenarios: List[str], runs: int, cold_runs: int) -> List[dict]:
+    """Mede cada cenário (frio e quente) no banco já carregado em db.DB_PATH."""
+    profile = work / "profile.json"
+    with db.reader() as con:
+        amostra = _amostra(con)
+    results = []
+    for name in scenarios:
+        statements = CENARIOS[name](amostra)
+        cold = []
+        with ingest.peak_rss() as rss_cold:
+            for _ in range(cold_runs):
+                db.close()
+                with _profiled_cursor(profile) as con:
+                    cold.append(_execute(con, statements, profile))
+        results.append(_summary(scale, name, "cold", cold, rss_cold))
+        with _profiled_cursor(profile) as con:
+            _execute(con, statements, profile)  # aquecimento
+            with ingest.peak_rss() as rss_warm:
+                warm = [_execute(con, statements, profile) for _ in range(runs)]
+        results.append(_summary(scale, name, "warm", warm, rss_warm))
+    return results
+
+
+def run(
+    scales: List[float],
+    scenarios: List[str] | None = None,
+    runs: int = 20,
+    cold_runs: int = 5,
+    out: str | Path | None = None,
+    workdir: str | Path | None = None,
+    seed: int = 42,
+    keep: bool = False,
+) -> dict:
+    """
+    Para cada escala: gera e carrega um banco sintético próprio (data/ do app não é tocado) e mede os
+    cenários; grava o relatório JSON em 'out' (se informado).
+    """
+    scenarios = scenarios or list(CENARIOS)
+    base = Path(workdir or tempfile.mkdtemp(prefix="cnpj_bench_"))
+    report = {
+        "meta": {
+            "benchmark": "queries",
+            "commit": ingest.git_commit(),
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "db_threads": db.THREADS,
+            "db_memory_limit": db.MEMORY_LIMIT,
+            "page_size": loaders.PAGE_SIZE,
+            "runs": runs,
+            "cold_runs": cold_runs,
+            "seed": seed,
+        },
+        "databases": [],
+        "results": [],
+    }
+    version_path, cache_enabled = cache.VERSION_PATH, cache.CACHE_ENABLED
+    try:
+        cache.CACHE_ENABLED = False
+        for scale in scales:
+            work = base / f"scale_{scale:g}"
+            shutil.rmtree(work, ignore_errors=True)
+            work.mkdir(parents=True)
+            db.configure(path=work / "bench.duckdb")
+            cache.VERSION_PATH = work / "dataset_version"
+            t0 = time.perf_counter()
+            build_database(scale, work, seed)
+            with db.reader() as con:
+                rows = {t: con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                        for t in ("empresas", "estabelecimentos", "socios", "simples")}
+            report["databases"].append({
+                "scale": scale, "rows": rows, "bytes": Path(db.DB_PATH).stat().st_size,
+                "build_s": round(time.perf_counter() - t0, 3),
+            })
+            report["results"] += run_scale(scale, work, scenarios, runs, cold_runs)
+            db.close()
+            if not keep:
+                shutil.rmtree(work, ignore_errors=True)
+    finally:
+        cache.VERSION_PATH, cache.CACHE_ENABLED = version_path, cache_enabled
+        db.configure(path=loaders.DB_PATH)
+        if not keep and workdir is None:
+            shutil.rmtree(base, ignore_errors=True)
+    if out:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        Path(out).write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+    return report
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Benchmark das consultas das páginas sobre bancos sintéticos.")
+    ap.add_argument("--scales", nargs="+", type=float, default=[0.0005, 0.005])
+    ap.add_argument("--scenarios", nargs="*", choices=list(CENARIOS))
+    ap.add_argument("--runs", type=int, default=20, help="execuções quentes por cenário")
+    ap.add_argument("--cold-runs", type=int, default=5, help="execuções frias (banco reaberto) por cenário")
+    ap.add_argument("--out", default="bench_queries.json")
+    ap.add_argument("--workdir", help="diretório de trabalho (padrão: temporário)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--keep", action="store_true", help="mantém os bancos gerados")
+    args = ap.parse_args(argv)
+    report = run(args.scales, args.scenarios, args.runs, args.cold_runs, args.out, args.workdir, args.seed, args.keep)
+    for d in report["databases"]:
+        print(f"escala {d['scale']:g}: {d['rows']['estabelecimentos']:,} estabelecimentos, {d['bytes'] / 2**20:.0f} MB")
+    for r in report["results"]:
+        print(f"escala {r['scale']:g} {r['scenario']:26s} {r['mode']:5s} p50 {r['p50_ms']:9.1f} ms  "
+              f"p95 {r['p95_ms']:9.1f} ms  p99 {r['p99_ms']:9.1f} ms  {r['rows_scanned']:>12,} linhas varridas  "
+              f"pico {r['peak_rss_mb']:.0f} MB")
+    print(f"relatório: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# bench/synth.py
+# Gerador determinístico de ZIPs no formato da RFB (mesmo layout de lib/schema): CSV sem cabeçalho,
+# separador ';', todos os campos entre aspas, latin1, um membro por ZIP com nome sem extensão
+# (ex.: K3241.K03200Y0.D50614.EMPRECSV). Mesma semente + mesma escala = mesmos bytes.
+#
+# Escala 1.0 ~ tamanho real de um mês (ROWS_SCALE_1); os domínios têm tamanho fixo. Os ZIPs ficam
+# em {out}/{AAAA-MM}/{Arquivo}.zip, o mesmo layout de RFB_BASE_URL (dá para servir por HTTP e usar
+# prepare_all_for_month com base_url apontando para o diretório).
+#
+#   python -m bench.synth data/synth --scale 0.001 --seed 42
+
+from __future__ import annotations
+
+import argparse
+import random
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Iterator, List
+
+from lib.schema import DATASETS, UFS, column_names
+
+# Linhas por dataset na escala 1.0 (ordem de grandeza de um mês da RFB)
+ROWS_SCALE_1 = {
+    "empresas": 60_000_000,
+    "estabelecimentos": 64_000_000,
+    "socios": 26_000_000,
+    "simples": 42_000_000,
+}
+
+# Tamanho fixo dos domínios (aproximadamente o real)
+DOMINIO_ROWS = {"paises": 255, "municipios": 5_570, "qualificacoes": 68, "naturezas": 90, "cnaes": 1_360}
+
+# Sufixo do membro dentro do ZIP, como nos arquivos oficiais
+_MEMBRO = {
+    "empresas": "EMPRECSV",
+    "estabelecimentos": "ESTABELE",
+    "socios": "SOCIOCSV",
+    "simples": "SIMPLES.CSV",
+    "paises": "PAISCSV",
+    "municipios": "MUNICCSV",
+    "qualificacoes": "QUALSCSV",
+    "naturezas": "NATJUCSV",
+    "cnaes": "CNAECSV",
+}
+
+_PALAVRAS = [
+    "COMERCIO", "SERVICOS", "TRANSPORTES", "JOSÉ", "SÃO", "JOÃO", "PADARIA", "AÇAÍ", "LTDA", "ME",
+    "TECNOLOGIA", "AGRO", "ALIMENTOS", "CONSTRUÇÕES", "INDÚSTRIA", "MARIA", "SILVA", "SANTOS", "OLIVEIRA",
+    "SOUZA", "DISTRIBUIDORA", "FARMÁCIA", "AUTO", "PEÇAS", "CONFECÇÕES", "EDUCAÇÃO", "SAÚDE", "BRASIL",
+    "NORDESTE", "PAULISTA", "MINEIRA", "GAÚCHA", "EIRELI", "HOLDING", "PARTICIPAÇÕES", "LOGÍSTICA",
+]
+
+_LINHAS_POR_BLOCO = 50_000
+
+
+def rows_for(dataset: str, scale: float) -> int:
+    """Total de linhas de 'dataset' na escala (domínios não escalam)."""
+    if dataset in DOMINIO_ROWS:
+        return DOMINIO_ROWS[dataset]
+    return max(1, int(ROWS_SCALE_1[dataset] * scale))
+
+
+def _files(dataset: str) -> List[str]:
+    spec = DATASETS[dataset]
+    return [f"{spec['rfb_file']}{i}" for i in range(spec["parts"])] if spec["parts"] else [spec["rfb_file"]]
+
+
+def _member_name(dataset: str, part: int, year_month: str) -> str:
+    ano, mes = year_month.split("-")
+    return f"K3241.K03200Y{part}.D{ano[-1]}{mes}14.{_MEMBRO[dataset]}"
+
+
+def _rng(seed: int, dataset: str, part: int) -> random.Random:
+    return random.Random(zlib.crc32(f"{seed}:{dataset}:{part}".encode()))
+
+
+def _nome(r: random.Random, n: int = 3) -> str:
+    return " ".join(r.choice(_PALAVRAS) for _ in range(n))
+
+
+def _data(r: random.Random, vazio: float = 0.0) -> str:
+    if r.random() < vazio:
+        return "00000000" if r.random() < 0.5 else "0"
+    return f"{r.randint(1966, 2025)}{r.randint(1, 12):02d}{r.randint(1, 28):02d}"
+
+
+def _codigos(dataset: str) -> List[int]:
+    """Códigos dos domínios (os mesmos usados nas tabelas principais)."""
+    n = DOMINIO_ROWS[dataset]
+    if dataset == "cnaes":
+        return [111301 + i * 7_331 for i in range(n)]
+    if dataset == "municipios":
+        return [1 + i for i in range(n)]
+    return [1 + i * 3 for i in range(n)]
+
+
+def _basico_range(part: int, n_parts: int, total: int) -> range:
+    """Faixa de cnpj_basico da parte (as tabelas principais dividem as mesmas empresas entre as partes)."""
+    per = -(-total // n_parts)
+    return range(part * per, min(total, (part + 1) * per))
+
+
+def _rows(dataset: str, part: int, scale: float, seed: int) -> Iterator[List[str]]:
+    r = _rng(seed, dataset, part)
+    if dataset in DOMINIO_ROWS:
+        for codigo in _codigos(dataset):
+            yield [str(codigo), _nome(r, 2) if dataset != "cnaes" else f"Atividade {_nome(r, 4).lower()}"]
+        return
+    n_parts = DATASETS[dataset]["parts"] or 1
+    empresas = rows_for("empresas", scale)
+    cnaes, municipios = _codigos("cnaes"), _codigos("municipios")
+    paises, naturezas, quals = _codigos("paises"), _codigos("naturezas"), _codigos("qualificacoes")
+    if dataset == "empresas":
+        for b in _basico_range(part, n_parts, empresas):
+            yield [
+                f"{b:08d}", _nome(r), str(r.choice(naturezas)), str(r.choice(quals)),
+                f"{r.randint(0, 5_000_000)},{r.randint(0, 99):02d}", r.choice(["00", "01", "03", "05"]),
+                "" if r.random() < 0.98 else "SAO PAULO - SP",
+            ]
+    elif dataset == "estabelecimentos":
+        # ~1,07 estabelecimento por empresa (filiais nas empresas de índice múltiplo de 14)
+        for b in _basico_range(part, n_parts, empresas):
+            for ordem in range(1, 2 + (b % 14 == 0) * r.randint(1, 3)):
+                base = f"{b:08d}{ordem:04d}"
+                dv = f"{sum(int(c) * (i % 8 + 2) for i, c in enumerate(base)) % 97:02d}"
+                exterior = r.random() < 0.002
+                yield [
+                    f"{b:08d}", f"{ordem:04d}", dv, "1" if ordem == 1 else "2",
+                    _nome(r, 2) if r.random() < 0.6 else "", r.choice(["02", "02", "02", "04", "08", "08"]),
+                    _data(r), f"{r.choice([0, 0, 0, 1, 21, 71]):02d}", "MIAMI" if exterior else "",
+                    str(r.choice(paises)) if exterior else "", _data(r),
+                    str(r.choice(cnaes)), ",".join(str(r.choice(cnaes)) for _ in range(r.choice([0, 0, 1, 2, 4]))),
+                    r.choice(["RUA", "AVENIDA", "TRAVESSA"]), _nome(r, 2), str(r.randint(1, 9999)),
+                    "" if r.random() < 0.7 else f"SALA {r.randint(1, 999)}", r.choice(["CENTRO", "JARDIM", "VILA NOVA"]),
+                    f"{r.randint(1_000_000, 99_999_999):08d}", "EX" if exterior else r.choice(UFS[:-1]),
+                    str(r.choice(municipios)), f"{r.randint(11, 99)}", f"{r.randint(20_000_000, 99_999_999)}",
+                    "", "", "", "", "contato@exemplo.com.br" if r.random() < 0.4 else "", "", "",
+                ]
+    elif dataset == "socios":
+        total = rows_for("socios", scale)
+        for i in _basico_range(part, n_parts, total):
+            b = (i * 2_654_435_761) % empresas
+            pf = r.random() < 0.85
+            yield [
+                f"{b:08d}", "2" if pf else "1", _nome(r), f"***{r.randint(0, 999_999):06d}**" if pf else f"{r.randint(0, 99_999_999_999_999):014d}",
+                str(r.choice(quals)), _data(r), "", "***000000**", "", "00", str(r.randint(0, 9)) if pf else "0",
+            ]
+    elif dataset == "simples":
+        total = min(rows_for("simples", scale), empresas)
+        for b in range(total):
+            simples, mei = r.random() < 0.6, r.random() < 0.3
+            yield [
+                f"{b:08d}", "S" if simples else "N", _data(r) if simples else "00000000",
+                "00000000" if simples else _data(r, 0.5), "S" if mei else "N",
+                _data(r) if mei else "00000000", "00000000" if mei else _data(r, 0.8),
+            ]
+
+
+def _check_layout(dataset: str, row: List[str]) -> None:
+    if len(row) != len(column_names(dataset)):
+        raise AssertionError(f"{dataset}: {len(row)} campos gerados, layout tem {len(column_names(dataset))}")
+
+
+def generate(
+    out_dir: str | Path,
+    scale: float = 0.001,
+    seed: int = 42,
+    datasets: List[str] | None = None,
+    year_month: str = "2025-06",
+) -> List[Path]:
+    """
+    Gera os ZIPs de 'datasets' (padrão: todos de lib/schema.DATASETS) na 'scale' em {out_dir}/{year_month}/.
+    A escrita é em streaming (blocos de linhas direto no membro do ZIP). Retorna os caminhos dos ZIPs.
+    """
+    month_dir = Path(out_dir) / year_month
+    month_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for dataset in datasets or list(DATASETS):
+        for part, file in enumerate(_files(dataset)):
+            path = month_dir / f"{file}.zip"
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=6) as z, z.open(
+                _member_name(dataset, part, year_month), "w", force_zip64=True
+            ) as member:
+                block = []
+                for i, row in enumerate(_rows(dataset, part, scale, seed)):
+                    if i == 0:
+                        _check_layout(dataset, row)
+                    block.append(";".join(f'"{v}"' for v in row))
+                    if len(block) >= _LINHAS_POR_BLOCO:
+                        member.write(("\n".join(block) + "\n").encode("latin1"))
+                        block = []
+                if block:
+                    member.write(("\n".join(block) + "\n").encode("latin1"))
+            paths.append(path)
+    return paths
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Gera ZIPs sintéticos no formato da RFB.")
+    ap.add_argument("out_dir")
+    ap.add_argument("--scale", type=float, default=0.001)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--datasets", nargs="*", choices=list(DATASETS))
+    ap.add_argument("--year-month", default="2025-06")
+    args = ap.parse_args(argv)
+    for p in generate(args.out_dir, args.scale, args.seed, args.datasets, args.year_month):
+        print(p)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# lib/__main__.py
+# Linha de comando (sem Streamlit) para a automação: carga de um dataset ou de um mês, exportação de
+# consultas, relatórios por lista de CNPJs e enriquecimento de arquivos de clientes. Cada comando importa
+# só o que usa (o --help não abre DuckDB, pandas nem pyarrow). A saída de cada comando é uma linha JSON
+# no stdout; o código de saída é diferente de zero se a carga ficou incompleta ou se o banco estava ocupado
+# (erro numa linha no stderr). Com --enqueue, prepare e month só põem a carga na fila de lib/jobs (atendida
+# pelo Streamlit ou por python -m lib.jobs) e imprimem o job, sem abrir o banco.
+#
+#   python -m lib prepare estabelecimentos --url https://.../Estabelecimentos0.zip
+#   python -m lib prepare cnaes --csv Cnaes.csv --threads 2
+#   python -m lib month 2025-06 --targets empresas socios --workers 4 --download-workers 8
+#   python -m lib month 2025-06 --enqueue
+#   python -m lib export estabelecimentos --filter uf=SP --filter cnae=4711302 --format parquet --out sp.parquet
+#   python -m lib export --sql "SELECT * FROM simples WHERE opcao_mei = 'S'" --out mei.csv.gz --format csv.gz
+#   python -m lib reports cnpjs.txt --out relatorios/ --format parquet
+#   python -m lib enrich clientes.csv --column cnpj --format parquet --out clientes_rfb.parquet
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List
+
+# Consultas exportáveis: nome -> função de lib/queries (os filtros são os argumentos dela)
+CONSULTAS = ["consulta_geral", "empresas", "estabelecimentos", "socios", "simples"]
+
+
+def _print(result: dict) -> None:
+    print(json.dumps(result, ensure_ascii=False, default=str))
+
+
+def _print_job(job_id: int) -> int:
+    from lib import jobs
+
+    job = jobs.get(job_id)
+    _print({"job": job_id, "kind": job["kind"], "status": job["status"]})
+    return 0
+
+
+def _dataset(name: str) -> dict:
+    from lib.schema import DATASETS
+
+    if name not in DATASETS:
+        raise SystemExit(f"Dataset desconhecido: {name} (use um de: {', '.join(DATASETS)})")
+    return DATASETS[name]
+
+
+# ------------------------------------------------------------------------------
+# Comandos
+# ------------------------------------------------------------------------------
+def cmd_prepare(args: argparse.Namespace) -> int:
+    from lib import loaders
+
+    spec = _dataset(args.dataset)
+    table, keywords = spec["table"], spec["keywords"]
+    if args.enqueue:
+        from lib import jobs
+
+        if args.url:
+            return _print_job(jobs.enqueue_zip_url(args.url, table, keywords, force=args.force))
+        kind, path = ("zip", args.zip) if args.zip else ("csv", args.csv)
+        with open(path, "rb") as f:
+            return _print_job(jobs.enqueue_upload(
+                f, table, kind, keywords, force=args.force, encoding=args.encoding if kind == "csv" else None,
+            ))
+    if args.url:
+        parquet = loaders.prepare_from_zip_url(args.url, table, keywords, force=args.force, threads=args.threads)
+    elif args.zip:
+        with open(args.zip, "rb") as f:
+            parquet = loaders.prepare_from_uploaded_zip_bytes(
+                f, table, keywords, force=args.force, threads=args.threads
+            )
+    else:
+        with open(args.csv, "rb") as f:
+            parquet = loaders.prepare_from_uploaded_csv_bytes(f, table, args.encoding, threads=args.threads)
+    _print({"dataset": args.dataset, "table": table, "parquet": Path(parquet).as_posix(),
+            "rows": loaders.parquet_rows(Path(parquet))})
+    return 0
+
+
+def cmd_month(args: argparse.Namespace) -> int:
+    from lib import loaders
+
+    try:
+        year, month = (int(x) for x in args.year_month.split("-"))
+    except ValueError:
+        year = month = 0
+    if not 1 <= month <= 12:
+        raise SystemExit(f"Mês inválido: {args.year_month} (use AAAA-MM)")
+    for t in args.targets or []:
+        _dataset(t)
+    options = {
+        "base_url": args.base_url, "download_workers": args.download_workers, "convert_workers": args.workers,
+        "keep_zips": args.keep_zips, "segments": args.segments, "force": args.force,
+        "incremental": args.incremental, "threads": args.threads,
+    }
+    if args.enqueue:
+        from lib import jobs
+
+        # só as opções informadas: o mesmo mês enfileirado pela página vira o mesmo job
+        options = {k: v for k, v in options.items() if v not in (None, False)}
+        return _print_job(jobs.enqueue_month(year, month, args.targets, **options))
+    parts = loaders.month_parts(year, month, args.targets, args.base_url)
+    prepared = loaders.prepare_all_for_month(year, month, args.targets, **{**options, "segments": args.segments or 1})
+    _print({"year_month": f"{year:04d}-{month:02d}", "parts": len(parts), "prepared": len(prepared),
+            "datasets": sorted({d for d, _ in prepared})})
+    return 0 if len(prepared) == len(parts) else 1
+
+
+def _filters(pairs: List[str], consulta: str) -> dict:
+    import inspect
+
+    from lib import queries
+
+    accepted = inspect.signature(getattr(queries, consulta)).parameters
+    out: dict = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep or key not in accepted:
+            raise SystemExit(f"Filtro inválido para {consulta}: {pair!r} (aceitos: {', '.join(accepted)})")
+        # filtros de múltipla escolha (ex.: porte) recebem valores separados por vírgula
+        out[key] = value.split(",") if accepted[key].default == () else value
+    return out
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    import shutil
+
+    from lib import export, queries
+
+    if args.format not in export.FORMATOS:
+        raise SystemExit(f"Formato inválido: {args.format} (use um de: {', '.join(export.FORMATOS)})")
+    if args.sql:
+        sql, params = args.sql, []
+    elif args.consulta:
+        sql, params, _ = getattr(queries, args.consulta)(**_filters(args.filter, args.consulta))
+    else:
+        raise SystemExit("Informe a consulta (ex.: estabelecimentos) ou --sql.")
+
+    def progress(nbytes: int, seconds: float) -> None:
+        print(f"\r{nbytes / 1e6:,.1f} MB em {seconds:.0f}s", end="", file=sys.stderr, flush=True)
+
+    res = export.export(sql, params, args.format, args.consulta or "export",
+                        on_progress=None if args.quiet else progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(res["path"], out)
+        res["path"] = out.as_posix()
+    _print(res)
+    return 0
+
+
+def cmd_reports(args: argparse.Namespace) -> int:
+    from lib import reports
+
+    def progress(secao: str, n: int) -> None:
+        print(f"\r{secao}: {n:,} CNPJ(s)", end="", file=sys.stderr, flush=True)
+
+    res = reports.generate(reports.read_list(args.lista), args.format, Path(args.out),
+                           on_progress=None if args.quiet else progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    missing = res.pop("missing")
+    res["nao_encontrados_amostra"] = missing["entrada"].head(20).tolist()
+    _print(res)
+    return 0
+
+
+def cmd_enrich(args: argparse.Namespace) -> int:
+    from lib import enrich
+
+    def progress(rows: int, seconds: float) -> None:
+        print(f"\r{rows:,} linhas em {seconds:.0f}s", end="", file=sys.stderr, flush=True)
+
+    res = enrich.enrich(args.arquivo, args.column, args.campos, args.format, args.out,
+                        on_progress=None if args.quiet else progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    _print(res)
+    return 0
+
+
+# ------------------------------------------------------------------------------
+# Argumentos
+# ------------------------------------------------------------------------------
+def build_parser() -> argparse.ArgumentParser:
+    # opções do banco, aceitas depois de qualquer subcomando
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", help="caminho do banco DuckDB (padrão: data/cnpj.duckdb)")
+    common.add_argument("--threads", type=int, help="threads do DuckDB (consultas, cargas e cada conversão)")
+    common.add_argument("--memory-limit", help="memory_limit do DuckDB, ex.: 4GB")
+
+    ap = argparse.ArgumentParser(prog="python -m lib", description="CNPJ (RFB): carga, exportação e relatórios.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("prepare", parents=[common], help="prepara um dataset a partir de URL, ZIP ou CSV")
+    p.add_argument("dataset", help="empresas, estabelecimentos, socios, simples ou um domínio")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--url", help="URL do ZIP da RFB")
+    src.add_argument("--zip", help="ZIP local")
+    src.add_argument("--csv", help="CSV local (separador ;)")
+    p.add_argument("--encoding", default="latin1", help="codificação do CSV (padrão: latin1)")
+    p.add_argument("--force", action="store_true", help="ignora o manifesto (recarrega mesmo sem mudança)")
+    p.add_argument("--enqueue", action="store_true", help="só enfileira a carga em lib/jobs e imprime o job")
+    p.set_defaults(func=cmd_prepare)
+
+    p = sub.add_parser("month", parents=[common], help="baixa e prepara todos os pacotes de um mês")
+    p.add_argument("year_month", help="AAAA-MM")
+    p.add_argument("--targets", nargs="*", help="datasets (padrão: todos)")
+    p.add_argument("--base-url", help="raiz dos dados abertos (padrão: CNPJ_RFB_BASE_URL)")
+    p.add_argument("--workers", type=int, help="processos de conversão")
+    p.add_argument("--download-workers", type=int, help="downloads simultâneos")
+    p.add_argument("--segments", type=int, help="faixas baixadas em paralelo por arquivo (padrão: 1)")
+    p.add_argument("--keep-zips", action="store_true")
+    p.add_argument("--force", action="store_true", help="ignora o manifesto")
+    p.add_argument("--incremental", action="store_true", help="aplica só o diff nas tabelas com chave")
+    p.add_argument("--enqueue", action="store_true", help="só enfileira a carga em lib/jobs e imprime o job")
+    p.set_defaults(func=cmd_month)
+
+    p = sub.add_parser("export", parents=[common], help="exporta o resultado completo de uma consulta (CSV/Parquet)")
+    p.add_argument("consulta", nargs="?", choices=CONSULTAS, help="consulta das páginas (lib/queries)")
+    p.add_argument("--filter", action="append", default=[], metavar="CAMPO=VALOR",
+                   help="filtro da consulta (repita para vários; listas separadas por vírgula)")
+    p.add_argument("--sql", help="SQL livre em vez de uma consulta das páginas")
+    p.add_argument("--format", default="csv", help="csv, csv.gz, csv.zst, parquet ou 'parquet (gzip)'")
+    p.add_argument("--out", help="arquivo de saída (padrão: data/exports/...)")
+    p.add_argument("--quiet", action="store_true", help="sem andamento no stderr")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("reports", parents=[common], help="relatórios consolidados para uma lista de CNPJs")
+    p.add_argument("lista", help="arquivo com um CNPJ por linha (com ou sem máscara; CSV usa a 1ª coluna)")
+    p.add_argument("--out", default="relatorios", help="diretório de saída")
+    p.add_argument("--format", default="zip", choices=["zip", "parquet"],
+                   help="zip (pasta de CSVs por CNPJ) ou parquet (particionado); ambos com nao_encontrados.csv")
+    p.add_argument("--quiet", action="store_true", help="sem andamento no stderr")
+    p.set_defaults(func=cmd_reports)
+
+    p = sub.add_parser("enrich", parents=[common], help="acrescenta dados da RFB a um CSV/Parquet de clientes")
+    p.add_argument("arquivo", help="CSV (separador detectado) ou .parquet com uma coluna de CNPJs")
+    p.add_argument("--column", help="coluna dos CNPJs (padrão: a primeira com 'cnpj' no nome)")
+    p.add_argument("--campos", nargs="*", help="campos acrescentados (padrão: razão social, situação, CNAE, "
+                                               "município, UF, porte, Simples/MEI)")
+    p.add_argument("--format", default="csv", choices=["csv", "parquet"])
+    p.add_argument("--out", help="arquivo de saída (padrão: data/exports/...)")
+    p.add_argument("--quiet", action="store_true", help="sem andamento no stderr")
+    p.set_defaults(func=cmd_enrich)
+    return ap
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    import duckdb
+
+    from lib import db
+
+    if args.db or args.threads or args.memory_limit:
+        db.configure(path=args.db, threads=args.threads, memory_limit=args.memory_limit)
+    try:
+        return args.func(args)
+    except duckdb.IOException as e:  # banco ocupado por outro processo (lib/db.DatabaseBusyError) ou ilegível
+        print(f"python -m lib {args.command}: {str(e).splitlines()[0]}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()  # solta o lock e faz o checkpoint antes de sair (não deixa WAL para trás)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# lib/cache.py
+# Cache de resultados de consulta (abaixo de lib.loaders.query).
+# Chave = SQL normalizado + parâmetros + versão dos dados. A versão fica num arquivo em data/ e é trocada
+# por um identificador novo (único, não um contador) a cada carga (ensure_table_from_parquet, derivadas,
+# índice de busca, prepare_*), inclusive por outros processos: um resultado anterior a uma recarga nunca
+# é devolvido, mesmo com duas cargas simultâneas.
+# Resultados ficam em memória como tabelas Arrow, num LRU limitado em bytes; opcionalmente, o que sai
+# da memória vai para disco (Arrow IPC/Feather) até um segundo limite.
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Tuple
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+CACHE_ENABLED = os.environ.get("CNPJ_CACHE", "1").lower() not in ("0", "false", "nao", "não")
+CACHE_MAX_BYTES = int(os.environ.get("CNPJ_CACHE_MB", "256")) * 1024 * 1024
+
+# Spill em disco (desligado se None)
+CACHE_SPILL_DIR: Path | None = Path(os.environ["CNPJ_CACHE_SPILL_DIR"]) if os.environ.get("CNPJ_CACHE_SPILL_DIR") else None
+CACHE_SPILL_MAX_BYTES = int(os.environ.get("CNPJ_CACHE_SPILL_MB", "2048")) * 1024 * 1024
+
+VERSION_PATH = Path("data") / "dataset_version"
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, pa.Table]" = OrderedDict()
+_bytes = 0
+_version_seen: str | None = None
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "spills": 0, "invalidations": 0}
+
+_STRINGS = re.compile(r"('(?:[^']|'')*')")
+
+
+# ------------------------------------------------------------------------------
+# Versão dos dados
+# ------------------------------------------------------------------------------
+def version() -> str:
+    """Versão atual dos dados ("0" antes da primeira carga)."""
+    try:
+        return VERSION_PATH.read_text(encoding="utf-8").strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def bump() -> str:
+    """
+    Troca a versão dos dados (chamado após cada carga) e esvazia o cache deste processo. A versão nova é
+    um identificador único, gravado de forma atômica: cargas em processos diferentes nunca gravam a mesma.
+    """
+    global _version_seen
+    with _lock:
+        new = uuid.uuid4().hex
+        VERSION_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = VERSION_PATH.with_name(VERSION_PATH.name + f".{os.getpid()}.tmp")
+        tmp.write_text(new, encoding="utf-8")
+        tmp.replace(VERSION_PATH)
+        _version_seen = new
+        _clear()
+    return new
+
+
+# ------------------------------------------------------------------------------
+# Chave e armazenamento
+# ------------------------------------------------------------------------------
+def normalize_sql(sql: str) -> str:
+    """Colapsa espaços fora dos literais de texto (consultas iguais com formatação diferente = mesma chave)."""
+    parts = _STRINGS.split(sql)
+    return "".join(p if i % 2 else re.sub(r"\s+", " ", p) for i, p in enumerate(parts)).strip()
+
+
+def cacheable(sql: str) -> bool:
+    """Só leituras entram no cache."""
+    return normalize_sql(sql).upper().startswith(("SELECT", "WITH", "FROM"))
+
+
+def _key(sql: str, params: Tuple | None, ver: str) -> str:
+    raw = f"{ver}\x00{normalize_sql(sql)}\x00{params!r}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _spill_path(key: str) -> Path:
+    return CACHE_SPILL_DIR / f"{key}.arrow"
+
+
+def _spill(key: str, table: pa.Table) -> None:
+    if CACHE_SPILL_DIR is None:
+        return
+    CACHE_SPILL_DIR.mkdir(parents=True, exist_ok=True)
+    feather.write_feather(table, _spill_path(key), compression="zstd")
+    _stats["spills"] += 1
+    files = sorted(CACHE_SPILL_DIR.glob("*.arrow"), key=lambda p: p.stat().st_mtime)
+    total = sum(p.stat().st_size for p in files)
+    while files and total > CACHE_SPILL_MAX_BYTES:
+        old = files.pop(0)
+        total -= old.stat().st_size
+        old.unlink(missing_ok=True)
+
+
+def _put(key: str, table: pa.Table) -> None:
+    global _bytes
+    size = table.nbytes
+    if size > CACHE_MAX_BYTES:
+        _spill(key, table)
+        return
+    _entries[key] = table
+    _bytes += size
+    while _bytes > CACHE_MAX_BYTES:
+        old_key, old = _entries.popitem(last=False)
+        _bytes -= old.nbytes
+        _stats["evictions"] += 1
+        _spill(old_key, old)
+
+
+def _get(key: str) -> pa.Table | None:
+    table = _entries.get(key)
+    if table is not None:
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return table
+    if CACHE_SPILL_DIR is not None and _spill_path(key).exists():
+        table = feather.read_table(_spill_path(key))
+        _stats["disk_hits"] += 1
+        return table
+    return None
+
+
+def _clear() -> None:
+    global _bytes
+    _entries.clear()
+    _bytes = 0
+    _stats["invalidations"] += 1
+    if CACHE_SPILL_DIR is not None and CACHE_SPILL_DIR.exists():
+        for p in CACHE_SPILL_DIR.glob("*.arrow"):
+            p.unlink(missing_ok=True)
+
+
+def clear() -> None:
+    """Esvazia o cache (memória e disco)."""
+    with _lock:
+        _clear()
+
+
+def fetch(sql: str, params: Tuple | None, run: Callable[[], pa.Table]) -> pa.Table:
+    """
+    Resultado de 'sql' com 'params' na versão atual dos dados: do cache, ou de run() (e guardado).
+    Uma mudança de versão feita por outro processo esvazia o cache deste na primeira consulta.
+    """
+    global _version_seen
+    ver = version()
+    key = _key(sql, params, ver)
+    with _lock:
+        if ver != _version_seen:
+            if _version_seen is not None:
+                _clear()
+            _version_seen = ver
+        table = _get(key)
+        if table is not None:
+            return table
+        _stats["misses"] += 1
+    table = run()
+    with _lock:
+        if version() == ver:
+            _put(key, table)
+    return table
+
+
+def stats() -> dict:
+    """Contadores (hits, disk_hits, misses, evictions, spills, invalidations) e ocupação atual."""
+    with _lock:
+        return {**_stats, "entries": len(_entries), "bytes": _bytes, "max_bytes": CACHE_MAX_BYTES,
+                "version": version()}
@@ -0,0 +1,28 @@
+# lib/conversion.py
+# Processo de conversão de lib.loaders.prepare_all_for_month, uma parte por processo:
+#
+#   python -m lib.conversion    (pedido em pickle no stdin, resultado em pickle no stdout)
+#
+# É um módulo de entrada próprio: o processo não reexecuta o __main__ de quem iniciou a carga (a página
+# do Streamlit, a linha de comando, o worker de lib/jobs), como os processos do multiprocessing fazem.
+# Pedido: os argumentos de lib.loaders.convert_part; resultado: o dict que ela retorna.
+
+from __future__ import annotations
+
+import os
+import pickle
+import sys
+
+from lib import loaders
+
+
+def main() -> None:
+    out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())  # o que a conversão imprimir vai para o stderr
+    args = pickle.load(sys.stdin.buffer)
+    with out:
+        pickle.dump(loaders.convert_part(*args), out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+# lib/db.py
+# Gerenciador de acesso ao DuckDB. O arquivo do banco só fica aberto enquanto é usado: cada consulta
+# (reader) e cada escrita (writer) toma um empréstimo da instância do processo, aberta pelo primeiro e
+# fechada pouco depois do último (IDLE_CLOSE_S). Assim o lock do arquivo (compartilhado para leitura,
+# exclusivo para escrita) só é segurado durante as operações, e outros processos (linha de comando,
+# worker de lib/jobs, outro servidor de consultas) usam o banco entre elas.
+# Leituras abrem o arquivo somente leitura. Uma escrita espera as leituras do processo terminarem (as novas
+# aguardam a vez) e o reabre para escrita; consultas do mesmo processo durante a escrita usam essa instância
+# e seguem lendo a versão anterior das tabelas (MVCC). Entre processos, quem encontra o arquivo ocupado
+# tenta de novo até LOCK_WAIT_S e então levanta DatabaseBusyError; um escritor à espera deixa um arquivo
+# de intenção para que os leitores dos outros processos soltem o arquivo.
+# No modo "view" (lib/storage.MODE) as consultas nem abrem o arquivo: rodam num DuckDB em memória do
+# processo, com as views do catálogo de serviço publicado pela carga (publish), recriadas quando ele muda.
+# O arquivo guarda só o estado da carga (load_catalog, change_log), lido com file_reader().
+# A instância é fechada (com checkpoint) também na saída do processo; um WAL que sobrar de um processo
+# interrompido é reaplicado pela primeira leitura (_replay_wal).
+
+from __future__ import annotations
+
+import atexit
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+
+import duckdb
+
+from lib import storage
+
+DB_PATH = (Path("data") / "cnpj.duckdb").as_posix()
+
+# Configuração do DuckDB (None = padrão do DuckDB: todos os núcleos / 80% da RAM)
+THREADS = int(os.environ["CNPJ_DB_THREADS"]) if os.environ.get("CNPJ_DB_THREADS") else None
+MEMORY_LIMIT = os.environ.get("CNPJ_DB_MEMORY_LIMIT") or None  # ex.: "4GB"
+
+# Modo somente leitura (servidor de consultas; a carga roda em outro processo/máquina)
+READ_ONLY = os.environ.get("CNPJ_DB_READ_ONLY", "").lower() in ("1", "true", "sim")
+
+# Espera máxima (segundos) pelo arquivo do banco ocupado por outro processo
+LOCK_WAIT_S = float(os.environ.get("CNPJ_DB_LOCK_WAIT_S", "30"))
+
+# O arquivo continua aberto por este tempo depois do último uso (consultas seguidas não o reabrem)
+IDLE_CLOSE_S = float(os.environ.get("CNPJ_DB_IDLE_S", "0.5"))
+
+_cond = threading.Condition()
+_write_lock = threading.Lock()
+_con: duckdb.DuckDBPyConnection | None = None
+_con_write = False  # instância aberta para escrita
+_users = 0  # empréstimos em andamento
+_writers_waiting = 0  # escritas do processo esperando as leituras terminarem
+_idle = 0  # incrementado a cada empréstimo (o fechamento por ociosidade confere)
+_memory: duckdb.DuckDBPyConnection | None = None
+_views_lock = threading.Lock()
+_views_stamp: tuple | None = ()  # arquivo do catálogo aplicado por último (() = nenhum)
+
+
+class ReadOnlyError(RuntimeError):
+    """Tentativa de escrita com o banco aberto em modo somente leitura."""
+
+
+class DatabaseBusyError(duckdb.IOException):
+    """O arquivo do banco continuou ocupado por outro processo por mais de LOCK_WAIT_S."""
+
+
+def _config() -> dict:
+    config = {}
+    if THREADS:
+        config["threads"] = THREADS
+    if MEMORY_LIMIT:
+        config["memory_limit"] = MEMORY_LIMIT
+    return config
+
+
+# ------------------------------------------------------------------------------
+# Instância do arquivo (aberta sob demanda)
+# ------------------------------------------------------------------------------
+def _intent_path() -> Path:
+    return Path(DB_PATH + ".write-intent")
+
+
+def _other_writer_waiting() -> bool:
+    """True se um escritor de outro processo avisou (há menos de LOCK_WAIT_S) que espera o arquivo."""
+    try:
+        path = _intent_path()
+        return time.time() - path.stat().st_mtime < LOCK_WAIT_S and path.read_text() != str(os.getpid())
+    except (FileNotFoundError, OSError):
+        return False
+
+
+def _announce(on: bool) -> None:
+    path = _intent_path()
+    try:
+        if on:
+            path.write_text(str(os.getpid()))
+        elif path.read_text() == str(os.getpid()):
+            path.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def _is_lock_error(e: Exception) -> bool:
+    return isinstance(e, duckdb.IOException) and "lock" in str(e).lower()
+
+
+def _is_wal_error(e: Exception) -> bool:
+    return isinstance(e, duckdb.IOException) and "replaying wal" in str(e).lower()
+
+
+def _busy() -> DatabaseBusyError:
+    return DatabaseBusyError(
+        f"O banco {DB_PATH} continua em uso (carga em andamento?) depois de {LOCK_WAIT_S:.0f}s de espera; "
+        "tente novamente em instantes."
+    )
+
+
+def _open(write: bool) -> None:
+    """Abre a instância (chamado com _cond). Levanta duckdb.IOException se o arquivo estiver ocupado."""
+    global _con, _con_write
+    read_only = READ_ONLY or not write
+    if not Path(DB_PATH).exists():
+        if READ_ONLY:
+            raise FileNotFoundError(f"Banco {DB_PATH} não existe (modo somente leitura).")
+        Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
+        read_only = False  # a primeira abertura cria o arquivo
+    try:
+        _con = duckdb.connect(DB_PATH, read_only=read_only, config=_config())
+    except duckdb.IOException as e:
+        if not (read_only and not READ_ONLY and _is_wal_error(e)):
+            raise
+        _replay_wal()
+        _con = duckdb.connect(DB_PATH, read_only=read_only, config=_config())
+    _con_write = not read_only
+
+
+def _replay_wal() -> None:
+    """
+    Reaplica o WAL deixado por um processo que saiu sem fechar o banco: a abertura somente leitura não
+    consegue (o replay grava no arquivo), então o banco é aberto uma vez para escrita e fechado (checkpoint).
+    Isso roda num processo à parte, para que um WAL que derrube o DuckDB não leve junto quem consulta.
+    """
+    r = subprocess.run(
+        [sys.executable, "-c", "import duckdb, sys; duckdb.connect(sys.argv[1]).close()", DB_PATH],
+        capture_output=True, text=True,
+    )
+    if r.returncode != 0:
+        lines = r.stderr.strip().splitlines()
+        reason = lines[-1] if r.returncode > 0 and lines else f"processo encerrado com o código {r.returncode}"
+        raise duckdb.IOException(f"O WAL de {DB_PATH} não pôde ser reaplicado ({reason}).")
+
+
+def _close_locked() -> None:
+    global _con, _con_write
+    if _con is not None:
+        _con.close()
+    _con, _con_write = None, False
+
+
+def _acquire(write: bool) -> duckdb.DuckDBPyConnection:
+    """Empresta a instância do arquivo (aberta para escrita se 'write'), esperando o que for preciso."""
+    global _users, _writers_waiting, _idle
+    deadline = time.monotonic() + LOCK_WAIT_S
+    delay = 0.05
+    with _cond:
+        if write:
+            _writers_waiting += 1
+        try:
+            while True:
+                yielding = not write and (_writers_waiting or _other_writer_waiting())
+                if _con is not None and (_con_write or not (write or yielding)):
+                    break
+                if _con is not None and _users == 0:
+                    _close_locked()  # somente leitura e alguém precisa escrever: reabre
+                if _con is None and not yielding:
+                    try:
+                        _open(write)
+                        break
+                    except duckdb.IOException as e:
+                        if not _is_lock_error(e):
+                            raise
+                        if write:
+                            _announce(True)
+                        if time.monotonic() > deadline:
+                            raise _busy() from e
+                elif time.monotonic() > deadline:
+                    raise _busy()
+                _cond.wait(delay)
+                delay = min(delay * 2, 1.0)
+        finally:
+            if write:
+                _writers_waiting -= 1
+                _announce(False)
+        _users += 1
+        _idle += 1
+        return _con
+
+
+def _release() -> None:
+    global _users
+    with _cond:
+        _users -= 1
+        if _users == 0:
+            if _writers_waiting or _other_writer_waiting() or IDLE_CLOSE_S <= 0:
+                _close_locked()
+            else:
+                token = _idle
+                timer = threading.Timer(IDLE_CLOSE_S, _close_if_idle, (token,))
+                timer.daemon = True
+                timer.start()
+        _cond.notify_all()
+
+
+def _close_if_idle(token: int) -> None:
+    with _cond:
+        if _users == 0 and _idle == token:
+            _close_locked()
+            _cond.notify_all()
+
+
+@atexit.register
+def _close_at_exit() -> None:
+    # o timer de ociosidade não roda depois da saída: fecha aqui (checkpoint; não sobra WAL no disco)
+    with _cond:
+        _cond.wait_for(lambda: _users == 0, timeout=LOCK_WAIT_S)
+        if _users == 0:
+            _close_locked()
+
+
+# ------------------------------------------------------------------------------
+# API
+# ------------------------------------------------------------------------------
+def configure(
+    path: str | Path | None = None, threads: int | None = None, memory_limit: str | None = None,
+    read_only: bool | None = None,
+) -> None:
+    """
+    Ajusta caminho/threads/memory_limit/modo. Valem a partir da próxima abertura do arquivo (a instância
+    ociosa é fechada agora); threads e memory_limit também são aplicados na instância em memória.
+    """
+    global DB_PATH, THREADS, MEMORY_LIMIT, READ_ONLY
+    if path is not None:
+        DB_PATH = Path(path).as_posix()
+    if read_only is not None:
+        READ_ONLY = read_only
+    THREADS = threads if threads is not None else THREADS
+    MEMORY_LIMIT = memory_limit if memory_limit is not None else MEMORY_LIMIT
+    close()
+    _forget_views()
+    if _memory is not None:
+        for key, value in _config().items():
+            _memory.execute(f"SET {key} = '{value}'")
+
+
+def close() -> None:
+    """Fecha a instância do arquivo assim que os empréstimos em andamento terminarem (solta o lock)."""
+    with _cond:
+        while _users:
+            _cond.wait()
+        _close_locked()
+        _cond.notify_all()
+
+
+@contextmanager
+def reader() -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    Cursor de consulta, válido dentro do bloco 'with'. Cada chamada tem o seu cursor: tabelas temporárias
+    e objetos registrados não vazam entre chamadas. No modo "table" o arquivo fica aberto durante o bloco;
+    no modo "view" o cursor é do DuckDB em memória, com as views publicadas (o arquivo não é aberto).
+    """
+    if storage.MODE == "view":
+        _sync_views()
+        with memory() as cur:
+            yield cur
+    else:
+        with file_reader() as cur:
+            yield cur
+
+
+@contextmanager
+def file_reader() -> Iterator[duckdb.DuckDBPyConnection]:
+    """Cursor de consulta no arquivo do banco em qualquer modo (estado da carga: load_catalog, change_log)."""
+    con = _acquire(write=False)
+    try:
+        cur = con.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+    finally:
+        _release()
+
+
+@contextmanager
+def writer() -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    Cursor de escrita para a ingestão, um por vez no processo, com o arquivo aberto para escrita só
+    durante o bloco. As consultas em andamento continuam lendo a versão anterior das tabelas até o commit.
+    """
+    if READ_ONLY:
+        raise ReadOnlyError("Banco aberto em modo somente leitura; rode a carga no processo de ingestão.")
+    with _write_lock:
+        con = _acquire(write=True)
+        try:
+            cur = con.cursor()
+            try:
+                yield cur
+            finally:
+                cur.close()
+        finally:
+            _release()
+
+
+@contextmanager
+def memory() -> Iterator[duckdb.DuckDBPyConnection]:
+    """
+    Cursor do DuckDB em memória do processo (conversões Arrow -> pandas; no modo "view", as consultas),
+    sem abrir o arquivo.
+    """
+    global _memory
+    with _cond:
+        if _memory is None:
+            # arquivos temporários (consultas que passam do memory_limit) por processo, ao lado do banco
+            spill = Path(DB_PATH).parent / ".tmp" / f"memoria-{os.getpid()}"
+            _memory = duckdb.connect(":memory:", config={**_config(), "temp_directory": spill.as_posix()})
+        cur = _memory.cursor()
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+
+# ------------------------------------------------------------------------------
+# Modo "view": catálogo de serviço
+# ------------------------------------------------------------------------------
+def _catalog_path() -> Path:
+    return Path(DB_PATH).with_suffix(".catalog.json")
+
+
+def _forget_views() -> None:
+    global _views_stamp
+    with _views_lock:
+        _views_stamp = ()
+
+
+def _sync_views() -> None:
+    """Recria no DuckDB em memória as views do catálogo publicado, se ele mudou desde a última vez."""
+    global _views_stamp
+    try:
+        st = _catalog_path().stat()
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        stamp = None
+    if stamp == _views_stamp:
+        return
+    with _views_lock:
+        if stamp == _views_stamp:
+            return
+        views = storage.read_catalog(_catalog_path())["views"]
+        with memory() as con:
+            current = {r[0] for r in con.execute(
+                "SELECT view_name FROM duckdb_views() WHERE NOT internal AND NOT temporary"
+            ).fetchall()}
+            con.execute("BEGIN TRANSACTION")
+            try:
+                for name, sql in views.items():
+                    con.execute(f"CREATE OR REPLACE VIEW {name} AS {sql}")
+                for name in current - set(views):
+                    con.execute(f"DROP VIEW {name}")
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        _views_stamp = stamp
+
+
+def published(name: str) -> str | None:
+    """SELECT publicado para a view 'name' no catálogo de serviço (None se não houver)."""
+    return storage.read_catalog(_catalog_path())["views"].get(name)
+
+
+def publish(views: Dict[str, str | None]) -> int:
+    """
+    Modo "view": publica no catálogo de serviço as views 'views' ({nome: SELECT}; None remove a view),
+    todas de uma vez. Os leitores de todos os processos passam a usá-las na próxima consulta; publicações
+    concorrentes são serializadas pelo lock de escrita do arquivo. Retorna a versão do catálogo.
+    """
+    with memory() as con:
+        for sql in views.values():
+            if sql is not None:
+                con.execute(f"DESCRIBE {sql}")  # um SELECT inválido não chega aos leitores
+    with writer():
+        catalog = storage.read_catalog(_catalog_path())
+        for name, sql in views.items():
+            if sql is None:
+                catalog["views"].pop(name, None)
+            else:
+                catalog["views"][name] = sql
+        catalog["version"] += 1
+        storage.write_catalog(_catalog_path(), catalog)
+    _sync_views()
+    return catalog["version"]
+
+
+class Rebuild:
+    """
+    Tabelas reconstruídas dentro de rebuild(). table(nome, SELECT, indexes) materializa o resultado: no modo
+    "table", CREATE OR REPLACE TABLE na transação de escrita, com índices (ART) nas colunas de 'indexes';
+    no modo "view", um Parquet numa versão nova de data/derivadas/{nome}/ (lib/storage), visível em 'con'
+    por uma view temporária até a publicação (sem índices: buscas usam as estatísticas dos row groups).
+    """
+
+    def __init__(self, con: duckdb.DuckDBPyConnection) -> None:
+        self.con = con
+        self.views: Dict[str, str] = {}
+        self.versions: List[Path] = []
+
+    def table(self, name: str, sql: str, indexes: Sequence[str] = ()) -> None:
+        if storage.MODE != "view":
+            self.con.execute(f"CREATE OR REPLACE TABLE {name} AS {sql}")
+            for col in indexes:
+                self.con.execute(f"CREATE INDEX {name}_{col}_idx ON {name} ({col})")
+            return
+        version = storage.new_version(Path(DB_PATH).parent / "derivadas" / name)
+        self.versions.append(version)
+        path = (version / f"{name}.parquet").as_posix()
+        self.con.execute(f"COPY ({sql}) TO '{path}' (FORMAT parquet, COMPRESSION zstd)")
+        self.views[name] = f"SELECT * FROM parquet_scan('{path}')"
+        self.con.execute(f"CREATE OR REPLACE TEMP VIEW {name} AS {self.views[name]}")
+
+
+@contextmanager
+def rebuild() -> Iterator[Rebuild]:
+    """
+    Reconstrução atômica de tabelas derivadas (lib/derived, lib/search). No modo "table", numa transação
+    de escrita; no modo "view", no DuckDB em memória, com as views novas publicadas juntas no fim e as
+    versões antigas removidas depois (fica a anterior, ainda lida por consultas em andamento).
+    Em caso de erro nada é trocado.
+    """
+    if storage.MODE != "view":
+        with writer() as con:
+            con.execute("BEGIN TRANSACTION")
+            try:
+                yield Rebuild(con)
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        return
+    _sync_views()
+    with memory() as con:
+        rb = Rebuild(con)
+        try:
+            yield rb
+        except Exception:
+            for version in rb.versions:
+                shutil.rmtree(version, ignore_errors=True)
+            raise
+    publish(rb.views)
+    for version in rb.versions:
+        storage.gc(version.parent, storage.versions(version.parent)[-2:])
@@ -0,0 +1,160 @@
+# lib/derived.py
+# Tabelas derivadas, materializadas no DuckDB (no modo "view", em Parquets versionados; ver lib/db.rebuild)
+# depois da carga das tabelas de origem.
+# Cada derivada declara de quais tabelas depende; quando uma delas é (re)carregada,
+# rebuild_for() reconstrói as derivadas afetadas (se todas as dependências já existem).
+# Depois de uma carga incremental (change_log), refresh_for() refaz só as linhas das chaves alteradas.
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List
+
+import duckdb
+
+from lib import cache, db
+
+
+def _column_type(con: duckdb.DuckDBPyConnection, table: str, column: str) -> str:
+    return con.execute(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = ? AND column_name = ?",
+        (table, column),
+    ).fetchone()[0]
+
+
+def _estabelecimento_cnae_sql(con: duckdb.DuckDBPyConnection, where: str = "TRUE") -> str:
+    tipo = _column_type(con, "estabelecimentos", "cnae_principal")
+    return f"""
+        SELECT * FROM (
+          SELECT cnpj14, cnae_principal AS cnae, TRUE AS principal
+          FROM estabelecimentos WHERE cnae_principal IS NOT NULL AND {where}
+          UNION ALL
+          SELECT cnpj14, TRY_CAST(TRIM(cnae) AS {tipo}) AS cnae, FALSE AS principal
+          FROM (SELECT cnpj14, UNNEST(STRING_SPLIT(cnae_secundaria, ',')) AS cnae FROM estabelecimentos WHERE {where})
+          WHERE TRIM(cnae) <> ''
+        )
+        WHERE cnae IS NOT NULL
+    """
+
+
+def _build_estabelecimento_cnae(rb: db.Rebuild) -> None:
+    """
+    estabelecimento_cnae(cnpj14, cnae, principal): um registro por CNAE do estabelecimento
+    (principal + cada secundária de cnae_secundaria, lista separada por vírgula), ordenado por CNAE
+    para que filtros por código virem semi-junções com poda por row group.
+    """
+    rb.table("estabelecimento_cnae", f"{_estabelecimento_cnae_sql(rb.con)} ORDER BY cnae, cnpj14")
+
+
+def _refresh_estabelecimento_cnae(con: duckdb.DuckDBPyConnection, keys: str) -> None:
+    """Refaz em estabelecimento_cnae só os estabelecimentos (cnpj14) em 'keys'."""
+    con.execute(f"DELETE FROM estabelecimento_cnae WHERE cnpj14 IN {keys}")
+    con.execute(f"INSERT INTO estabelecimento_cnae {_estabelecimento_cnae_sql(con, f'cnpj14 IN {keys}')}")
+
+
+def _estabelecimentos_enriched_sql(where: str = "TRUE") -> str:
+    return f"""
+        SELECT
+          e.*,
+          emp.razao_social, emp.natureza_juridica, nat.descricao AS natureza_nome,
+          emp.capital_social, emp.porte,
+          mun.descricao AS municipio_nome, pais.descricao AS pais_nome
+        FROM estabelecimentos e
+        LEFT JOIN empresas emp  ON emp.cnpj_basico = e.cnpj_basico
+        LEFT JOIN municipios mun ON mun.codigo = e.municipio
+        LEFT JOIN paises pais   ON pais.codigo = e.pais
+        LEFT JOIN naturezas nat ON nat.codigo = emp.natureza_juridica
+        WHERE {where}
+    """
+
+
+def _build_estabelecimentos_enriched(rb: db.Rebuild) -> None:
+    """
+    estabelecimentos_enriched: estabelecimentos com os dados da empresa e as descrições de
+    município, país e natureza jurídica já resolvidas (a junção que as páginas repetiam a cada consulta),
+    ordenada e indexada por cnpj14 (buscas por CNPJ das páginas, relatórios e enriquecimento). É a mesma
+    com estabelecimentos particionado: a poda por UF/situação vale para quem lê estabelecimentos.
+    """
+    rb.table("estabelecimentos_enriched", f"{_estabelecimentos_enriched_sql()} ORDER BY e.cnpj14", ["cnpj14"])
+
+
+def _refresh_enriched_by(column: str) -> Callable[[duckdb.DuckDBPyConnection, str], None]:
+    """Refaz em estabelecimentos_enriched só as linhas cujo 'column' (cnpj14 ou cnpj_basico) está em 'keys'."""
+    def refresh(con: duckdb.DuckDBPyConnection, keys: str) -> None:
+        con.execute(f"DELETE FROM estabelecimentos_enriched WHERE {column} IN {keys}")
+        con.execute(
+            f"INSERT INTO estabelecimentos_enriched BY NAME {_estabelecimentos_enriched_sql(f'e.{column} IN {keys}')}"
+        )
+    return refresh
+
+
+# Derivada -> (tabelas de origem, função que a constrói (lib/db.Rebuild),
+#              atualização incremental por tabela de origem: função(con, subconsulta com as chaves alteradas))
+MATERIALIZADAS: Dict[str, tuple[List[str], Callable[[db.Rebuild], None], Dict[str, Callable]]] = {
+    "estabelecimento_cnae": (
+        ["estabelecimentos"], _build_estabelecimento_cnae,
+        {"estabelecimentos": _refresh_estabelecimento_cnae},
+    ),
+    "estabelecimentos_enriched": (
+        ["estabelecimentos", "empresas", "municipios", "paises", "naturezas"], _build_estabelecimentos_enriched,
+        {"estabelecimentos": _refresh_enriched_by("cnpj14"), "empresas": _refresh_enriched_by("cnpj_basico")},
+    ),
+}
+
+
+def _existing_tables() -> set:
+    with db.reader() as con:
+        return {r[0] for r in con.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+
+
+def build(name: str) -> None:
+    """(Re)constrói a derivada 'name' de uma vez (consultas seguem lendo a versão anterior até a troca)."""
+    _, builder, _ = MATERIALIZADAS[name]
+    with db.rebuild() as rb:
+        builder(rb)
+    cache.bump()
+
+
+def _in_transaction(step: Callable[[duckdb.DuckDBPyConnection], None]) -> None:
+    with db.writer() as con:
+        con.execute("BEGIN TRANSACTION")
+        try:
+            step(con)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+
+def rebuild_for(*tables: str) -> List[str]:
+    """
+    Reconstrói (uma vez cada) as derivadas que dependem de alguma das 'tables'
+    e cujas origens já estão todas carregadas.
+    """
+    existing = _existing_tables()
+    built = []
+    for name, (deps, _, _) in MATERIALIZADAS.items():
+        if set(tables) & set(deps) and all(d in existing for d in deps):
+            build(name)
+            built.append(name)
+    return built
+
+
+def refresh_for(table: str, keys: str, skip: List[str] | tuple = ()) -> List[str]:
+    """
+    Atualiza as derivadas que dependem de 'table' depois de uma carga incremental: só as linhas das
+    chaves em 'keys' (subconsulta, ver lib.loaders.changed_keys_sql) são refeitas, numa transação.
+    Derivadas sem atualização incremental para 'table' são reconstruídas; as em 'skip' (já reconstruídas
+    nesta carga) são ignoradas. Retorna as derivadas reconstruídas por completo.
+    """
+    existing = _existing_tables()
+    built = []
+    for name, (deps, _, refreshers) in MATERIALIZADAS.items():
+        if name in skip or table not in deps or not all(d in existing for d in deps):
+            continue
+        if name in existing and table in refreshers:
+            _in_transaction(lambda con: refreshers[table](con, keys))
+            cache.bump()
+        else:
+            build(name)
+            built.append(name)
+    return built
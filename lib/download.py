@@ -0,0 +1,263 @@
+# lib/download.py
+# Downloads HTTP robustos para os ZIPs da RFB: retomada via Range a partir do arquivo parcial,
+# modo segmentado (faixas de bytes em paralelo) e verificação de tamanho/ETag com arquivo de estado.
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+
+from lib import telemetry
+
+DOWNLOAD_CHUNK = 1024 * 1024
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_TIMEOUT = 60
+
+# Limite de retomadas por segmento, mesmo com progresso (servidor que sempre corta a resposta)
+SEGMENT_MAX_RESUMES = 100
+
+# Segmentos menores que isso não compensam uma conexão extra
+MIN_SEGMENT_BYTES = 16 * 1024 * 1024
+
+# Frequência de gravação do arquivo de estado (em bytes baixados)
+_STATE_EVERY = 8 * 1024 * 1024
+
+
+class DownloadError(RuntimeError):
+    """Falha definitiva de download (após as tentativas) ou arquivo remoto inconsistente."""
+
+
+def _state_path(out_zip: Path) -> Path:
+    return out_zip.with_name(out_zip.name + ".state.json")
+
+
+def _part_path(out_zip: Path) -> Path:
+    return out_zip.with_name(out_zip.name + ".part")
+
+
+def remove_download(out_zip: Path) -> None:
+    """Remove o arquivo baixado junto com o parcial e o arquivo de estado."""
+    for p in (out_zip, _part_path(out_zip), _state_path(out_zip)):
+        p.unlink(missing_ok=True)
+
+
+def remote_info(url: str, session: requests.Session | None = None) -> dict:
+    """
+    HEAD no arquivo remoto: tamanho, ETag, Last-Modified e suporte a Range.
+    """
+    http = session or requests
+    r = http.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT)
+    r.raise_for_status()
+    size = r.headers.get("content-length")
+    return {
+        "url": url,
+        "size": int(size) if size is not None else None,
+        "etag": r.headers.get("etag"),
+        "last_modified": r.headers.get("last-modified"),
+        "ranges": r.headers.get("accept-ranges", "").lower() == "bytes",
+    }
+
+
+def _same_remote(state: dict, info: dict) -> bool:
+    return all(state.get(k) == info.get(k) for k in ("url", "size", "etag", "last_modified"))
+
+
+def _split(size: int, segments: int) -> List[List[int]]:
+    """Divide [0, size) em até 'segments' faixas [início, fim, baixados]."""
+    n = max(1, min(segments, size // MIN_SEGMENT_BYTES or 1))
+    step = -(-size // n)
+    return [[start, min(start + step, size), 0] for start in range(0, size, step)] or [[0, 0, 0]]
+
+
+class _State:
+    """Arquivo de estado (sidecar) com as faixas e bytes já baixados; gravado de forma atômica."""
+
+    def __init__(self, path: Path, data: dict):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+    def save(self) -> None:
+        with self._lock:
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.data), encoding="utf-8")
+            tmp.replace(self.path)
+            self._unsaved = 0
+
+    def advance(self, seg: List[int], nbytes: int) -> None:
+        with self._lock:
+            seg[2] += nbytes
+            self._unsaved += nbytes
+            due = self._unsaved >= _STATE_EVERY
+        if due:
+            self.save()
+
+
+def _fetch_segment(
+    http: requests.Session, info: dict, part: Path, seg: List[int], state: _State, pbar: tqdm, retries: int
+) -> None:
+    """
+    Baixa (com retomada) a faixa [início + baixados, fim) do segmento, gravando no offset correto.
+    Resposta com erro ou mais curta que a faixa pedida = nova tentativa; 'retries' limita as seguidas sem
+    progresso e SEGMENT_MAX_RESUMES o total.
+    """
+    attempt = resumes = 0
+    while seg[0] + seg[2] < seg[1]:
+        offset = seg[0] + seg[2]
+        error = None
+        headers = {"Range": f"bytes={offset}-{seg[1] - 1}"}
+        validator = info.get("etag") or info.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+        try:
+            with http.get(info["url"], headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise DownloadError("O servidor ignorou o Range (arquivo remoto mudou?).")
+                with open(part, "r+b") as f:
+                    f.seek(offset)
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                        if not chunk:
+                            continue
+                        chunk = chunk[: seg[1] - (seg[0] + seg[2])]
+                        f.write(chunk)
+                        state.advance(seg, len(chunk))
+                        pbar.update(len(chunk))
+                        if seg[0] + seg[2] >= seg[1]:
+                            break
+        except (requests.RequestException, OSError) as e:
+            error = e
+        if seg[0] + seg[2] >= seg[1]:
+            break
+        attempt = 0 if seg[0] + seg[2] > offset else attempt + 1
+        resumes += 1
+        if attempt > retries or resumes > SEGMENT_MAX_RESUMES:
+            state.save()
+            raise DownloadError(
+                f"Falha ao baixar {info['url']} (bytes {offset}-{seg[1] - 1}): {error or 'resposta incompleta'}"
+            ) from error
+        if attempt:
+            time.sleep(min(2 ** attempt, 30))
+
+
+def _download_plain(http, url: str, out_zip: Path, progress: bool, retries: int) -> Path:
+    """Download sequencial simples (servidor sem Range/Content-Length): recomeça do zero a cada falha."""
+    for attempt in range(retries + 1):
+        try:
+            with http.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+                r.raise_for_status()
+                total = int(r.headers.get("content-length", 0))
+                with open(out_zip, "wb") as f, tqdm(
+                    total=total, unit="B", unit_scale=True, desc=out_zip.name, disable=not progress
+                ) as pbar:
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                        if chunk:
+                            f.write(chunk)
+                            pbar.update(len(chunk))
+            return out_zip
+        except (requests.RequestException, OSError) as e:
+            if attempt >= retries:
+                raise DownloadError(f"Falha ao baixar {url}: {e}") from e
+            time.sleep(min(2 ** (attempt + 1), 30))
+    return out_zip
+
+
+def download_zip(
+    url: str,
+    out_zip: Path,
+    session: requests.Session | None = None,
+    progress: bool = True,
+    segments: int = 1,
+    retries: int = DOWNLOAD_RETRIES,
+) -> Path:
+    """
+    Baixa um ZIP (streaming) para 'out_zip', com retomada.
+
+    - Os bytes vão para '{out_zip}.part' e o progresso para '{out_zip}.state.json' (URL, tamanho,
+      ETag/Last-Modified e faixas baixadas). Se o job for reiniciado e o arquivo remoto não mudou,
+      só os bytes que faltam são pedidos (Range + If-Range); se mudou, o parcial é descartado.
+    - segments > 1 divide o arquivo em faixas baixadas em paralelo na mesma sessão (pool de conexões).
+    - Ao final o tamanho é conferido com o Content-Length e o '.part' é renomeado para 'out_zip'.
+      O estado fica marcado como completo: uma nova chamada para o mesmo arquivo remoto não baixa nada.
+
+    Servidores sem suporte a Range caem para o download sequencial simples.
+    'session' permite reaproveitar um pool de conexões entre vários downloads;
+    progress=False desliga a barra do tqdm (útil com downloads em paralelo).
+
+    Emite o evento "download_zip" (lib/telemetry): bytes recebidos nesta chamada e tamanho final.
+    """
+    with telemetry.stage("download_zip", url=url) as ev:
+        path = _download_zip(url, out_zip, session, progress, segments, retries, ev)
+        ev["bytes_out"] = path.stat().st_size
+        return path
+
+
+def _download_zip(
+    url: str, out_zip: Path, session: requests.Session | None, progress: bool, segments: int, retries: int,
+    ev: dict,
+) -> Path:
+    out_zip.parent.mkdir(parents=True, exist_ok=True)
+    http = session
+    if http is None:
+        http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(segments, 1))
+        http.mount("http://", adapter)
+        http.mount("https://", adapter)
+    try:
+        info = remote_info(url, http)
+        if not info["ranges"] or not info["size"]:
+            _download_plain(http, url, out_zip, progress, retries)
+            ev["bytes_in"] = out_zip.stat().st_size
+            return out_zip
+
+        state_file, part = _state_path(out_zip), _part_path(out_zip)
+        data = json.loads(state_file.read_text(encoding="utf-8")) if state_file.exists() else {}
+        if not _same_remote(data, info):
+            data = {}
+        if data.get("complete") and out_zip.exists() and out_zip.stat().st_size == info["size"]:
+            ev.update(bytes_in=0, status="inalterado")
+            return out_zip
+        if not data or not part.exists() or data.get("complete"):
+            data = {k: info[k] for k in ("url", "size", "etag", "last_modified")}
+            data["segments"] = _split(info["size"], segments)
+            with open(part, "wb") as f:
+                f.truncate(info["size"])
+        state = _State(state_file, data)
+        state.save()
+
+        todo = [seg for seg in data["segments"] if seg[0] + seg[2] < seg[1]]
+        done = sum(seg[2] for seg in data["segments"])
+        ev["bytes_in"] = info["size"] - done
+        with tqdm(
+            total=info["size"], initial=done, unit="B", unit_scale=True, desc=out_zip.name, disable=not progress
+        ) as pbar:
+            if len(todo) <= 1:
+                for seg in todo:
+                    _fetch_segment(http, info, part, seg, state, pbar, retries)
+            else:
+                with ThreadPoolExecutor(len(todo)) as pool:
+                    futures = [
+                        pool.submit(_fetch_segment, http, info, part, seg, state, pbar, retries) for seg in todo
+                    ]
+                    for fut in futures:
+                        fut.result()
+
+        if sum(seg[2] for seg in data["segments"]) != info["size"] or part.stat().st_size != info["size"]:
+            state.save()
+            raise DownloadError(f"Tamanho final divergente em {out_zip.name} (esperado {info['size']} bytes).")
+        part.replace(out_zip)
+        data["complete"] = True
+        state.save()
+        return out_zip
+    finally:
+        if session is None:
+            http.close()
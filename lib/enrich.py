@@ -0,0 +1,289 @@
+# lib/enrich.py
+# Enriquecimento em massa de arquivos de clientes (CSV ou Parquet com milhões de CNPJs): o arquivo é lido
+# em lotes Arrow, os identificadores de cada lote são normalizados de forma vetorizada (só dígitos, zeros à
+# esquerda repostos, como lib/util.only_digits/mask_cnpj) e cruzados com as tabelas do banco numa junção
+# hash do DuckDB, trazendo só as colunas escolhidas (CAMPOS). Cada lote enriquecido é gravado em seguida,
+# na ordem do arquivo de entrada, então a memória fica limitada ao tamanho do lote e não ao do arquivo.
+# 14 dígitos (ou 9 a 13, sem os zeros à esquerda) = estabelecimento; 8 dígitos = CNPJ básico, enriquecido
+# com a matriz. A coluna 'resultado_rfb' diz, linha a linha, se o CNPJ foi encontrado.
+
+from __future__ import annotations
+
+import csv
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, List, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from lib import db, export
+
+# Linhas por lote na junção. Cada lote faz uma varredura das tabelas grandes (a tabela hash é o lote),
+# então lotes maiores são mais rápidos; a memória cresce com o lote.
+BATCH_ROWS = 200_000
+
+FORMATOS = ("csv", "parquet")
+
+# Campo de saída -> (expressão SQL, origem): "e" = estabelecimentos_enriched, "c" = cnaes (descrição
+# do CNAE principal), "s" = simples. Só as origens dos campos escolhidos entram na junção.
+CAMPOS = {
+    "razao_social": ("e.razao_social", "e"),
+    "nome_fantasia": ("e.nome_fantasia", "e"),
+    "situacao": ("e.situacao", "e"),
+    "data_situacao": ("e.data_situacao", "e"),
+    "cnae_principal": ("e.cnae_principal", "e"),
+    "cnae_descricao": ("c.descricao", "c"),
+    "uf": ("e.uf", "e"),
+    "municipio": ("e.municipio_nome", "e"),
+    "porte": ("e.porte", "e"),
+    "natureza": ("e.natureza_nome", "e"),
+    "capital_social": ("e.capital_social", "e"),
+    "opcao_simples": ("s.opcao_simples", "s"),
+    "opcao_mei": ("s.opcao_mei", "s"),
+}
+
+CAMPOS_PADRAO = [
+    "razao_social", "situacao", "cnae_principal", "cnae_descricao", "municipio", "uf", "porte",
+    "opcao_simples", "opcao_mei",
+]
+
+# Colunas de estabelecimentos_enriched que cada campo precisa na junção
+_COLUNAS_E = {"cnae_descricao": "cnae_principal"}
+
+_CSV_OUT = pacsv.WriteOptions(include_header=True, delimiter=";")
+_SAMPLE_BYTES = 64 * 1024
+
+
+# ------------------------------------------------------------------------------
+# Leitura da entrada em lotes
+# ------------------------------------------------------------------------------
+def _is_parquet(source: str | Path | BinaryIO) -> bool:
+    return str(getattr(source, "name", source)).lower().endswith(".parquet")
+
+
+def _sample(source: str | Path | BinaryIO) -> bytes:
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            return f.read(_SAMPLE_BYTES)
+    source.seek(0)
+    data = source.read(_SAMPLE_BYTES)
+    source.seek(0)
+    return data
+
+
+def _csv_dialect(sample: bytes) -> tuple[str, str, List[str]]:
+    """(codificação, separador, colunas) de um CSV a partir do início do arquivo."""
+    try:
+        text, encoding = sample.decode("utf-8-sig"), "utf8"
+    except UnicodeDecodeError as e:
+        if e.start < len(sample) - 3:  # não é só um caractere cortado no fim da amostra
+            text, encoding = sample.decode("latin1"), "latin1"
+        else:
+            text, encoding = sample[:e.start].decode("utf-8-sig"), "utf8"
+    header = text.splitlines()[0] if text else ""
+    delimiter = max(";,\t", key=header.count)
+    return encoding, delimiter, next(csv.reader([header], delimiter=delimiter), [])
+
+
+def _batches(source: str | Path | BinaryIO, batch_rows: int) -> Iterator[pa.Table]:
+    """
+    Tabelas Arrow de até ~batch_rows linhas, na ordem do arquivo (ao menos uma, mesmo vazia). CSV é
+    lido com todas as colunas como texto (zeros à esquerda e valores do cliente ficam como estão).
+    """
+    if _is_parquet(source):
+        pf = pq.ParquetFile(source)
+        empty = True
+        for batch in pf.iter_batches(batch_size=batch_rows):
+            empty = False
+            yield pa.Table.from_batches([batch])
+        if empty:
+            yield pf.schema_arrow.empty_table()
+        return
+
+    encoding, delimiter, names = _csv_dialect(_sample(source))
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(encoding=encoding),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+        convert_options=pacsv.ConvertOptions(column_types={n: pa.string() for n in names}),
+    )
+    # os blocos do leitor de CSV têm tamanho em bytes; junta até batch_rows linhas
+    pending: List[pa.RecordBatch] = []
+    rows = 0
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= batch_rows:
+            yield pa.Table.from_batches(pending)
+            pending, rows = [], 0
+    if pending or not rows:
+        yield pa.Table.from_batches(pending, schema=reader.schema)
+
+
+def columns(source: str | Path | BinaryIO) -> List[str]:
+    """Colunas do arquivo (só o cabeçalho ou o esquema do Parquet), para escolher a dos CNPJs."""
+    if _is_parquet(source):
+        names = pq.ParquetFile(source).schema_arrow.names
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return names
+    return _csv_dialect(_sample(source))[2]
+
+
+def id_column(names: Sequence[str]) -> str:
+    """Coluna dos identificadores quando não informada: a primeira com 'cnpj' no nome, senão a primeira."""
+    if not names:
+        raise ValueError("Arquivo sem colunas.")
+    return next((n for n in names if "cnpj" in n.lower()), names[0])
+
+
+# ------------------------------------------------------------------------------
+# Normalização e junção
+# ------------------------------------------------------------------------------
+def keys(values: pa.Array | pa.ChunkedArray) -> pa.Table:
+    """
+    Chaves de junção de uma coluna de identificadores (vetorizado, Arrow): _linha (posição no lote),
+    _basico (INTEGER) e _cnpj14 (14 dígitos ou nulo). Mesmas regras do relatório em lote: só os dígitos
+    contam; 8 = CNPJ básico; 9 a 14 = CNPJ completo com zeros à esquerda; o resto fica sem chave (inválido).
+    """
+    digits = pc.replace_substring_regex(pc.cast(values, pa.string()), pattern=r"\D+", replacement="")
+    n = pc.fill_null(pc.utf8_length(digits), 0)
+    full = pc.and_(pc.greater_equal(n, 9), pc.less_equal(n, 14))
+    cnpj14 = pc.if_else(full, pc.utf8_lpad(digits, width=14, padding="0"), pa.scalar(None, pa.string()))
+    basico = pc.if_else(pc.equal(n, 8), digits, pc.utf8_slice_codeunits(cnpj14, 0, 8))
+    return pa.table({
+        "_linha": pa.array(np.arange(len(values), dtype=np.int64)),
+        "_basico": pc.cast(basico, pa.int32()),
+        "_cnpj14": cnpj14,
+    })
+
+
+def enrich_sql(campos: Sequence[str], with_basico: bool = True, chaves: str = "chaves") -> str:
+    """
+    Junção de 'chaves' (ver keys) com as tabelas do banco, trazendo os campos 'campos' (CAMPOS) e
+    resultado_rfb, uma linha por chave, ordenada por _linha. CNPJs completos casam por cnpj14; CNPJs
+    básicos (só se with_basico), pela matriz (id_matriz_filial = 1).
+    """
+    origens = {CAMPOS[c][1] for c in campos}
+    e_cols = sorted({_COLUNAS_E.get(c, CAMPOS[c][0][2:]) for c in campos if CAMPOS[c][1] in ("e", "c")})
+    e_list = "".join(f", e.{c}" for c in e_cols)
+    estab = f"""
+  SELECT k._linha{e_list} FROM {chaves} k JOIN estabelecimentos_enriched e ON e.cnpj14 = k._cnpj14"""
+    if with_basico:
+        estab += f"""
+  UNION ALL
+  SELECT k._linha{e_list} FROM {chaves} k
+  JOIN estabelecimentos_enriched e ON e.cnpj_basico = k._basico AND e.id_matriz_filial = 1
+  WHERE k._cnpj14 IS NULL"""
+    joins = ""
+    if "c" in origens:
+        joins += "\nLEFT JOIN cnaes c ON c.codigo = e.cnae_principal"
+    if "s" in origens:
+        joins += "\nLEFT JOIN simples s ON s.cnpj_basico = k._basico"
+    select = "".join(f",\n  {CAMPOS[c][0]} AS {c}" for c in campos)
+    return f"""
+WITH e AS ({estab}
+)
+SELECT
+  k._linha,
+  CASE WHEN k._basico IS NULL THEN 'invalido'
+       WHEN e._linha IS NULL THEN 'nao_encontrado'
+       ELSE 'encontrado' END AS resultado_rfb{select}
+FROM {chaves} k
+LEFT JOIN e ON e._linha = k._linha{joins}
+ORDER BY k._linha
+"""
+
+
+def _enrich_batch(con, table: pa.Table, column: str, campos: Sequence[str]) -> pa.Table:
+    """O lote com os campos escolhidos e resultado_rfb acrescentados, na mesma ordem de linhas."""
+    k = keys(table.column(column))
+    with_basico = pc.any(pc.and_(pc.is_valid(k["_basico"]), pc.is_null(k["_cnpj14"]))).as_py() or False
+    con.register("chaves", k)
+    try:
+        res = con.execute(enrich_sql(campos, with_basico)).arrow()
+    finally:
+        con.unregister("chaves")
+    if res.num_rows != table.num_rows:  # registro repetido na origem: fica o primeiro de cada linha
+        _, first = np.unique(res.column("_linha").to_numpy(), return_index=True)
+        res = res.take(pa.array(first))
+    out = table
+    for name in res.column_names[1:]:
+        out = out.append_column(name if name not in table.column_names else f"{name}_rfb", res.column(name))
+    return out
+
+
+# ------------------------------------------------------------------------------
+# Pipeline
+# ------------------------------------------------------------------------------
+def enrich(
+    source: str | Path | BinaryIO,
+    column: str | None = None,
+    campos: Sequence[str] | None = None,
+    fmt: str = "csv",
+    out: str | Path | None = None,
+    batch_rows: int = BATCH_ROWS,
+    on_progress: Callable[[int, float], None] | None = None,
+) -> dict:
+    """
+    Enriquece o CSV/Parquet 'source' (caminho ou arquivo aberto, ex. UploadedFile; Parquet pelo nome
+    .parquet) pela coluna de CNPJs 'column' (padrão: id_column) com os campos 'campos' (padrão
+    CAMPOS_PADRAO) e grava em 'out' (padrão: EXPORT_DIR de lib/export) no formato 'fmt' ("csv" com ';'
+    ou "parquet"), lote a lote e na ordem da entrada. on_progress(linhas, segundos) a cada lote.
+
+    Retorna {"path", "rows", "encontrados", "nao_encontrados", "invalidos", "bytes", "seconds",
+    "linhas_por_s", "format", "mime", "coluna"}.
+    """
+    if fmt not in FORMATOS:
+        raise ValueError(f"Formato deve ser um de {FORMATOS}, não {fmt!r}")
+    campos = list(campos or CAMPOS_PADRAO)
+    unknown = [c for c in campos if c not in CAMPOS]
+    if unknown:
+        raise ValueError(f"Campos desconhecidos: {', '.join(unknown)} (use: {', '.join(CAMPOS)})")
+    if out is None:
+        export.cleanup()
+        export.EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        out = export.EXPORT_DIR / f"enriquecido_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{fmt}"
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    part = out.with_name(out.name + ".part")
+
+    t0 = time.perf_counter()
+    counts = {"encontrado": 0, "nao_encontrado": 0, "invalido": 0}
+    rows, writer = 0, None
+    try:
+        for table in _batches(source, batch_rows):
+            column = column or id_column(table.column_names)
+            if column not in table.column_names:
+                raise ValueError(f"Coluna {column!r} não existe no arquivo (colunas: {', '.join(table.column_names)})")
+            with db.reader() as con:  # o arquivo é liberado entre os lotes (cargas não esperam o fim)
+                enriched = _enrich_batch(con, table, column, campos)
+            if writer is None:
+                writer = (pacsv.CSVWriter(part, enriched.schema, write_options=_CSV_OUT) if fmt == "csv"
+                          else pq.ParquetWriter(part, enriched.schema, compression="zstd"))
+            writer.write_table(enriched)
+            for r in pc.value_counts(enriched.column("resultado_rfb")).to_pylist():
+                counts[r["values"]] += r["counts"]
+            rows += table.num_rows
+            if on_progress:
+                on_progress(rows, time.perf_counter() - t0)
+        writer.close()
+        writer = None
+        part.replace(out)
+    finally:
+        if writer is not None:
+            writer.close()
+        part.unlink(missing_ok=True)
+    secs = time.perf_counter() - t0
+    return {
+        "path": out.as_posix(), "rows": rows, "encontrados": counts["encontrado"],
+        "nao_encontrados": counts["nao_encontrado"], "invalidos": counts["invalido"],
+        "bytes": out.stat().st_size, "seconds": round(secs, 3),
+        "linhas_por_s": round(rows / secs, 1) if secs else None,
+        "format": fmt, "mime": export.FORMATOS[fmt]["mime"], "coluna": column,
+    }
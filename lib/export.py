@@ -0,0 +1,141 @@
+# lib/export.py
+# Exportação do resultado completo de uma consulta (sem LIMIT), direto do DuckDB para arquivo com
+# COPY (...) TO: as linhas não passam pelo pandas nem pela memória do Python, só pelo pipeline em
+# streaming do DuckDB, então a memória fica constante qualquer que seja o tamanho do resultado.
+# O arquivo é gravado em data/exports (como .part até terminar) e servido pelo download da página;
+# exportações antigas são apagadas depois de EXPORT_TTL_S. Exportações simultâneas são limitadas.
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable
+
+import duckdb
+
+from lib import db
+
+EXPORT_DIR = Path(os.environ.get("CNPJ_EXPORT_DIR", str(Path("data") / "exports")))
+
+# Exportações simultâneas no processo e espera máxima por uma vaga (segundos)
+EXPORT_MAX_CONCURRENT = int(os.environ.get("CNPJ_EXPORT_MAX", "2"))
+EXPORT_WAIT_S = float(os.environ.get("CNPJ_EXPORT_WAIT_S", "5"))
+
+# Arquivos exportados são mantidos por este tempo (segundos)
+EXPORT_TTL_S = int(os.environ.get("CNPJ_EXPORT_TTL_S", str(6 * 3600)))
+
+# O download_button do Streamlit carrega o arquivo na memória do servidor: acima deste tamanho,
+# a página mostra o caminho do arquivo no servidor em vez do botão
+DOWNLOAD_MAX_BYTES = int(os.environ.get("CNPJ_EXPORT_DOWNLOAD_MB", "512")) * 1024 * 1024
+
+# Formato -> extensão, MIME e opções do COPY
+FORMATOS = {
+    "csv": {"ext": "csv", "mime": "text/csv", "options": "FORMAT CSV, DELIMITER ';', HEADER"},
+    "csv.gz": {
+        "ext": "csv.gz", "mime": "application/gzip",
+        "options": "FORMAT CSV, DELIMITER ';', HEADER, COMPRESSION gzip",
+    },
+    "csv.zst": {
+        "ext": "csv.zst", "mime": "application/zstd",
+        "options": "FORMAT CSV, DELIMITER ';', HEADER, COMPRESSION zstd",
+    },
+    "parquet": {
+        "ext": "parquet", "mime": "application/octet-stream",
+        "options": "FORMAT PARQUET, COMPRESSION zstd",
+    },
+    "parquet (gzip)": {
+        "ext": "parquet", "mime": "application/octet-stream",
+        "options": "FORMAT PARQUET, COMPRESSION gzip",
+    },
+}
+
+_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+
+class ExportBusyError(RuntimeError):
+    """Limite de exportações simultâneas atingido (tente de novo em instantes)."""
+
+
+def cleanup(max_age_s: int | None = None) -> int:
+    """Apaga exportações (e arquivos .part abandonados) mais antigas que max_age_s; retorna quantas."""
+    if not EXPORT_DIR.exists():
+        return 0
+    limit = time.time() - (EXPORT_TTL_S if max_age_s is None else max_age_s)
+    n = 0
+    for p in EXPORT_DIR.iterdir():
+        if p.is_file() and p.stat().st_mtime < limit:
+            p.unlink(missing_ok=True)
+            n += 1
+    return n
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def export(
+    sql: str,
+    params: list | tuple | None = None,
+    fmt: str = "csv",
+    name: str = "export",
+    on_progress: Callable[[int, float], None] | None = None,
+    poll_s: float = 0.5,
+) -> dict:
+    """
+    Grava o resultado completo de 'sql' (com 'params') em EXPORT_DIR no formato 'fmt' (ver FORMATOS).
+    O COPY roda numa thread com cursor próprio; a thread que chamou recebe on_progress(bytes_gravados,
+    segundos) a cada 'poll_s' (seguro para atualizar elementos do Streamlit).
+    Levanta ExportBusyError se não houver vaga em EXPORT_WAIT_S.
+
+    Retorna {"path", "rows", "bytes", "seconds", "format", "mime"}.
+    """
+    spec = FORMATOS[fmt]
+    if not _slots.acquire(timeout=EXPORT_WAIT_S):
+        raise ExportBusyError(
+            f"Já há {EXPORT_MAX_CONCURRENT} exportação(ões) em andamento; tente novamente em instantes."
+        )
+    try:
+        cleanup()
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        out = EXPORT_DIR / f"{name}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{spec['ext']}"
+        part = out.with_name(out.name + ".part")
+        result: dict = {}
+
+        def run(con: duckdb.DuckDBPyConnection) -> None:
+            try:
+                copy = f"COPY ({sql}) TO '{part.as_posix()}' ({spec['options']})"
+                result["rows"] = con.execute(copy, list(params or ())).fetchone()[0]
+            except Exception as e:  # repassada para a thread que chamou
+                result["error"] = e
+
+        t0 = time.perf_counter()
+        with db.reader() as con:
+            worker = threading.Thread(target=run, args=(con,), name="cnpj-export", daemon=True)
+            worker.start()
+            try:
+                while worker.is_alive():
+                    worker.join(poll_s)
+                    if on_progress:
+                        on_progress(_size(part), time.perf_counter() - t0)
+            finally:
+                worker.join()
+        if "error" in result:
+            part.unlink(missing_ok=True)
+            raise result["error"]
+        part.replace(out)
+        return {
+            "path": out.as_posix(),
+            "rows": result["rows"],
+            "bytes": _size(out),
+            "seconds": round(time.perf_counter() - t0, 3),
+            "format": fmt,
+            "mime": spec["mime"],
+        }
+    finally:
+        _slots.release()
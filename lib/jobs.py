@@ -0,0 +1,515 @@
+# lib/jobs.py
+# Fila de cargas em segundo plano: as páginas só enfileiram (enqueue_*) e acompanham (get/list_jobs);
+# os workers rodam os prepare_* de lib/loaders fora das sessões do Streamlit, então fechar a aba ou
+# recarregar a página não interrompe nem duplica a carga. A fila fica num SQLite (data/jobs.sqlite), com:
+#   - trava por dataset: um job só começa quando nenhum outro em andamento usa os mesmos datasets;
+#   - cancelamento cooperativo: o job para no início da próxima etapa (lib/telemetry.Cancelled);
+#   - novas tentativas com espera crescente; jobs de um worker que morreu (sem heartbeat) voltam à fila;
+#   - andamento (etapa atual, partes concluídas) a partir dos eventos de lib/telemetry.
+#
+# Os workers são threads: no servidor do Streamlit (start_workers, um pool por processo, independente
+# das sessões) ou num processo só de carga, sem interface (com CNPJ_JOB_WORKERS=0 no Streamlit):
+#
+#   python -m lib.jobs --workers 2
+#
+# Os processos só abrem o cnpj.duckdb durante cada leitura/escrita (lib/db), então o Streamlit e o
+# processo de carga dividem o banco. No modo "table" as consultas esperam as escritas da carga terminarem
+# (até CNPJ_DB_LOCK_WAIT_S); no modo "view" (lib/storage.MODE) elas nem abrem o arquivo e não esperam.
+# A conversão pesada continua nos processos de conversão de prepare_all_for_month.
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, List
+
+import pandas as pd
+
+from lib import db, loaders, telemetry
+from lib.schema import DATASETS
+
+JOBS_PATH = Path(os.environ.get("CNPJ_JOBS_DB", str(Path("data") / "jobs.sqlite")))
+
+# Uploads ficam em disco até o job terminar (a sessão que enviou pode não existir mais)
+UPLOAD_DIR = Path("data") / "jobs" / "uploads"
+
+# Workers iniciados por start_workers (0 = nenhum; a fila é atendida por python -m lib.jobs)
+JOB_WORKERS = int(os.environ.get("CNPJ_JOB_WORKERS", "1"))
+
+# Novas tentativas depois de uma falha e espera antes da 1ª (dobra a cada tentativa)
+JOB_RETRIES = int(os.environ.get("CNPJ_JOB_RETRIES", "2"))
+RETRY_BACKOFF_S = float(os.environ.get("CNPJ_JOB_BACKOFF_S", "30"))
+
+# Intervalo de consulta à fila, de gravação do andamento e tempo sem heartbeat até o job voltar à fila
+POLL_S = 2.0
+HEARTBEAT_S = 5.0
+STALE_S = 60.0
+
+ATIVOS = ("na_fila", "rodando")
+FINAIS = ("ok", "erro", "cancelado")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    datasets TEXT NOT NULL,
+    dedup_key TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    run_id TEXT,
+    worker TEXT,
+    stage TEXT,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    run_after REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, run_after);
+CREATE TABLE IF NOT EXISTS job_locks (
+    dataset TEXT PRIMARY KEY,
+    job_id INTEGER NOT NULL
+);
+"""
+
+_ready: set = set()
+_workers: List[threading.Thread] = []
+_workers_lock = threading.Lock()
+_stop = threading.Event()
+
+
+class JobError(RuntimeError):
+    """Carga concluída sem todas as partes (o job falha e pode ser tentado de novo)."""
+
+
+# ------------------------------------------------------------------------------
+# SQLite
+# ------------------------------------------------------------------------------
+@contextmanager
+def _connect() -> Iterator[sqlite3.Connection]:
+    JOBS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(JOBS_PATH, timeout=30, isolation_level=None)
+    con.row_factory = sqlite3.Row
+    try:
+        if JOBS_PATH not in _ready:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_SCHEMA)
+            _ready.add(JOBS_PATH)
+        yield con
+    finally:
+        con.close()
+
+
+@contextmanager
+def _transaction() -> Iterator[sqlite3.Connection]:
+    """Transação com trava de escrita desde o início (reivindicar jobs e travas sem corrida)."""
+    with _connect() as con:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+
+def _row(row: sqlite3.Row | None) -> dict | None:
+    if row is None:
+        return None
+    job = dict(row)
+    for col in ("params", "datasets", "progress", "result"):
+        job[col] = json.loads(job[col]) if job[col] else None
+    return job
+
+
+# ------------------------------------------------------------------------------
+# Enfileirar e acompanhar (páginas)
+# ------------------------------------------------------------------------------
+def enqueue(kind: str, params: dict, datasets: List[str], dedup_key: str | None = None,
+            max_attempts: int | None = None) -> int:
+    """
+    Coloca um job na fila e retorna o id. Se um job igual ('dedup_key'; padrão: tipo + parâmetros)
+    já está na fila ou rodando, retorna o id dele (clique duplo, duas abas).
+    """
+    if kind not in _RUNNERS:
+        raise ValueError(f"Tipo de job desconhecido: {kind}")
+    params_json = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    key = dedup_key or f"{kind}:{params_json}"
+    now = time.time()
+    with _transaction() as con:
+        row = con.execute(
+            f"SELECT id FROM jobs WHERE dedup_key = ? AND status IN {ATIVOS} ORDER BY id LIMIT 1", (key,)
+        ).fetchone()
+        if row:
+            return int(row["id"])
+        cur = con.execute(
+            "INSERT INTO jobs (kind, params, datasets, dedup_key, status, max_attempts, created_at, run_after)"
+            " VALUES (?, ?, ?, ?, 'na_fila', ?, ?, ?)",
+            (kind, params_json, json.dumps(sorted(set(datasets))), key,
+             1 + (JOB_RETRIES if max_attempts is None else max_attempts - 1), now, now),
+        )
+        return int(cur.lastrowid)
+
+
+def enqueue_month(year: int, month: int, targets: List[str] | None = None, **options) -> int:
+    """Carga mensal completa (prepare_all_for_month); 'options' são os demais argumentos dela."""
+    params = {"year": int(year), "month": int(month), "targets": list(targets) if targets else None, **options}
+    return enqueue("month", params, params["targets"] or list(DATASETS))
+
+
+def enqueue_zip_url(url: str, name: str, prefer_keywords: List[str] | None = None, force: bool = False) -> int:
+    """Um ZIP por URL (prepare_from_zip_url)."""
+    params = {"url": url, "name": name, "prefer_keywords": prefer_keywords, "force": bool(force)}
+    return enqueue("zip_url", params, [name])
+
+
+def enqueue_upload(
+    data: bytes | BinaryIO, name: str, kind: str = "zip", prefer_keywords: List[str] | None = None,
+    force: bool = False, encoding: str | None = None,
+) -> int:
+    """
+    Upload de ZIP (kind="zip") ou CSV (kind="csv", na codificação 'encoding'; padrão: a da RFB): o arquivo
+    é copiado em blocos para UPLOAD_DIR (apagado quando o job termina) e o job roda
+    prepare_from_uploaded_zip_bytes/_csv_bytes sobre ele.
+    """
+    if kind not in ("zip", "csv"):
+        raise ValueError(f"Upload deve ser 'zip' ou 'csv', não {kind!r}")
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    path = UPLOAD_DIR / f"{telemetry.new_run_id()}_{name}.{kind}"
+    digest = hashlib.sha1()
+    with open(path, "wb") as f:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            f.write(data)
+            digest.update(data)
+        else:
+            if hasattr(data, "seek"):
+                data.seek(0)
+            while chunk := data.read(1024 * 1024):
+                f.write(chunk)
+                digest.update(chunk)
+    params = {"path": path.as_posix(), "name": name, "prefer_keywords": prefer_keywords, "force": bool(force)}
+    if encoding:
+        params["encoding"] = encoding
+    job_id = enqueue(f"{kind}_upload", params, [name], dedup_key=f"{kind}_upload:{name}:{digest.hexdigest()}")
+    if get(job_id)["params"]["path"] != params["path"]:
+        path.unlink(missing_ok=True)  # mesmo arquivo já na fila
+    return job_id
+
+
+def get(job_id: int) -> dict | None:
+    with _connect() as con:
+        return _row(con.execute("SELECT * FROM jobs WHERE id = ?", (int(job_id),)).fetchone())
+
+
+def list_jobs(limit: int = 50, statuses: tuple | None = None) -> pd.DataFrame:
+    """Jobs mais recentes primeiro, com o andamento resumido ("partes" concluídas/total)."""
+    where = f"WHERE status IN ({', '.join('?' * len(statuses))})" if statuses else ""
+    with _connect() as con:
+        df = pd.read_sql_query(
+            f"SELECT * FROM jobs {where} ORDER BY id DESC LIMIT {int(limit)}", con, params=list(statuses or ())
+        )
+    prog = df["progress"].map(lambda s: json.loads(s) if s else {})
+    df["partes"] = prog.map(lambda p: f"{p['partes']}/{p['total']}" if p.get("total") else None)
+    df["etapas"] = prog.map(lambda p: p.get("etapas"))
+    df["datasets"] = df["datasets"].map(lambda s: ", ".join(json.loads(s)))
+    for col in ("created_at", "started_at", "finished_at"):
+        df[col] = pd.to_datetime(df[col], unit="s").dt.floor("s")
+    return df[["id", "kind", "datasets", "status", "stage", "partes", "etapas", "attempts", "max_attempts",
+               "error", "created_at", "started_at", "finished_at", "run_id", "worker"]]
+
+
+def cancel(job_id: int) -> bool:
+    """
+    Cancela um job: na fila, sai na hora; rodando, para no início da próxima etapa (a etapa em
+    andamento termina, e um dataset incompleto não é registrado). False se o job já terminou.
+    """
+    with _transaction() as con:
+        row = con.execute("SELECT status FROM jobs WHERE id = ?", (int(job_id),)).fetchone()
+        if row is None or row["status"] not in ATIVOS:
+            return False
+        if row["status"] == "na_fila":
+            con.execute("UPDATE jobs SET status = 'cancelado', finished_at = ? WHERE id = ?",
+                        (time.time(), int(job_id)))
+        else:
+            con.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (int(job_id),))
+    if row["status"] == "na_fila":
+        _remove_upload(get(job_id))
+    return True
+
+
+def retry(job_id: int) -> bool:
+    """Recoloca na fila um job com erro ou cancelado (novas tentativas do zero)."""
+    job = get(job_id)
+    if job is None or job["status"] not in ("erro", "cancelado"):
+        return False
+    if job["kind"].endswith("_upload") and not Path(job["params"]["path"]).exists():
+        return False  # o arquivo enviado já foi apagado
+    with _transaction() as con:
+        con.execute(
+            "UPDATE jobs SET status = 'na_fila', attempts = 0, cancel_requested = 0, error = NULL,"
+            " finished_at = NULL, run_after = ? WHERE id = ? AND status IN ('erro', 'cancelado')",
+            (time.time(), int(job_id)),
+        )
+    return True
+
+
+# ------------------------------------------------------------------------------
+# Execução
+# ------------------------------------------------------------------------------
+def _run_month(params: dict) -> dict:
+    parts = loaders.month_parts(params["year"], params["month"], params.get("targets"), params.get("base_url"))
+    prepared = loaders.prepare_all_for_month(**params)
+    missing = len(parts) - len(prepared)
+    if missing:
+        raise JobError(f"{missing} de {len(parts)} parte(s) não foram carregadas (ver load_catalog).")
+    return {"partes": len(prepared), "datasets": sorted({d for d, _ in prepared})}
+
+
+def _run_zip_url(params: dict) -> dict:
+    parquet = loaders.prepare_from_zip_url(
+        params["url"], params["name"], prefer_keywords=params.get("prefer_keywords"), force=params.get("force", False)
+    )
+    return {"parquet": Path(parquet).as_posix()}
+
+
+def _run_zip_upload(params: dict) -> dict:
+    with open(params["path"], "rb") as f:
+        parquet = loaders.prepare_from_uploaded_zip_bytes(
+            f, params["name"], prefer_keywords=params.get("prefer_keywords"), force=params.get("force", False)
+        )
+    return {"parquet": Path(parquet).as_posix()}
+
+
+def _run_csv_upload(params: dict) -> dict:
+    with open(params["path"], "rb") as f:
+        parquet = loaders.prepare_from_uploaded_csv_bytes(f, params["name"], params.get("encoding") or loaders.CSV_ENCODING)
+    return {"parquet": Path(parquet).as_posix()}
+
+
+_RUNNERS: dict[str, Callable[[dict], dict]] = {
+    "month": _run_month,
+    "zip_url": _run_zip_url,
+    "zip_upload": _run_zip_upload,
+    "csv_upload": _run_csv_upload,
+}
+
+
+def _expected_parts(job: dict) -> int | None:
+    p = job["params"]
+    if job["kind"] == "month":
+        return len(loaders.month_parts(p["year"], p["month"], p.get("targets"), p.get("base_url")))
+    return None
+
+
+def _requeue_stale(con: sqlite3.Connection, now: float) -> None:
+    """Jobs "rodando" sem heartbeat (worker morto): voltam à fila ou, sem tentativas, viram erro."""
+    for row in con.execute(
+        "SELECT id, attempts, max_attempts FROM jobs WHERE status = 'rodando' AND heartbeat_at < ?",
+        (now - STALE_S,),
+    ).fetchall():
+        con.execute("DELETE FROM job_locks WHERE job_id = ?", (row["id"],))
+        status = "na_fila" if row["attempts"] < row["max_attempts"] else "erro"
+        con.execute(
+            "UPDATE jobs SET status = ?, error = 'worker interrompido', run_after = ?, worker = NULL,"
+            " finished_at = ? WHERE id = ?",
+            (status, now, None if status == "na_fila" else now, row["id"]),
+        )
+
+
+def claim(worker: str) -> dict | None:
+    """
+    Reivindica o job mais antigo pronto para rodar cujos datasets estejam livres, travando-os.
+    Retorna o job (status "rodando") ou None.
+    """
+    now = time.time()
+    with _transaction() as con:
+        _requeue_stale(con, now)
+        busy = {r["dataset"] for r in con.execute("SELECT dataset FROM job_locks")}
+        for row in con.execute(
+            "SELECT * FROM jobs WHERE status = 'na_fila' AND run_after <= ? ORDER BY id", (now,)
+        ).fetchall():
+            datasets = json.loads(row["datasets"])
+            if busy.intersection(datasets):
+                continue
+            con.executemany("INSERT INTO job_locks (dataset, job_id) VALUES (?, ?)",
+                            [(d, row["id"]) for d in datasets])
+            run_id = telemetry.new_run_id()
+            con.execute(
+                "UPDATE jobs SET status = 'rodando', attempts = attempts + 1, worker = ?, run_id = ?,"
+                " started_at = ?, heartbeat_at = ?, finished_at = NULL, stage = NULL, progress = NULL"
+                " WHERE id = ?",
+                (worker, run_id, now, now, row["id"]),
+            )
+            return _row(con.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+    return None
+
+
+def _finish(job: dict, status: str, result: dict | None = None, error: str | None = None,
+            progress: dict | None = None) -> str:
+    """Libera as travas e grava o fim do job; uma falha com tentativas restantes volta à fila."""
+    now = time.time()
+    run_after = None
+    if status == "erro" and job["attempts"] < job["max_attempts"]:
+        status = "na_fila"
+        run_after = now + RETRY_BACKOFF_S * 2 ** (job["attempts"] - 1)
+    with _transaction() as con:
+        con.execute("DELETE FROM job_locks WHERE job_id = ?", (job["id"],))
+        con.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, progress = COALESCE(?, progress), stage = NULL,"
+            " finished_at = ?, heartbeat_at = ?, run_after = COALESCE(?, run_after) WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error,
+             json.dumps(progress) if progress is not None else None,
+             None if run_after else now, now, run_after, job["id"]),
+        )
+    if status in FINAIS:
+        _remove_upload(job)
+    return status
+
+
+def _remove_upload(job: dict | None) -> None:
+    if job and job["kind"].endswith("_upload"):
+        Path(job["params"]["path"]).unlink(missing_ok=True)
+
+
+def run_job(job: dict) -> str:
+    """
+    Roda um job reivindicado: o prepare_* correspondente sob o run_id do job, com heartbeat/andamento
+    gravados a cada HEARTBEAT_S e cancelamento no início de cada etapa. Retorna o status final.
+    """
+    run_id = job["run_id"]
+    cancel = threading.Event()
+    done = threading.Event()
+    progress = {"etapas": 0, "erros": 0, "partes": 0, "total": _expected_parts(job)}
+    parts_done: set = set()
+    current = {"stage": None}
+
+    def on_event(ev: dict) -> None:
+        if ev.get("run_id") != run_id:
+            return
+        if ev.get("status") == "rodando":
+            if cancel.is_set():
+                raise telemetry.Cancelled("Job cancelado.")
+            current["stage"] = " ".join(str(ev[k]) for k in ("stage", "part") if ev.get(k))
+            return
+        progress["etapas"] += 1
+        progress["erros"] += ev.get("status") == "erro"
+        if ev.get("part") and (
+            (ev["stage"] == "read_csv_semicolon_to_parquet" and ev["status"] == "ok")
+            or (ev["stage"] == "remote_check" and ev["status"] == "inalterado")
+        ):
+            parts_done.add((ev.get("dataset"), ev["part"]))
+            progress["partes"] = len(parts_done)
+
+    def heartbeat() -> None:
+        while not done.wait(HEARTBEAT_S):
+            try:
+                with _connect() as con:
+                    con.execute(
+                        "UPDATE jobs SET heartbeat_at = ?, stage = ?, progress = ? WHERE id = ?",
+                        (time.time(), current["stage"], json.dumps(progress), job["id"]),
+                    )
+                    row = con.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+                if row and row["cancel_requested"]:
+                    cancel.set()
+            except sqlite3.Error:
+                pass  # a fila ocupada não derruba a carga; tenta de novo no próximo intervalo
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+    try:
+        with telemetry.subscribe(on_event), telemetry.context(run_id=run_id, job_id=job["id"]):
+            result = _RUNNERS[job["kind"]](job["params"])
+        status, error = "ok", None  # terminou inteiro antes de o cancelamento chegar
+    except telemetry.Cancelled:
+        status, error, result = "cancelado", None, None
+    except Exception as e:
+        result = None
+        status, error = ("cancelado", None) if cancel.is_set() else ("erro", str(e) or type(e).__name__)
+    finally:
+        done.set()
+        beat.join()
+    return _finish(job, status, result, error, progress)
+
+
+def work(worker: str, stop: threading.Event, once: bool = False) -> None:
+    """Laço de um worker: reivindica e roda jobs até 'stop' (ou, com once=True, até a fila esvaziar)."""
+    while not stop.is_set():
+        try:
+            job = claim(worker)
+        except sqlite3.Error:
+            job = None
+        if job is not None:
+            run_job(job)
+        elif once:
+            return
+        else:
+            stop.wait(POLL_S)
+
+
+def start_workers(n: int | None = None) -> int:
+    """
+    Inicia (uma vez por processo) 'n' workers em threads daemon; retorna quantos estão rodando.
+    Não inicia nada com o banco somente leitura ou com CNPJ_JOB_WORKERS=0.
+    """
+    n = JOB_WORKERS if n is None else n
+    if db.READ_ONLY or n <= 0:
+        return 0
+    with _workers_lock:
+        alive = [t for t in _workers if t.is_alive()]
+        for i in range(len(alive), n):
+            name = f"{socket.gethostname()}:{os.getpid()}:{i}"
+            t = threading.Thread(target=work, args=(name, _stop), name=f"cnpj-job-{i}", daemon=True)
+            t.start()
+            alive.append(t)
+        _workers[:] = alive
+        return len(alive)
+
+
+# ------------------------------------------------------------------------------
+# Processo só de carga
+# ------------------------------------------------------------------------------
+def main(argv: List[str] | None = None) -> None:
+    """Processo de carga sem interface: workers atendendo a fila até Ctrl+C (ou até ela esvaziar, com --once)."""
+    ap = argparse.ArgumentParser(description="Worker da fila de cargas (data/jobs.sqlite).")
+    ap.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1), help="jobs simultâneos")
+    ap.add_argument("--once", action="store_true", help="sai quando não houver job pronto para rodar")
+    args = ap.parse_args(argv)
+    if db.READ_ONLY:
+        ap.error("o banco está em modo somente leitura (CNPJ_DB_READ_ONLY); o processo de carga precisa escrever")
+
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=work, args=(f"{socket.gethostname()}:{os.getpid()}:{i}", stop, args.once))
+        for i in range(args.workers)
+    ]
+    for t in threads:
+        t.start()
+    print(f"{len(threads)} worker(s) atendendo {JOBS_PATH} (Ctrl+C para parar depois dos jobs em andamento)")
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(1)
+    except KeyboardInterrupt:
+        stop.set()
+        for t in threads:
+            t.join()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
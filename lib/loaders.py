@@ -4,15 +4,31 @@
 
 from __future__ import annotations
 
+import codecs
 import io
+import json
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import sys
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, BinaryIO, Callable, ContextManager, Iterator, List, Tuple
 
 import duckdb
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
-from tqdm import tqdm
+from requests.adapters import HTTPAdapter
+
+from lib import cache, db, derived, manifest, querylog, search, storage, telemetry
+from lib.download import download_zip, remove_download
+from lib.schema import CHAVES, DATASETS, DERIVADAS, INDICES, NUMERACAO, ORDENACAO, PARTICOES, TIPOS, column_names
 
 # ------------------------------------------------------------------------------
 # Paths e inicialização
@@ -20,70 +36,447 @@ from tqdm import tqdm
 DATA = Path("data")
 DATA.mkdir(exist_ok=True)
 
-DB_PATH = (DATA / "cnpj.duckdb").as_posix()
+# Caminho do banco e configuração (threads, memory_limit, somente leitura) ficam em lib/db
+DB_PATH = db.DB_PATH
+
+# Motor padrão de conversão:
+#   - "duckdb": read_csv paralelo do DuckDB gravando o Parquet final numa única passada;
+#   - "pandas": leitura em chunks + parquets temporários (fallback).
+INGEST_ENGINE = "duckdb"
+
+# Modo de schema padrão: "typed" (tipos de lib/schema.TIPOS) ou "raw" (tudo VARCHAR)
+SCHEMA_MODE = "typed"
+
+# Índices (ART) nas chaves de lib/schema.INDICES ao registrar as tabelas: buscas pontuais por CNPJ
+# ficam em milissegundos, ao custo de memória/tempo na carga. Desligue para cargas em máquinas pequenas.
+CREATE_INDEXES = True
+
+# Armazenamento particionado (Hive) para as tabelas de lib/schema.PARTICOES: cada Parquet vira um
+# diretório {uf=XX/situacao=YY}/data_N.parquet e a tabela é uma view com hive_partitioning, de modo que
+# filtros por UF/situação leem só as partições correspondentes.
+PARTITIONED_STORAGE = os.environ.get("CNPJ_PARTITIONED", "").lower() in ("1", "true", "sim")
+
+# Parâmetros de escrita dos Parquets (min/max por coluna e row group são gravados pelo DuckDB)
+PARQUET_COMPRESSION = "zstd"
+PARQUET_ROW_GROUP_SIZE = 122_880
+
+# Encoding padrão dos arquivos da RFB
+CSV_ENCODING = "latin1"
+
+# Tamanho dos blocos de cópia/descompressão em streaming (memória limitada por este valor)
+_COPY_BUFSIZE = 1024 * 1024
 
 
 # ------------------------------------------------------------------------------
 # Conexão / Execução de consultas
 # ------------------------------------------------------------------------------
-def open_con() -> duckdb.DuckDBPyConnection:
-    """Abre conexão com o banco DuckDB local."""
-    return duckdb.connect(DB_PATH, read_only=False)
+def open_con() -> ContextManager[duckdb.DuckDBPyConnection]:
+    """Cursor de consulta no banco DuckDB local, para usar com 'with' (o arquivo fica aberto só no bloco)."""
+    return db.reader()
 
 
-def query(sql: str, params: Tuple | None = None) -> pd.DataFrame:
-    """Executa uma consulta SQL no banco DuckDB e retorna DataFrame."""
-    con = open_con()
+def _timed(sql: str, params: Tuple | list | None, source: str, run: Callable[[], Any]) -> Any:
+    """Executa run() registrando tempo, linhas e bytes no log de consultas (lib/querylog), se ligado."""
+    if not querylog.QUERY_LOG_ENABLED:
+        return run()
+    t0 = time.perf_counter()
     try:
-        return con.execute(sql, params or ()).fetchdf()
-    finally:
-        con.close()
+        out = run()
+    except Exception as e:
+        querylog.record(sql, params, time.perf_counter() - t0, source=source, error=str(e))
+        raise
+    if isinstance(out, pa.Table):
+        rows, nbytes = out.num_rows, out.nbytes
+    else:
+        rows, nbytes = len(out), int(out.memory_usage(index=False).sum())
+    querylog.record(sql, params, time.perf_counter() - t0, rows, nbytes, source)
+    return out
+
+
+def query(sql: str, params: Tuple | None = None) -> pd.DataFrame:
+    """
+    Executa uma consulta SQL no banco DuckDB (cursor de leitura da thread) e retorna DataFrame.
+    Leituras passam pelo cache de resultados (lib/cache), invalidado a cada carga.
+    """
+    def arrow() -> pa.Table:
+        with db.reader() as con:
+            return con.execute(sql, params or ()).arrow()
+
+    def run() -> pd.DataFrame:
+        if not (cache.CACHE_ENABLED and cache.cacheable(sql)):
+            with db.reader() as con:
+                return con.execute(sql, params or ()).fetchdf()
+        # de volta pelo DuckDB (em memória) para manter as conversões de tipo do fetchdf (datas, decimais, enums)
+        return to_pandas(cache.fetch(sql, tuple(params or ()), arrow))
+    return _timed(sql, params, "query", run)
+
+
+def cache_stats() -> dict:
+    """Contadores do cache de resultados de query() (ver lib/cache.stats)."""
+    return cache.stats()
+
+
+# ------------------------------------------------------------------------------
+# Paginação por chave (keyset)
+# ------------------------------------------------------------------------------
+# Linhas por página e por record batch Arrow lido do DuckDB
+PAGE_SIZE = int(os.environ.get("CNPJ_PAGE_SIZE", "500"))
+PAGE_BATCH_ROWS = int(os.environ.get("CNPJ_BATCH_ROWS", "10000"))
+
+# Contagem total é exata até este limite ("mais de N" acima dele)
+COUNT_CAP = int(os.environ.get("CNPJ_COUNT_CAP", "100000"))
+
+
+def _fetch_arrow(sql: str, params: list | Tuple, batch_size: int | None = None, source: str = "arrow") -> pa.Table:
+    """Resultado como tabela Arrow, lido em record batches de 'batch_size' linhas (via cache, se couber)."""
+    def run() -> pa.Table:
+        with db.reader() as con:
+            reader = con.execute(sql, list(params)).fetch_record_batch(batch_size or PAGE_BATCH_ROWS)
+            return pa.Table.from_batches(list(reader), schema=reader.schema)
+    if cache.CACHE_ENABLED and cache.cacheable(sql):
+        return _timed(sql, params, source, lambda: cache.fetch(sql, tuple(params), run))
+    return _timed(sql, params, source, run)
+
+
+def iter_batches(sql: str, params: Tuple | None = None, batch_size: int | None = None) -> Iterator[pa.RecordBatch]:
+    """
+    Percorre o resultado em record batches Arrow de 'batch_size' linhas, sem materializá-lo
+    (memória limitada pelo batch). Usa um cursor próprio, fechado (e o banco liberado) ao fim da iteração.
+    """
+    with db.reader() as con:
+        reader = con.execute(sql, params or ()).fetch_record_batch(batch_size or PAGE_BATCH_ROWS)
+        yield from reader
+
+
+def _parse_key(key: List[str]) -> List[Tuple[str, bool]]:
+    """["relevancia DESC", "cnpj14"] -> [("relevancia", True), ("cnpj14", False)]."""
+    out = []
+    for k in key:
+        col, _, direction = k.strip().partition(" ")
+        out.append((col, direction.strip().upper() == "DESC"))
+    return out
+
+
+def _keyset_where(key: List[Tuple[str, bool]], values: list, forward: bool) -> Tuple[str, list]:
+    """
+    Predicado "depois de 'values'" (forward) ou "antes de 'values'" na ordem de 'key'
+    (NULLs por último em cada coluna, como o ORDER BY padrão do DuckDB).
+    """
+    ors, params = [], []
+    for i, (col, desc) in enumerate(key):
+        conds, p = [], []
+        for (prev, _), v in zip(key[:i], values[:i]):
+            conds.append(f'q."{prev}" IS NULL' if v is None else f'q."{prev}" = ?')
+            p += [] if v is None else [v]
+        v, c = values[i], f'q."{col}"'
+        if forward:
+            cond = "FALSE" if v is None else f"({c} {'<' if desc else '>'} ? OR {c} IS NULL)"
+        else:
+            cond = f"{c} IS NOT NULL" if v is None else f"{c} {'>' if desc else '<'} ?"
+        conds.append(cond)
+        p += [] if v is None else [v]
+        ors.append("(" + " AND ".join(conds) + ")")
+        params += p
+    return " OR ".join(ors), params
+
+
+def _order_by(key: List[Tuple[str, bool]], forward: bool) -> str:
+    if forward:
+        return ", ".join(f'q."{c}" {"DESC" if d else "ASC"} NULLS LAST' for c, d in key)
+    return ", ".join(f'q."{c}" {"ASC" if d else "DESC"} NULLS FIRST' for c, d in key)
+
+
+def page_sql(
+    sql: str,
+    params: Tuple | list | None,
+    key: List[str],
+    after: list | None = None,
+    before: list | None = None,
+    page_size: int | None = None,
+) -> Tuple[str, list]:
+    """
+    SQL (e parâmetros) que query_page executa: page_size + 1 linhas depois de 'after' (ou antes de
+    'before', em ordem inversa) na ordem de 'key'.
+    """
+    n = page_size or PAGE_SIZE
+    keys = _parse_key(key)
+    forward = before is None
+    where, where_params = ("TRUE", []) if after is None and before is None else _keyset_where(
+        keys, list(after if forward else before), forward
+    )
+    paged = f"SELECT * FROM ({sql}) q WHERE {where} ORDER BY {_order_by(keys, forward)} LIMIT {n + 1}"
+    return paged, list(params or ()) + where_params
+
+
+def query_page(
+    sql: str,
+    params: Tuple | list | None,
+    key: List[str],
+    after: list | None = None,
+    before: list | None = None,
+    page_size: int | None = None,
+) -> dict:
+    """
+    Uma página do resultado de 'sql' (sem ORDER BY/LIMIT), ordenado por 'key' (colunas do resultado,
+    com " DESC" opcional; a combinação deve identificar a linha). Paginação por chave: after/before são
+    os valores da chave da última/primeira linha da página vizinha, então cada página custa o mesmo
+    e só page_size + 1 linhas são lidas (em record batches Arrow).
+
+    Retorna {"rows": pa.Table, "first": [...], "last": [...], "has_prev": bool, "has_next": bool};
+    "first"/"last" são os cursores para pedir a página anterior (before=) e a seguinte (after=).
+    """
+    n = page_size or PAGE_SIZE
+    keys = _parse_key(key)
+    forward = before is None
+    paged, paged_params = page_sql(sql, params, key, after, before, n)
+    table = _fetch_arrow(paged, paged_params, min(n + 1, PAGE_BATCH_ROWS), source="page")
+    more = table.num_rows > n
+    table = table.slice(0, n)
+    if not forward:
+        table = table.take(pa.array(range(table.num_rows - 1, -1, -1)))
+    cols = [c for c, _ in keys]
+    first = [table.column(c)[0].as_py() for c in cols] if table.num_rows else None
+    last = [table.column(c)[-1].as_py() for c in cols] if table.num_rows else None
+    return {
+        "rows": table,
+        "first": first,
+        "last": last,
+        "has_prev": more if not forward else after is not None,
+        "has_next": more if forward else True,
+    }
+
+
+def count_sql(sql: str, cap: int | None = None) -> str:
+    """SQL da contagem limitada de count_rows."""
+    return f"SELECT COUNT(*) AS n FROM (SELECT 1 FROM ({sql}) q LIMIT {(cap or COUNT_CAP) + 1})"
+
+
+def count_rows(sql: str, params: Tuple | list | None = None, cap: int | None = None) -> Tuple[int, bool]:
+    """
+    Total de linhas de 'sql', contado só até 'cap' (padrão COUNT_CAP) para não pagar a consulta inteira.
+    Retorna (total, exato); exato=False significa "mais de cap".
+    """
+    cap = cap or COUNT_CAP
+    table = _fetch_arrow(count_sql(sql, cap), list(params or ()), source="count")
+    n = table.column("n")[0].as_py()
+    return min(n, cap), n <= cap
+
+
+def to_pandas(table: pa.Table) -> pd.DataFrame:
+    """Tabela Arrow -> DataFrame com as mesmas conversões de tipo de query() (sem abrir o arquivo do banco)."""
+    with db.memory() as con:
+        return con.from_arrow(table).df()
 
 
 # ------------------------------------------------------------------------------
 # Importação para tabelas DuckDB a partir de arquivos Parquet
 # ------------------------------------------------------------------------------
+def _is_hive(parquet_path: Path) -> bool:
+    """True se 'parquet_path' é um diretório com layout Hive (subdiretórios coluna=valor)."""
+    return parquet_path.is_dir() and any(p.is_dir() for p in parquet_path.rglob("*=*"))
+
+
+def _parquet_source(parquet_path: Path) -> str:
+    """Caminho (ou glob, no caso de um diretório de dataset com um Parquet por parte) para o parquet_scan."""
+    if _is_hive(parquet_path):
+        return (parquet_path / "**" / "*.parquet").as_posix()
+    if parquet_path.is_dir():
+        return (parquet_path / "*.parquet").as_posix()
+    return parquet_path.as_posix()
+
+
+def _hive_scan_sql(name: str, parquet_path: Path) -> str:
+    """SELECT sobre um diretório Hive com as colunas na mesma ordem da tabela não particionada."""
+    types = TIPOS.get(name, {}) if SCHEMA_MODE == "typed" else {}
+    hive_types = ", ".join(
+        f"'{c}': {types[c] if isinstance(types.get(c), str) and types[c] not in ('data', 'decimal') else 'VARCHAR'}"
+        for c in PARTICOES.get(name, [])
+    )
+    extra = list(DERIVADAS.get(name, {})) + ([NUMERACAO[name]] if name in NUMERACAO else [])
+    cols = ", ".join(f'"{c}"' for c in (column_names(name) or []) + extra) or "*"
+    opts = f", hive_types={{{hive_types}}}" if hive_types else ""
+    return f"SELECT {cols} FROM read_parquet('{_parquet_source(parquet_path)}', hive_partitioning=true{opts})"
+
+
+def _drop_if_kind(con: duckdb.DuckDBPyConnection, name: str, kind: str) -> None:
+    """Remove 'name' se ele existir como 'kind' ("VIEW" ou "BASE TABLE"), para trocar tabela <-> view."""
+    row = con.execute("SELECT table_type FROM information_schema.tables WHERE table_name = ?", (name,)).fetchone()
+    if row and row[0] == kind:
+        con.execute(f"DROP {'VIEW' if kind == 'VIEW' else 'TABLE'} {name}")
+
+
 def ensure_table_from_parquet(name: str, parquet_path: Path, replace: bool = False) -> None:
     """
     Garante que a tabela 'name' exista e esteja carregada a partir do Parquet informado.
-    Se replace=True, recria a tabela do zero.
+    'parquet_path' pode ser um arquivo ou um diretório de dataset (todas as partes são lidas de uma vez).
+    Se replace=True, recria a tabela do zero, fisicamente ordenada pela chave de lib/schema.ORDENACAO
+    (zone maps por row group resolvem buscas por faixa de CNPJ) e com os índices de lib/schema.INDICES.
+    Um diretório particionado (layout Hive) com replace=True vira uma view com hive_partitioning.
+    No modo "view" (lib/storage.MODE) nada vai para o arquivo do banco: a view sobre o Parquet é publicada
+    no catálogo de serviço (lib/db.publish); replace=False publica a view anterior mais o Parquet novo.
+    A troca é atômica: consultas em andamento seguem lendo a versão anterior.
     """
-    con = open_con()
-    try:
-        if replace:
-            con.execute(f"DROP TABLE IF EXISTS {name}")
-        # Cria a tabela vazia com o schema do parquet (caso ainda não exista)
-        con.execute(
-            f"CREATE TABLE IF NOT EXISTS {name} AS "
-            f"SELECT * FROM parquet_scan('{parquet_path.as_posix()}') LIMIT 0"
-        )
-        # Insere todos os registros do parquet
-        con.execute(
-            f"INSERT INTO {name} SELECT * FROM parquet_scan('{parquet_path.as_posix()}')"
-        )
-    finally:
-        con.close()
+    if storage.MODE not in ("table", "view"):
+        raise ValueError(f"Modo de armazenamento desconhecido: {storage.MODE!r} (use 'table' ou 'view').")
+    with telemetry.stage("ensure_table_from_parquet", table=name, replace=replace) as ev:
+        ev.update(rows=parquet_rows(parquet_path), bytes_in=parquet_bytes(parquet_path))
+        _load_table(name, parquet_path, replace)
+
+
+def _load_table(name: str, parquet_path: Path, replace: bool) -> None:
+    src = _parquet_source(parquet_path)
+    if storage.MODE == "view":
+        sql = _hive_scan_sql(name, parquet_path) if _is_hive(parquet_path) else f"SELECT * FROM parquet_scan('{src}')"
+        current = None if replace else db.published(name)
+        db.publish({name: f"SELECT * FROM ({current}) UNION ALL BY NAME {sql}" if current else sql})
+        cache.bump()
+        return
+    with db.writer() as con:
+        con.execute("BEGIN TRANSACTION")
+        try:
+            if replace and _is_hive(parquet_path):
+                _drop_if_kind(con, name, "BASE TABLE")
+                con.execute(f"CREATE OR REPLACE VIEW {name} AS {_hive_scan_sql(name, parquet_path)}")
+            elif replace:
+                _drop_if_kind(con, name, "VIEW")
+                order = f" ORDER BY {ORDENACAO[name]}" if name in ORDENACAO else ""
+                con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM parquet_scan('{src}'){order}")
+                _create_indexes(con, name)
+            else:
+                # Cria a tabela vazia com o schema do parquet (caso ainda não exista)
+                con.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} AS "
+                    f"SELECT * FROM parquet_scan('{src}') LIMIT 0"
+                )
+                # Insere todos os registros do parquet
+                con.execute(f"INSERT INTO {name} SELECT * FROM parquet_scan('{src}')")
+                _create_indexes(con, name)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    # resultados em cache (lib/cache) de antes da troca deixam de valer
+    cache.bump()
+
+
+def _create_indexes(con: duckdb.DuckDBPyConnection, name: str) -> None:
+    """Cria (se faltarem) os índices de lib/schema.INDICES para as colunas que existem na tabela."""
+    if not CREATE_INDEXES:
+        return
+    cols = {r[0] for r in con.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?", (name,)
+    ).fetchall()}
+    for col in INDICES.get(name, []):
+        if col in cols:
+            con.execute(f"CREATE INDEX IF NOT EXISTS {name}_{col}_idx ON {name} ({col})")
 
 
 # ------------------------------------------------------------------------------
-# Download utilitário (com barra de progresso)
+# Carga incremental (diff mês a mês pela chave de lib/schema.CHAVES)
 # ------------------------------------------------------------------------------
-def download_zip(url: str, out_zip: Path) -> Path:
+def _columns_with_types(con: duckdb.DuckDBPyConnection, select_sql: str) -> dict:
+    return {r[0]: r[1] for r in con.execute(f"DESCRIBE {select_sql}").fetchall()}
+
+
+def upsert_table_from_parquet(name: str, parquet_path: Path, month: str) -> dict | None:
     """
-    Baixa um ZIP (streaming) para 'out_zip'.
+    Aplica sobre a tabela 'name' só o que mudou no Parquet novo: compara, pela chave de lib/schema.CHAVES,
+    o hash das colunas não-chave da versão nova com o da tabela atual e executa os inserts, updates
+    (delete + insert) e deletes necessários, numa transação. Cada mudança é anotada em
+    change_log(month, tabela, key, op, changed_columns, logged_at); uma nova aplicação do mesmo mês
+    substitui as anotações anteriores dele.
+
+    Retorna {"insert": n, "update": n, "delete": n}, ou None quando o diff não se aplica (tabela inexistente,
+    view particionada, modo "view" ou schema diferente) e a tabela deve ser recriada com ensure_table_from_parquet.
+    As linhas novas entram no fim da tabela: a ordenação física por ORDENACAO volta na próxima recriação.
     """
-    out_zip.parent.mkdir(parents=True, exist_ok=True)
-    with requests.get(url, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        total = int(r.headers.get("content-length", 0))
-        with open(out_zip, "wb") as f, tqdm(
-            total=total, unit="B", unit_scale=True, desc=out_zip.name
-        ) as pbar:
-            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
-                    pbar.update(len(chunk))
-    return out_zip
+    key = CHAVES.get(name)
+    src = _parquet_source(parquet_path)
+    if key is None or _is_hive(parquet_path) or storage.MODE == "view":
+        return None
+    with db.writer() as con:
+        row = con.execute("SELECT table_type FROM information_schema.tables WHERE table_name = ?", (name,)).fetchone()
+        if not row or row[0] != "BASE TABLE":
+            return None
+        cols = _columns_with_types(con, f"SELECT * FROM {name}")
+        if cols != _columns_with_types(con, f"SELECT * FROM parquet_scan('{src}')") or key not in cols:
+            return None
+        others = [c for c in cols if c != key]
+        row_hash = "hash(" + ", ".join(f'"{c}"' for c in others) + ")"
+        changed = ", ".join(
+            f"CASE WHEN n.\"{c}\" IS DISTINCT FROM o.\"{c}\" THEN '{c}' END" for c in others
+        )
+        con.execute("BEGIN TRANSACTION")
+        try:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS change_log (
+                  month VARCHAR, tabela VARCHAR, key VARCHAR, op VARCHAR,
+                  changed_columns VARCHAR[], logged_at TIMESTAMP
+                )
+            """)
+            con.execute(f"CREATE OR REPLACE TEMP VIEW _upsert_novo AS SELECT * FROM parquet_scan('{src}')")
+            con.execute(f"""
+                CREATE OR REPLACE TEMP TABLE _upsert_diff AS
+                SELECT COALESCE(n.k, o.k) AS k,
+                       CASE WHEN o.k IS NULL THEN 'insert' WHEN n.k IS NULL THEN 'delete' ELSE 'update' END AS op
+                FROM (SELECT {key} AS k, {row_hash} AS h FROM _upsert_novo) n
+                FULL OUTER JOIN (SELECT {key} AS k, {row_hash} AS h FROM {name}) o ON n.k = o.k
+                WHERE n.k IS NULL OR o.k IS NULL OR n.h <> o.h
+            """)
+            con.execute("DELETE FROM change_log WHERE month = ? AND tabela = ?", (month, name))
+            con.execute(f"""
+                INSERT INTO change_log
+                SELECT ?, ?, CAST(d.k AS VARCHAR), d.op,
+                       CASE WHEN d.op = 'update' THEN LIST_FILTER([{changed}], x -> x IS NOT NULL) END,
+                       CURRENT_TIMESTAMP
+                FROM _upsert_diff d
+                LEFT JOIN _upsert_novo n ON d.op = 'update' AND n.{key} = d.k
+                LEFT JOIN {name} o ON d.op = 'update' AND o.{key} = d.k
+            """, (month, name))
+            con.execute(f"DELETE FROM {name} WHERE {key} IN (SELECT k FROM _upsert_diff WHERE op <> 'insert')")
+            con.execute(
+                f"INSERT INTO {name} BY NAME SELECT * FROM _upsert_novo "
+                f"WHERE {key} IN (SELECT k FROM _upsert_diff WHERE op <> 'delete')"
+            )
+            counts = dict(con.execute("SELECT op, COUNT(*) FROM _upsert_diff GROUP BY op").fetchall())
+            con.execute("DROP TABLE _upsert_diff")
+            con.execute("DROP VIEW _upsert_novo")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    cache.bump()
+    return {op: counts.get(op, 0) for op in ("insert", "update", "delete")}
+
+
+def changed_keys_sql(name: str, month: str, ops: Tuple[str, ...] = ("insert", "update", "delete")) -> str:
+    """Subconsulta com as chaves de 'name' alteradas em 'month' (change_log), no tipo da coluna-chave."""
+    key = CHAVES[name]
+    with db.reader() as con:
+        tipo = con.execute(
+            "SELECT data_type FROM information_schema.columns WHERE table_name = ? AND column_name = ?", (name, key)
+        ).fetchone()[0]
+    in_ops = ", ".join(f"'{op}'" for op in ops)
+    return (
+        f"(SELECT CAST(key AS {tipo}) FROM change_log "
+        f"WHERE month = {_sql_str(month)} AND tabela = '{name}' AND op IN ({in_ops}))"
+    )
+
+
+def get_change_log(month: str | None = None, tabela: str | None = None) -> pd.DataFrame:
+    """Resumo do change_log: contagem de inserts/updates/deletes por mês e tabela."""
+    where, params = ["1=1"], []
+    if month:
+        where.append("month = ?"); params.append(month)
+    if tabela:
+        where.append("tabela = ?"); params.append(tabela)
+    with db.file_reader() as con:
+        if not con.execute("SELECT 1 FROM information_schema.tables WHERE table_name = 'change_log'").fetchone():
+            return pd.DataFrame(columns=["month", "tabela", "op", "linhas"])
+        return con.execute(
+            f"SELECT month, tabela, op, COUNT(*) AS linhas FROM change_log WHERE {' AND '.join(where)} "
+            "GROUP BY ALL ORDER BY month, tabela, op", params,
+        ).fetchdf()
 
 
 # ------------------------------------------------------------------------------
@@ -114,86 +507,285 @@ def _choose_zip_member(
     return max(members, key=lambda m: m.file_size)
 
 
-def extract_tabular_from_zip(zip_path: Path, prefer_keywords: List[str] | None = None) -> io.BytesIO:
+def extract_tabular_from_zip(
+    zip_path: Path,
+    prefer_keywords: List[str] | None = None,
+    streaming: bool = True,
+    out_path: Path | None = None,
+    encoding: str = CSV_ENCODING,
+) -> Path | io.BytesIO:
     """
-    Extrai bytes do arquivo principal do ZIP, mesmo sem extensão.
-    Faz uma checagem leve nas primeiras linhas para confirmar que é "CSV-like" (texto; possivelmente com ';').
+    Extrai o arquivo principal do ZIP, mesmo sem extensão.
+
+    streaming=True (padrão): descomprime o membro incrementalmente (blocos de 1 MB) para um arquivo
+    em disco, já transcodificado de 'encoding' para UTF-8; a memória usada independe do tamanho do
+    arquivo. Retorna o Path do CSV extraído (por padrão, data/tmp_extract_{zip}.utf8.csv), que deve
+    ser lido com encoding="utf-8" e removido pelo chamador.
+
+    streaming=False: comportamento antigo, lê o membro inteiro em memória e retorna um BytesIO.
     """
-    with zipfile.ZipFile(zip_path, "r") as z:
+    with telemetry.stage("extract_tabular_from_zip", zip=Path(zip_path).name) as ev, \
+            zipfile.ZipFile(zip_path, "r") as z:
         member = _choose_zip_member(z, prefer_keywords)
+        ev.update(member=member.filename, bytes_in=member.compress_size)
+        if streaming:
+            out_path = out_path or DATA / f"tmp_extract_{Path(zip_path).stem}.utf8.csv"
+            with z.open(member, "r") as src:
+                out = _transcode_to_utf8(src, out_path, encoding)
+            ev["bytes_out"] = out.stat().st_size
+            return out
         raw = z.read(member)
-
-    # Checagem leve de "CSV-like" (não estrita)
-    head = raw[:4096]
-    try:
-        _ = head.decode("latin1", errors="ignore")
-    except Exception:
-        _ = head.decode("utf-8", errors="ignore")
+        ev["bytes_out"] = len(raw)
 
     return io.BytesIO(raw)
 
 
+def _copy_upload_to_disk(data: bytes | BinaryIO, out_path: Path) -> Path:
+    """Grava um upload (bytes ou arquivo) em disco, em blocos, sem gerar cópias extras em memória."""
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        out_path.write_bytes(data)
+        return out_path
+    if hasattr(data, "seek"):
+        data.seek(0)
+    with open(out_path, "wb") as out:
+        shutil.copyfileobj(data, out, _COPY_BUFSIZE)
+    return out_path
+
+
 # ------------------------------------------------------------------------------
-# Leitura de CSV gigante (separador ';') -> Parquet (com fallback de encoding)
+# Leitura de CSV gigante (separador ';') -> Parquet
 # ------------------------------------------------------------------------------
-def _read_csv_iterator(fobj: io.BytesIO | str, chunksize: int):
+def _sql_str(value: str) -> str:
+    """Literal SQL de string (com aspas simples escapadas)."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _is_utf8(encoding: str) -> bool:
+    return encoding.lower().replace("-", "").replace("_", "") in ("utf8", "utf8sig", "ascii")
+
+
+def _transcode_to_utf8(fobj: io.BytesIO | str | Path, out_path: Path, encoding: str) -> Path:
     """
-    Tenta latin1 (padrão dos arquivos da RFB) e cai para utf-8 se necessário.
-    Retorna um iterador de chunks do pandas.
+    Converte (em streaming, blocos de 1 MB) um arquivo/stream no 'encoding' informado para UTF-8,
+    que é o que o leitor CSV do DuckDB aceita.
     """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    src = open(fobj, "rb") if isinstance(fobj, (str, Path)) else fobj
     try:
-        return pd.read_csv(
-            fobj,
-            sep=";",
-            dtype=str,
-            chunksize=chunksize,
-            encoding="latin1",
-            low_memory=False,
+        with open(out_path, "wb") as out:
+            while True:
+                block = src.read(_COPY_BUFSIZE)
+                if not block:
+                    break
+                out.write(decoder.decode(block).encode("utf-8"))
+            out.write(decoder.decode(b"", final=True).encode("utf-8"))
+    finally:
+        if src is not fobj:
+            src.close()
+    return out_path
+
+
+def _read_csv_sql(path: Path, name: str) -> str:
+    """Expressão read_csv do DuckDB para os CSVs da RFB (sem cabeçalho, ';', aspas duplas)."""
+    opts = [
+        "delim=';'",
+        "header=false",
+        "quote='\"'",
+        "escape='\"'",
+        "all_varchar=true",
+    ]
+    names = column_names(name)
+    if names:
+        opts.append("names=[" + ", ".join(_sql_str(n) for n in names) + "]")
+    return f"read_csv({_sql_str(path.as_posix())}, {', '.join(opts)})"
+
+
+def _typed_expr(col: str, typ) -> str:
+    """Expressão SQL que converte a coluna texto 'col' para o tipo do modo tipado (NULL se não converter)."""
+    c = f'"{col}"'
+    if typ == "data":
+        return f"TRY_CAST(TRY_STRPTIME(NULLIF(NULLIF({c}, '0'), '00000000'), '%Y%m%d') AS DATE)"
+    if typ == "decimal":
+        return f"TRY_CAST(REPLACE({c}, ',', '.') AS DECIMAL(18,2))"
+    if isinstance(typ, list):
+        return f"TRY_CAST({c} AS ENUM({', '.join(_sql_str(v) for v in typ)}))"
+    return f"TRY_CAST({c} AS {typ})"
+
+
+def _select_list(name: str, schema: str, part: int = 0) -> str:
+    """
+    Lista do SELECT da conversão: '*' no modo "raw"; colunas convertidas no modo "typed".
+    Nos dois modos acrescenta as colunas calculadas de lib/schema.DERIVADAS (ex.: cnpj14) e a numeração
+    das linhas de lib/schema.NUMERACAO ('part' = número da parte).
+    """
+    types = TIPOS.get(name)
+    if schema == "raw" or not types:
+        cols = "*"
+    else:
+        cols = ", ".join(
+            f'{_typed_expr(c, types[c])} AS "{c}"' if c in types else f'"{c}"' for c in column_names(name)
         )
+    extra = [f'{expr} AS "{c}"' for c, expr in DERIVADAS.get(name, {}).items()]
+    if name in NUMERACAO:
+        extra.append(f'{part} * 10000000000 + ROW_NUMBER() OVER () AS "{NUMERACAO[name]}"')
+    return ", ".join([cols] + extra)
+
+
+def _part_number(path: Path) -> int:
+    """Número da parte no nome do arquivo (Socios3.parquet -> 3; 0 se não houver)."""
+    m = re.search(r"(\d+)$", path.stem)
+    return int(m.group(1)) if m else 0
+
+
+def _validation_report(con: duckdb.DuckDBPyConnection, from_sql: str, name: str) -> dict:
+    """
+    Conta, por coluna tipada, os valores não vazios que não puderam ser convertidos (viraram NULL),
+    com um exemplo de cada. Segunda passada só de agregação sobre a origem (memória constante).
+    """
+    types = TIPOS.get(name) or {}
+    checks = []
+    for col, typ in types.items():
+        raw = f'"{col}"'
+        blank = f"{raw} IS NULL OR TRIM({raw}) = ''" + (f" OR {raw} IN ('0', '00000000')" if typ == "data" else "")
+        bad = f"NOT ({blank}) AND {_typed_expr(col, typ)} IS NULL"
+        checks.append((col, typ, f"COUNT(*) FILTER (WHERE {bad}), FIRST({raw}) FILTER (WHERE {bad})"))
+    if not checks:
+        return {}
+    row = con.execute(f"SELECT COUNT(*), {', '.join(sql for _, _, sql in checks)} FROM {from_sql}").fetchone()
+    report = {"table": name, "rows": row[0], "columns": {}}
+    for i, (col, typ, _) in enumerate(checks):
+        invalid, example = row[1 + 2 * i], row[2 + 2 * i]
+        report["columns"][col] = {
+            "type": "ENUM" if isinstance(typ, list) else typ, "invalid": invalid, "example": example,
+        }
+    report["invalid_rows_max"] = max((c["invalid"] for c in report["columns"].values()), default=0)
+    return report
+
+
+def validation_report_path(parquet_path: Path) -> Path:
+    """Relatório de validação gravado ao lado do Parquet no modo tipado."""
+    return parquet_path.with_suffix(".validation.json")
+
+
+def load_validation_report(parquet_path: Path) -> dict | None:
+    """Lê o relatório de validação de um Parquet convertido no modo tipado (None se não houver)."""
+    path = validation_report_path(Path(parquet_path))
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+
+def _write_parquet(
+    con: duckdb.DuckDBPyConnection, from_sql: str, name: str, final_path: Path, schema: str, validate: bool
+) -> int:
+    """
+    COPY da origem (texto) para o Parquet final, aplicando os tipos do modo escolhido,
+    ordenado pela chave de lib/schema.ORDENACAO (estatísticas de row group úteis para buscas por CNPJ).
+    No armazenamento particionado 'final_path' é um diretório Hive (ver PARTITIONED_STORAGE).
+    """
+    order = f' ORDER BY "{ORDENACAO[name]}"' if name in ORDENACAO else ""
+    opts = f"FORMAT PARQUET, COMPRESSION {PARQUET_COMPRESSION}, ROW_GROUP_SIZE {PARQUET_ROW_GROUP_SIZE}"
+    sorted_path = final_path.with_name(final_path.name + ".tmp.parquet") if _is_partitioned(name) else final_path
+    rows = con.execute(
+        f"COPY (SELECT {_select_list(name, schema, _part_number(final_path))} FROM {from_sql}{order}) "
+        f"TO {_sql_str(sorted_path.as_posix())} ({opts})"
+    ).fetchone()[0]
+    if sorted_path != final_path:
+        # A escrita particionada só preserva a ordem (e as estatísticas por row group) com uma thread;
+        # por isso o Parquet ordenado é gravado antes, em paralelo, e só então redistribuído.
+        shutil.rmtree(final_path, ignore_errors=True)
+        final_path.mkdir(parents=True)
+        threads = con.execute("SELECT current_setting('threads')").fetchone()[0]
+        con.execute("SET threads = 1")
+        try:
+            con.execute(
+                f"COPY (SELECT * FROM parquet_scan({_sql_str(sorted_path.as_posix())})) "
+                f"TO {_sql_str(final_path.as_posix())} "
+                f"({opts}, PARTITION_BY ({', '.join(PARTICOES[name])}), OVERWRITE_OR_IGNORE, FILENAME_PATTERN 'data_{{i}}')"
+            )
+        finally:
+            con.execute(f"SET threads = {threads}")
+            sorted_path.unlink(missing_ok=True)
+    report_path = validation_report_path(final_path)
+    report_path.unlink(missing_ok=True)
+    if rows and validate and schema == "typed" and name in TIPOS:
+        report = _validation_report(con, from_sql, name)
+        report_path.write_text(json.dumps(report, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+    return rows
+
+
+def _csv_to_parquet_duckdb(
+    fobj: io.BytesIO | str | Path, name: str, encoding: str, final_path: Path, threads: int | None,
+    schema: str, validate: bool,
+) -> Path:
+    """
+    Converte o CSV para Parquet com o read_csv paralelo do DuckDB (sem passar pelo pandas).
+    Entradas fora de UTF-8 (ou em memória) são transcodificadas em streaming para um arquivo UTF-8.
+    """
+    tmp_utf8: Path | None = None
+    if isinstance(fobj, (str, Path)) and _is_utf8(encoding):
+        src = Path(fobj)
+    else:
+        tmp_utf8 = _transcode_to_utf8(fobj, DATA / f"tmp_{final_path.stem}.utf8.csv", encoding)
+        src = tmp_utf8
+
+    # Conexão em memória: a conversão não precisa (nem deve travar) o cnpj.duckdb
+    con = duckdb.connect()
+    try:
+        con.execute("SET preserve_insertion_order = false")
+        if threads:
+            con.execute(f"SET threads = {int(threads)}")
+        rows = _write_parquet(con, _read_csv_sql(src, name), name, final_path, schema, validate)
+    finally:
+        con.close()
+        if tmp_utf8 is not None:
+            tmp_utf8.unlink(missing_ok=True)
+
+    if not rows:
+        raise ValueError("Nenhuma linha lida do CSV. Verifique o arquivo de origem.")
+    return final_path
+
+
+def _read_csv_iterator(fobj: io.BytesIO | str, name: str, chunksize: int, encoding: str):
+    """
+    Tenta o encoding informado (latin1, padrão dos arquivos da RFB) e cai para utf-8 se necessário.
+    Retorna um iterador de chunks do pandas.
+    """
+    kwargs = dict(sep=";", header=None, names=column_names(name), dtype=str,
+                  chunksize=chunksize, low_memory=False)
+    try:
+        return pd.read_csv(fobj, encoding=encoding, **kwargs)
     except UnicodeDecodeError:
         if hasattr(fobj, "seek"):
             fobj.seek(0)
-        return pd.read_csv(
-            fobj,
-            sep=";",
-            dtype=str,
-            chunksize=chunksize,
-            encoding="utf-8",
-            low_memory=False,
-        )
+        return pd.read_csv(fobj, encoding="utf-8", **kwargs)
 
 
-def read_csv_semicolon_to_parquet(
-    fobj: io.BytesIO | str, name: str, chunksize: int = 400_000
+def _csv_to_parquet_pandas(
+    fobj: io.BytesIO | str, name: str, chunksize: int, encoding: str, final_path: Path,
+    schema: str, validate: bool,
 ) -> Path:
     """
     Lê um CSV (separador ';') em chunks e materializa um único arquivo Parquet consolidado.
     Usa arquivos parquet temporários + DuckDB para concatenar rapidamente.
     """
-    it = _read_csv_iterator(fobj, chunksize)
+    it = _read_csv_iterator(fobj, name, chunksize, encoding)
 
     parts: List[str] = []
     for i, chunk in enumerate(it):
-        # normalização leve: garantir string em todas as colunas
-        for c in chunk.columns:
-            if chunk[c].dtype != "object":
-                chunk[c] = chunk[c].astype("string")
+        # normalização leve: garantir string em todas as colunas (inclusive as totalmente vazias)
+        chunk = chunk.astype("string")
 
-        path = DATA / f"tmp_{name}_{i}.parquet"
+        path = DATA / f"tmp_{final_path.stem}_{i}.parquet"
         chunk.to_parquet(path, index=False)
         parts.append(path.as_posix())
 
     if not parts:
         raise ValueError("Nenhum chunk lido do CSV. Verifique o arquivo de origem.")
 
-    con = open_con()
+    con = duckdb.connect()
     try:
-        final_path = DATA / f"{name}.parquet"
         # Concatena todos os temporários em um parquet único de saída
-        con.execute(
-            f"COPY (SELECT * FROM parquet_scan({parts})) "
-            f"TO '{final_path.as_posix()}' (FORMAT PARQUET)"
-        )
+        _write_parquet(con, f"parquet_scan({parts})", name, final_path, schema, validate)
     finally:
         con.close()
 
@@ -207,54 +799,613 @@ def read_csv_semicolon_to_parquet(
     return final_path
 
 
+def _is_partitioned(name: str) -> bool:
+    return PARTITIONED_STORAGE and name in PARTICOES
+
+
+def storage_path(name: str, parquet_path: Path) -> Path:
+    """Caminho real de um Parquet de 'name': o próprio arquivo, ou o diretório Hive (sem '.parquet')."""
+    return parquet_path.with_suffix("") if _is_partitioned(name) else parquet_path
+
+
+def parquet_rows(path: Path) -> int:
+    """Linhas de um Parquet (arquivo ou diretório, somando os arquivos), lidas só dos metadados."""
+    files = sorted(Path(path).rglob("*.parquet")) if Path(path).is_dir() else [Path(path)]
+    return sum(pq.read_metadata(f).num_rows for f in files)
+
+
+def parquet_bytes(path: Path) -> int:
+    """Tamanho em disco de um Parquet (arquivo ou diretório)."""
+    path = Path(path)
+    return sum(f.stat().st_size for f in path.rglob("*.parquet")) if path.is_dir() else path.stat().st_size
+
+
+def read_csv_semicolon_to_parquet(
+    fobj: io.BytesIO | str | Path,
+    name: str,
+    chunksize: int = 400_000,
+    engine: str | None = None,
+    encoding: str = CSV_ENCODING,
+    out_path: Path | None = None,
+    threads: int | None = None,
+    schema: str | None = None,
+    validate: bool = True,
+) -> Path:
+    """
+    Converte um CSV da RFB (separador ';', sem cabeçalho) em um único arquivo Parquet
+    ('out_path', por padrão data/{name}.parquet). 'name' define os nomes das colunas (lib/schema.py).
+    Com PARTITIONED_STORAGE, tabelas de lib/schema.PARTICOES são gravadas num diretório Hive
+    ('out_path' sem a extensão), que é o caminho retornado.
+
+    engine:
+      - "duckdb" (padrão): read_csv paralelo do DuckDB, uma única passada e sem parquets temporários
+        ('threads' limita o paralelismo, útil quando várias conversões rodam ao mesmo tempo);
+      - "pandas": fallback em chunks de 'chunksize' linhas.
+
+    schema:
+      - "typed" (padrão): tipos de lib/schema.TIPOS (DATE, DECIMAL, inteiros pequenos, ENUM); com
+        validate=True grava ao lado do Parquet um relatório dos valores que não converteram
+        (ver load_validation_report);
+      - "raw": todas as colunas VARCHAR, como no arquivo.
+    """
+    engine = engine or INGEST_ENGINE
+    schema = schema or SCHEMA_MODE
+    if schema not in ("typed", "raw"):
+        raise ValueError(f"Modo de schema desconhecido: {schema!r} (use 'typed' ou 'raw').")
+    with telemetry.stage("read_csv_semicolon_to_parquet", table=name, engine=engine) as ev:
+        if isinstance(fobj, (str, Path)):
+            ev["bytes_in"] = Path(fobj).stat().st_size
+        elif hasattr(fobj, "getbuffer"):
+            ev["bytes_in"] = fobj.getbuffer().nbytes
+        out = _read_csv_to_parquet(fobj, name, chunksize, engine, encoding, out_path, threads, schema, validate)
+        ev.update(rows=parquet_rows(out), bytes_out=parquet_bytes(out))
+        return out
+
+
+def _read_csv_to_parquet(
+    fobj: io.BytesIO | str | Path, name: str, chunksize: int, engine: str, encoding: str,
+    out_path: Path | None, threads: int | None, schema: str, validate: bool,
+) -> Path:
+    final_path = storage_path(name, out_path or DATA / f"{name}.parquet")
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    # saída no outro formato (arquivo <-> diretório particionado) não pode sobrar ao lado da nova
+    other = final_path.with_suffix("") if final_path.suffix == ".parquet" else final_path.with_suffix(".parquet")
+    if other.is_dir():
+        if any(p.is_dir() and "=" in p.name for p in other.iterdir()):
+            shutil.rmtree(other)
+    else:
+        other.unlink(missing_ok=True)
+    if engine == "duckdb":
+        return _csv_to_parquet_duckdb(fobj, name, encoding, final_path, threads, schema, validate)
+    if engine == "pandas":
+        return _csv_to_parquet_pandas(fobj, name, chunksize, encoding, final_path, schema, validate)
+    raise ValueError(f"Motor de ingestão desconhecido: {engine!r} (use 'duckdb' ou 'pandas').")
+
+
 # ------------------------------------------------------------------------------
 # Helpers de preparação integrados (download -> extrair -> parquet -> tabela)
 # ------------------------------------------------------------------------------
-def prepare_from_zip_url(url: str, name: str) -> Path:
+def _table_exists(name: str) -> bool:
+    with db.reader() as con:
+        return bool(con.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?", (name,)
+        ).fetchone())
+
+
+def _register_table(name: str, source: Path, derive: bool = True) -> None:
+    """
+    (Re)cria a tabela 'name' a partir de 'source', reconstrói o índice de busca por nome
+    (lib/search) e as tabelas derivadas que dependem dela (lib/derived), e anota no manifesto
+    de onde ela foi carregada. derive=False adia as derivadas (carga de vários datasets de uma vez).
+    """
+    ensure_table_from_parquet(name, source, replace=True)
+    if search.BUILD_ON_LOAD and name in search.FONTES:
+        with telemetry.stage("search_index", table=name) as ev:
+            ev["rows"] = search.build_index(name)
+    if derive:
+        _rebuild_derived(name)
+    manifest.record(f"tabela:{name}", {}, source)
+
+
+def _rebuild_derived(*tables: str) -> List[str]:
+    """derived.rebuild_for com o evento "derived" (tabelas reconstruídas no detalhe)."""
+    if not tables:
+        return []
+    with telemetry.stage("derived", tables=list(tables)) as ev:
+        built = derived.rebuild_for(*tables)
+        ev["built"] = built
+    return built
+
+
+def _upsert_table(name: str, source: Path, month: str) -> dict | None:
+    """
+    Versão incremental de _register_table: aplica o diff de 'source' sobre 'name' (upsert_table_from_parquet)
+    e atualiza só as chaves alteradas no índice de busca. As derivadas ficam com quem chama
+    (derived.refresh_for). Retorna None quando a tabela precisa ser recriada por completo.
+    """
+    with telemetry.stage("upsert_table_from_parquet", table=name) as ev:
+        ev["bytes_in"] = parquet_bytes(source)
+        counts = upsert_table_from_parquet(name, source, month)
+        ev.update(rows=sum(counts.values()) if counts else None, changes=counts,
+                  status="ok" if counts is not None else "recriar")
+    if counts is None:
+        return None
+    if search.BUILD_ON_LOAD and name in search.FONTES:
+        with telemetry.stage("search_index", table=name, incremental=True) as ev:
+            if search.has_index(name):
+                ev["rows"] = search.refresh_index(name, changed_keys_sql(name, month))
+            else:
+                ev["rows"] = search.build_index(name)
+    manifest.record(f"tabela:{name}", {}, source)
+    return counts
+
+
+def _registered_source(name: str) -> Path | None:
+    """Parquet (arquivo ou diretório de versão) de onde a tabela 'name' foi carregada por último."""
+    entry = manifest.get_entry(f"tabela:{name}")
+    return Path(entry["parquet"]) if entry else None
+
+
+def _reads_parquet(name: str) -> bool:
+    """True se as consultas a 'name' leem os Parquets diretamente (view), e não uma cópia no banco."""
+    return storage.MODE == "view" or _is_partitioned(name)
+
+
+def _gc_versions(dataset: str, current: Path, previous: Path | None) -> None:
+    """
+    Remove as versões antigas do dataset depois da troca. Fica a atual e, quando as consultas leem os
+    Parquets direto (view), também a anterior, ainda usada por consultas que começaram antes da troca.
+    """
+    if storage.version_of(current) is None:
+        return
+    keep = [storage.version_of(current)]
+    if previous is not None and _reads_parquet(DATASETS.get(dataset, {}).get("table", dataset)):
+        keep.append(storage.version_of(previous))
+    storage.gc(DATA / dataset, keep)
+
+
+def _is_loaded_from(name: str, source: Path) -> bool:
+    """True se a tabela 'name' existe e foi carregada por último a partir de 'source'."""
+    entry = manifest.get_entry(f"tabela:{name}")
+    return bool(entry) and entry.get("parquet") == source.as_posix() and _table_exists(name)
+
+
+def _zip_to_parquet(
+    zip_path: Path, name: str, prefer_keywords: List[str] | None = None, out_path: Path | None = None,
+    threads: int | None = None,
+) -> Path:
+    """
+    Extrai (streaming) o arquivo tabular principal do ZIP e converte para Parquet.
+    """
+    csv_path = extract_tabular_from_zip(zip_path, prefer_keywords=prefer_keywords or [name])
+    try:
+        return read_csv_semicolon_to_parquet(csv_path, name, encoding="utf-8", out_path=out_path, threads=threads)
+    finally:
+        csv_path.unlink(missing_ok=True)
+
+
+def _remote_check(key: str, url: str, session: requests.Session | None = None) -> Tuple[bool, dict]:
+    """manifest.check_remote tolerante a servidores que recusam HEAD/Range (considera alterado)."""
+    try:
+        return manifest.check_remote(key, url, session)
+    except requests.RequestException:
+        return False, {"url": url}
+
+
+def prepare_from_zip_url(
+    url: str, name: str, prefer_keywords: List[str] | None = None, force: bool = False, threads: int | None = None
+) -> Path:
     """
     Baixa um ZIP de 'url', extrai o arquivo tabular principal, converte para Parquet e carrega na tabela 'name'.
     Retorna o caminho do Parquet final.
+
+    Se o manifesto mostrar que o ZIP remoto não mudou desde a última carga (HEAD e, se preciso, CRC32
+    do diretório central), nada é baixado nem convertido. force=True ignora o manifesto.
+    'threads' limita as threads do DuckDB na conversão (padrão: todos os núcleos).
     """
-    zip_path = DATA / f"{name}.zip"
-    download_zip(url, zip_path)
-    fobj = extract_tabular_from_zip(zip_path, prefer_keywords=[name])
-    parquet = read_csv_semicolon_to_parquet(fobj, name)
-    ensure_table_from_parquet(name, parquet, replace=True)
-    return parquet
+    with telemetry.run(dataset=name), telemetry.stage("prepare_from_zip_url", table=name, url=url) as ev:
+        unchanged, fp = (False, {"url": url}) if force else _remote_check(name, url)
+        if unchanged:
+            ev["status"] = "inalterado"
+            parquet = Path(manifest.get_entry(name)["parquet"])
+            if not _is_loaded_from(name, parquet):
+                _register_table(name, parquet)
+            return parquet
+
+        zip_path = DATA / f"{name}.zip"
+        download_zip(url, zip_path)
+        fp["crc32"] = manifest.zip_members(zip_path)
+        ev["bytes_in"] = zip_path.stat().st_size
+        previous = _registered_source(name)
+        version = storage.new_version(DATA / name)
+        parquet = _zip_to_parquet(
+            zip_path, name, prefer_keywords, out_path=version / f"{name}.parquet", threads=threads
+        )
+        _register_table(name, parquet)
+        manifest.record(name, fp, parquet)
+        _gc_versions(name, parquet, previous)
+        ev.update(rows=parquet_rows(parquet), bytes_out=parquet_bytes(parquet))
+        return parquet
 
 
-def prepare_from_uploaded_zip_bytes(zip_bytes: bytes, name: str) -> Path:
+def prepare_from_uploaded_zip_bytes(
+    zip_bytes: bytes | BinaryIO, name: str, prefer_keywords: List[str] | None = None, force: bool = False,
+    threads: int | None = None,
+) -> Path:
     """
-    Recebe os bytes de um ZIP enviado pelo usuário (upload),
-    extrai o arquivo tabular principal, converte para Parquet e carrega na tabela 'name'.
+    Recebe um ZIP enviado pelo usuário (upload; bytes ou arquivo, ex. o UploadedFile do Streamlit),
+    grava em disco, extrai o arquivo tabular principal, converte para Parquet e carrega na tabela 'name'.
+    Um ZIP com os mesmos membros/CRC32 da última carga não é reprocessado (salvo force=True).
+    'threads' como em prepare_from_zip_url.
     """
-    tmp_zip = DATA / f"tmp_upload_{name}.zip"
-    tmp_zip.write_bytes(zip_bytes)
-    try:
-        fobj = extract_tabular_from_zip(tmp_zip, prefer_keywords=[name])
-        parquet = read_csv_semicolon_to_parquet(fobj, name)
-        ensure_table_from_parquet(name, parquet, replace=True)
+    with telemetry.run(dataset=name), telemetry.stage("prepare_from_uploaded_zip_bytes", table=name) as ev:
+        tmp_zip = _copy_upload_to_disk(zip_bytes, DATA / f"tmp_upload_{name}.zip")
+        ev["bytes_in"] = tmp_zip.stat().st_size
+        try:
+            fp = manifest.local_fingerprint(tmp_zip)
+            if not force and manifest.is_unchanged(name, fp):
+                ev["status"] = "inalterado"
+                parquet = Path(manifest.get_entry(name)["parquet"])
+                if not _is_loaded_from(name, parquet):
+                    _register_table(name, parquet)
+                return parquet
+            previous = _registered_source(name)
+            version = storage.new_version(DATA / name)
+            parquet = _zip_to_parquet(
+                tmp_zip, name, prefer_keywords, out_path=version / f"{name}.parquet", threads=threads
+            )
+            _register_table(name, parquet)
+            manifest.record(name, fp, parquet)
+            _gc_versions(name, parquet, previous)
+            ev.update(rows=parquet_rows(parquet), bytes_out=parquet_bytes(parquet))
+            return parquet
+        finally:
+            try:
+                tmp_zip.unlink(missing_ok=True)
+            except Exception:
+                pass
+
+
+def prepare_from_uploaded_csv_bytes(
+    csv_bytes: bytes | BinaryIO, name: str, encoding: str = CSV_ENCODING, threads: int | None = None
+) -> Path:
+    """
+    Recebe um CSV enviado pelo usuário (upload; bytes ou arquivo),
+    grava em disco já em UTF-8, converte para Parquet e carrega na tabela 'name'.
+    'threads' como em prepare_from_zip_url.
+    """
+    with telemetry.run(dataset=name), telemetry.stage("prepare_from_uploaded_csv_bytes", table=name) as ev:
+        src = io.BytesIO(csv_bytes) if isinstance(csv_bytes, (bytes, bytearray, memoryview)) else csv_bytes
+        if hasattr(src, "seek"):
+            src.seek(0)
+        tmp_csv = _transcode_to_utf8(src, DATA / f"tmp_upload_{name}.utf8.csv", encoding)
+        ev["bytes_in"] = tmp_csv.stat().st_size
+        previous = _registered_source(name)
+        version = storage.new_version(DATA / name)
+        try:
+            parquet = read_csv_semicolon_to_parquet(
+                tmp_csv, name, encoding="utf-8", out_path=version / f"{name}.parquet", threads=threads
+            )
+        finally:
+            tmp_csv.unlink(missing_ok=True)
+        _register_table(name, parquet)
+        manifest.forget(name)
+        _gc_versions(name, parquet, previous)
+        ev.update(rows=parquet_rows(parquet), bytes_out=parquet_bytes(parquet))
         return parquet
-    finally:
+
+
+# ------------------------------------------------------------------------------
+# Carga mensal completa (todas as partes de um mês da RFB, em paralelo)
+# ------------------------------------------------------------------------------
+# Raiz dos dados abertos; cada mês fica em {RFB_BASE_URL}/{AAAA-MM}/{Arquivo}.zip
+RFB_BASE_URL = os.environ.get(
+    "CNPJ_RFB_BASE_URL", "https://arquivos.receitafederal.gov.br/dados/cnpj/dados_abertos_cnpj"
+)
+
+# Downloads simultâneos (pool de conexões HTTP) e processos de conversão
+DOWNLOAD_WORKERS = 4
+CONVERT_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+
+def month_parts(year: int, month: int, targets: List[str] | None = None, base_url: str | None = None):
+    """
+    Lista as partes publicadas pela RFB para o mês: [(dataset, parte, url), ...].
+    Ex.: ("empresas", "Empresas0", ".../2025-06/Empresas0.zip"), ..., ("cnaes", "Cnaes", ".../Cnaes.zip").
+    """
+    base = (base_url or RFB_BASE_URL).rstrip("/")
+    ym = f"{int(year):04d}-{int(month):02d}"
+    out = []
+    for dataset in targets or list(DATASETS):
+        spec = DATASETS[dataset]
+        n = spec["parts"]
+        files = [f"{spec['rfb_file']}{i}" for i in range(n)] if n else [spec["rfb_file"]]
+        out += [(dataset, part, f"{base}/{ym}/{part}.zip") for part in files]
+    return out
+
+
+def get_catalog() -> pd.DataFrame:
+    """
+    Catálogo de cargas: uma linha por parte (mês, dataset, parte) com o status e as métricas da última
+    carga em que ela entrou, resumidos dos eventos de lib/telemetry (tabela load_catalog).
+    Status: pendente, inalterado, baixado, convertido, carregado ou erro.
+    """
+    cols = ["year_month", "dataset", "part", "status", "rows", "zip_bytes", "parquet_bytes",
+            "download_s", "convert_s", "load_s", "peak_rss_mb", "error", "url", "updated_at", "run_id"]
+    if not telemetry.table_exists():
+        return pd.DataFrame(columns=cols)
+    sql = f"""
+        WITH ev AS (SELECT * FROM {telemetry.CATALOG_TABLE} WHERE year_month IS NOT NULL AND dataset IS NOT NULL),
+        partes AS (
+          SELECT year_month, dataset, part, arg_max(run_id, finished_at) AS run_id
+          FROM ev WHERE part IS NOT NULL GROUP BY ALL
+        ),
+        por_parte AS (
+          SELECT p.year_month, p.dataset, p.part, p.run_id,
+            bool_or(e.status = 'erro') AS erro,
+            bool_or(e.stage = 'read_csv_semicolon_to_parquet' AND e.status = 'ok') AS convertido,
+            bool_or(e.stage = 'download_zip' AND e.status <> 'erro') AS baixado,
+            bool_or(e.stage = 'remote_check' AND e.status = 'inalterado') AS inalterado,
+            max(e.rows) FILTER (WHERE e.stage = 'read_csv_semicolon_to_parquet') AS rows,
+            max(e.bytes_out) FILTER (WHERE e.stage = 'download_zip') AS zip_bytes,
+            max(e.bytes_out) FILTER (WHERE e.stage = 'read_csv_semicolon_to_parquet') AS parquet_bytes,
+            sum(e.seconds) FILTER (WHERE e.stage IN ('remote_check', 'download_zip')) AS download_s,
+            sum(e.seconds) FILTER (
+              WHERE e.stage IN ('extract_tabular_from_zip', 'read_csv_semicolon_to_parquet')
+            ) AS convert_s,
+            max(e.peak_rss_mb) AS peak_rss_mb,
+            arg_max(e.error, e.finished_at) FILTER (WHERE e.error IS NOT NULL) AS error,
+            max(json_extract_string(e.detail, '$.url')) FILTER (WHERE e.stage = 'month_parts') AS url,
+            max(e.finished_at) AS updated_at
+          FROM partes p JOIN ev e USING (year_month, dataset, part, run_id)
+          GROUP BY ALL
+        ),
+        por_dataset AS (
+          SELECT year_month, dataset, run_id,
+            bool_or(status = 'erro') AS erro,
+            bool_or(stage IN ('ensure_table_from_parquet', 'upsert_table_from_parquet') AND status = 'ok') AS carregado,
+            sum(seconds) AS load_s,
+            arg_max(error, finished_at) FILTER (WHERE error IS NOT NULL) AS error,
+            max(finished_at) AS updated_at
+          FROM ev WHERE part IS NULL GROUP BY ALL
+        )
+        SELECT p.year_month, p.dataset, p.part,
+          CASE WHEN p.erro OR d.erro THEN 'erro' WHEN d.carregado THEN 'carregado'
+               WHEN p.convertido THEN 'convertido' WHEN p.inalterado THEN 'inalterado'
+               WHEN p.baixado THEN 'baixado' ELSE 'pendente' END AS status,
+          p.rows, p.zip_bytes, p.parquet_bytes, p.download_s, p.convert_s, d.load_s, p.peak_rss_mb,
+          COALESCE(p.error, d.error) AS error, p.url, GREATEST(p.updated_at, d.updated_at) AS updated_at, p.run_id
+        FROM por_parte p LEFT JOIN por_dataset d USING (year_month, dataset, run_id)
+        ORDER BY p.year_month DESC, p.dataset, p.part
+    """
+    with db.file_reader() as con:
+        return con.execute(sql).fetchdf()
+
+
+def _download_part(
+    session: requests.Session, key: str, url: str, zip_path: Path, segments: int, force: bool, ctx: dict
+) -> dict | None:
+    """
+    Baixa uma parte, a menos que o manifesto mostre que ela não mudou (retorna None nesse caso).
+    Retorna a impressão digital da origem (com os CRC32 do ZIP baixado). 'ctx' é o contexto de
+    telemetria da parte (as threads do pool não herdam o da carga).
+    """
+    with telemetry.context(**ctx):
+        if force:
+            fp = {"url": url}
+        else:
+            with telemetry.stage("remote_check", url=url) as ev:
+                unchanged, fp = _remote_check(key, url, session)
+                if unchanged:
+                    ev["status"] = "inalterado"
+            if unchanged:
+                return None
+        download_zip(url, zip_path, session=session, progress=False, segments=segments)
+        fp["crc32"] = manifest.zip_members(zip_path)
+        return fp
+
+
+def convert_part(zip_path: Path, dataset: str, out_path: Path, keywords: List[str], threads: int) -> dict:
+    """
+    Executado nos processos de conversão (lib/conversion): extrai (streaming) e converte uma parte para o
+    seu Parquet. Retorna {"events": [...], "error": str | None}: os eventos de telemetria das etapas
+    (gravados pelo processo da carga) e a falha, se houve.
+    """
+    with telemetry.collect() as events:
         try:
-            tmp_zip.unlink(missing_ok=True)
-        except Exception:
-            pass
+            _zip_to_parquet(zip_path, dataset, keywords, out_path=out_path, threads=threads)
+            error = None
+        except Exception as e:
+            error = str(e) or type(e).__name__
+    return {"events": events, "error": error}
 
 
-def prepare_from_uploaded_csv_bytes(csv_bytes: bytes, name: str) -> Path:
+def _convert_in_process(*args) -> dict:
+    """convert_part(*args) num processo novo (python -m lib.conversion); levanta RuntimeError se ele morrer."""
+    root = Path(__file__).resolve().parent.parent
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(root), os.environ.get("PYTHONPATH")]))}
+    proc = subprocess.run(
+        [sys.executable, "-m", "lib.conversion"], input=pickle.dumps(args), capture_output=True, env=env,
+    )
+    if proc.returncode != 0 or not proc.stdout:
+        tail = proc.stderr.decode("utf-8", "replace").strip().splitlines()[-1:] or [f"código {proc.returncode}"]
+        raise RuntimeError(f"Processo de conversão falhou: {tail[0]}")
+    return pickle.loads(proc.stdout)
+
+
+def prepare_all_for_month(
+    year: int,
+    month: int,
+    targets: List[str] | None = None,
+    base_url: str | None = None,
+    download_workers: int | None = None,
+    convert_workers: int | None = None,
+    keep_zips: bool = False,
+    segments: int = 1,
+    force: bool = False,
+    incremental: bool = False,
+    threads: int | None = None,
+) -> List[Tuple[str, str]]:
     """
-    Recebe os bytes de um CSV enviado pelo usuário (upload),
-    converte para Parquet e carrega na tabela 'name'.
+    Baixa e prepara todos os pacotes de um mês (Empresas0..9, Estabelecimentos0..9, Socios0..9, Simples
+    e domínios), ou apenas os datasets em 'targets'.
+
+    - partes que o manifesto mostra inalteradas (HEAD e CRC32 do diretório central) não são baixadas
+      nem convertidas; force=True ignora o manifesto;
+    - downloads simultâneos ('download_workers') sobre uma sessão HTTP com pool de conexões limitado,
+      retomáveis e opcionalmente segmentados ('segments' faixas por arquivo, ver download_zip);
+    - cada parte é extraída e convertida num processo próprio (lib/conversion; até 'convert_workers' ao
+      mesmo tempo, cada um com 'threads' threads do DuckDB; padrão: núcleos / convert_workers), assim que
+      termina de baixar, gerando um Parquet por parte numa versão nova do dataset, data/{dataset}/v{NNNN}/{parte}.parquet
+      (ou o diretório particionado .../{parte}/uf=XX/situacao=YY/, ver PARTITIONED_STORAGE);
+    - ao final, cada dataset completo é registrado uma única vez sobre a versão nova, onde as partes
+      inalteradas entram como hardlinks (lib/storage); a troca da tabela/view é atômica e as versões
+      antigas são removidas em seguida (só se alguma parte mudou ou se a tabela não veio dessa versão).
+
+    Com incremental=True, as tabelas com chave em lib/schema.CHAVES que já existem recebem só o diff
+    em relação à carga anterior (upsert_table_from_parquet, anotado em change_log) e as derivadas
+    e o índice de busca são atualizados só nas chaves alteradas; as demais são recriadas.
+
+    Cada etapa de cada parte gera eventos de telemetria (lib/telemetry) na tabela load_catalog, resumidos
+    por get_catalog. Retorna [(dataset, parte), ...] preparados.
+    Um dataset com alguma parte falha não é registrado (a tabela anterior é mantida).
     """
-    fobj = io.BytesIO(csv_bytes)
-    parquet = read_csv_semicolon_to_parquet(fobj, name)
-    ensure_table_from_parquet(name, parquet, replace=True)
-    return parquet
+    ym = f"{int(year):04d}-{int(month):02d}"
+    with telemetry.run(year_month=ym):
+        return _prepare_month(
+            ym, year, month, targets, base_url, download_workers, convert_workers, keep_zips, segments, force,
+            incremental, threads,
+        )
+
+
+def _prepare_month(
+    ym: str, year: int, month: int, targets: List[str] | None, base_url: str | None, download_workers: int | None,
+    convert_workers: int | None, keep_zips: bool, segments: int, force: bool, incremental: bool,
+    threads: int | None,
+) -> List[Tuple[str, str]]:
+    parts = month_parts(year, month, targets, base_url)
+    dl_workers = download_workers or DOWNLOAD_WORKERS
+    cv_workers = convert_workers or CONVERT_WORKERS
+    threads = threads or max(1, (os.cpu_count() or 1) // cv_workers)
+
+    expected: dict = {}
+    for dataset, part, _ in parts:
+        expected.setdefault(dataset, []).append(part)
+
+    zip_dir = DATA / "zips" / ym
+    zip_dir.mkdir(parents=True, exist_ok=True)
+    for dataset, part, url in parts:
+        telemetry.mark("month_parts", "pendente", dataset=dataset, part=part, url=url)
+
+    ok: dict = {}
+    changed: set = set()
+    # versão nova (lib/storage) de cada dataset com alguma parte a converter
+    staging: dict = {}
+    # conversões: cada uma num processo próprio (lib/conversion), disparado por uma thread do pool
+    with requests.Session() as session, ThreadPoolExecutor(dl_workers) as dl_pool, ThreadPoolExecutor(
+        cv_workers
+    ) as cv_pool:
+        adapter = HTTPAdapter(pool_connections=dl_workers, pool_maxsize=dl_workers * max(segments, 1))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        def _stored_elsewhere(dataset: str, part: str) -> bool:
+            # parte convertida no outro formato (arquivo x diretório particionado) ou antes da numeração das
+            # linhas (lib/schema.NUMERACAO): converte de novo
+            entry = manifest.get_entry(f"{dataset}/{part}")
+            if not entry:
+                return False
+            parquet = entry.get("parquet", "")
+            if parquet.endswith(".parquet") == _is_partitioned(dataset):
+                return True
+            col = NUMERACAO.get(dataset)
+            return bool(col) and Path(parquet).is_file() and col not in pq.read_schema(parquet).names
+
+        downloads = {
+            dl_pool.submit(
+                _download_part, session, f"{dataset}/{part}", url, zip_dir / f"{part}.zip", segments,
+                force or _stored_elsewhere(dataset, part),
+                {**telemetry.current_context(), "dataset": dataset, "part": part},
+            ): (dataset, part)
+            for dataset, part, url in parts
+        }
+        conversions = {}
+        for fut in as_completed(downloads):
+            dataset, part = downloads[fut]
+            try:
+                fp = fut.result()
+            except Exception:
+                continue  # a falha já está no evento da etapa (remote_check/download_zip)
+            if fp is None:
+                ok.setdefault(dataset, []).append(part)
+                continue
+            zip_path = zip_dir / f"{part}.zip"
+            if dataset not in staging:
+                staging[dataset] = storage.new_version(DATA / dataset)
+            out_path = staging[dataset] / f"{part}.parquet"
+            fut_cv = cv_pool.submit(
+                _convert_in_process, zip_path, dataset, out_path, DATASETS[dataset]["keywords"], threads,
+            )
+            conversions[fut_cv] = (dataset, part, zip_path, out_path, fp)
+
+        for fut in as_completed(conversions):
+            dataset, part, zip_path, out_path, fp = conversions[fut]
+            try:
+                res = fut.result()
+            except Exception as e:  # o processo de conversão morreu sem devolver os eventos
+                res = {"events": [], "error": str(e) or type(e).__name__}
+                telemetry.mark("read_csv_semicolon_to_parquet", "erro", res["error"], dataset=dataset, part=part)
+            with telemetry.context(dataset=dataset, part=part):
+                telemetry.replay(res["events"])
+            if res["error"]:
+                manifest.forget(f"{dataset}/{part}")
+                continue
+            manifest.record(f"{dataset}/{part}", fp, storage_path(dataset, out_path))
+            ok.setdefault(dataset, []).append(part)
+            changed.add(dataset)
+            if not keep_zips:
+                remove_download(zip_path)
+
+    prepared: List[Tuple[str, str]] = []
+    registered: List[str] = []
+    upserted: List[str] = []
+    for dataset, ds_parts in expected.items():
+        if sorted(ok.get(dataset, [])) != sorted(ds_parts):
+            continue
+        table = DATASETS[dataset]["table"]
+        previous = _registered_source(table)
+        sources = {part: Path(manifest.get_entry(f"{dataset}/{part}")["parquet"]) for part in ds_parts}
+        if dataset in changed or previous is None or not _is_loaded_from(table, previous) or any(
+            src.parent != previous for src in sources.values()
+        ):
+            # versão nova completa: partes convertidas agora + hardlinks das inalteradas; a troca da
+            # tabela/view para ela é atômica e as versões antigas saem depois
+            version = staging.get(dataset) or storage.new_version(DATA / dataset)
+            for part, src in sources.items():
+                if src.parent != version:
+                    moved = storage.link_into(src, version, [validation_report_path(src)])
+                    manifest.move(f"{dataset}/{part}", moved)
+            with telemetry.context(dataset=dataset):
+                counts = _upsert_table(table, version, ym) if incremental else None
+                if counts is None:
+                    _register_table(table, version, derive=False)
+                    registered.append(table)
+                else:
+                    upserted.append(table)
+            _gc_versions(dataset, version, previous)
+        prepared += [(dataset, part) for part in ds_parts]
+    # tabelas derivadas (lib/derived): uma reconstrução por derivada, depois de todas as cargas;
+    # as que só dependem de tabelas com diff são atualizadas nas chaves alteradas
+    built = _rebuild_derived(*registered)
+    for table in upserted:
+        with telemetry.stage("derived", tables=[table], incremental=True) as ev:
+            refreshed = derived.refresh_for(table, changed_keys_sql(table, ym), skip=built)
+            ev["built"] = refreshed
+        built += refreshed
+    return prepared
 
 
 # ------------------------------------------------------------------------------
-# (Opcional) utilitário simples para salvar DataFrame em parquet
+# (Opcional) utilitários simples para salvar/serializar DataFrames pequenos
 # ------------------------------------------------------------------------------
 def save_parquet(df: pd.DataFrame, name: str) -> Path:
     """
@@ -262,4 +1413,15 @@ def save_parquet(df: pd.DataFrame, name: str) -> Path:
     """
     path = DATA / f"{name}.parquet"
     df.to_parquet(path, index=False)
-    return path
\ No newline at end of file
+    return path
+
+def df_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """DataFrame pequeno (já em memória) -> CSV com ';' em UTF-8. Resultados completos: lib/export."""
+    return df.to_csv(sep=";", index=False).encode("utf-8")
+
+
+def df_to_parquet_bytes(df: pd.DataFrame) -> bytes:
+    """DataFrame pequeno (já em memória) -> Parquet (zstd). Resultados completos: lib/export."""
+    buff = io.BytesIO()
+    df.to_parquet(buff, index=False, compression=PARQUET_COMPRESSION)
+    return buff.getvalue()
@@ -0,0 +1,200 @@
+# lib/manifest.py
+# Manifesto de ingestão: para cada parte carregada guarda a "impressão digital" da origem
+# (URL, Content-Length, ETag/Last-Modified, CRC32 dos membros do ZIP) e o Parquet gerado,
+# para que arquivos que não mudaram não sejam baixados nem convertidos de novo.
+
+from __future__ import annotations
+
+import io
+import json
+import threading
+import time
+import zipfile
+from pathlib import Path
+from typing import List
+
+import requests
+
+from lib.download import DOWNLOAD_TIMEOUT, remote_info
+
+MANIFEST_PATH = Path("data") / "manifest.json"
+
+# Leitura-modificação-gravação do manifesto, uma por vez (cargas simultâneas de lib/jobs)
+_lock = threading.Lock()
+
+
+# ------------------------------------------------------------------------------
+# Leitura remota do diretório central do ZIP (só os últimos KB, via Range)
+# ------------------------------------------------------------------------------
+class HttpRangeFile(io.RawIOBase):
+    """
+    Arquivo remoto somente-leitura e "seekable" sobre requisições HTTP Range.
+    Permite abrir um ZIP remoto com zipfile.ZipFile lendo apenas o diretório central.
+    """
+
+    def __init__(self, url: str, size: int, session: requests.Session | None = None, block: int = 64 * 1024):
+        super().__init__()
+        self.url = url
+        self.size = size
+        self.http = session or requests
+        self.block = block
+        self.pos = 0
+        self._cache_start = 0
+        self._cache = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        r = self.http.get(self.url, headers={"Range": f"bytes={start}-{end - 1}"}, timeout=DOWNLOAD_TIMEOUT)
+        r.raise_for_status()
+        if r.status_code != 206:
+            raise OSError("O servidor não atendeu a requisição com Range.")
+        return r.content
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self.size - self.pos
+        n = min(n, self.size - self.pos)
+        if n <= 0:
+            return b""
+        start, end = self.pos, self.pos + n
+        cache_end = self._cache_start + len(self._cache)
+        if not (self._cache_start <= start and end <= cache_end):
+            self._cache_start = start
+            self._cache = self._fetch(start, min(self.size, max(end, start + self.block)))
+        out = self._cache[start - self._cache_start:end - self._cache_start]
+        self.pos += len(out)
+        return out
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+
+def zip_members(source) -> List[str]:
+    """
+    Lista "nome:crc32:tamanho" dos membros de um ZIP (caminho local ou arquivo, ex. HttpRangeFile),
+    lendo apenas o diretório central.
+    """
+    with zipfile.ZipFile(source, "r") as z:
+        return sorted(f"{m.filename}:{m.CRC:08x}:{m.file_size}" for m in z.infolist() if not m.is_dir())
+
+
+# ------------------------------------------------------------------------------
+# Impressões digitais
+# ------------------------------------------------------------------------------
+def remote_fingerprint(url: str, session: requests.Session | None = None, with_crc: bool = True) -> dict:
+    """
+    Impressão digital de um ZIP remoto: cabeçalhos do HEAD e, se o servidor aceitar Range,
+    os CRC32 do diretório central (sem baixar o arquivo).
+    """
+    info = remote_info(url, session)
+    fp = {k: info[k] for k in ("url", "size", "etag", "last_modified")}
+    if with_crc and info["ranges"] and info["size"]:
+        fp["crc32"] = zip_members(HttpRangeFile(url, info["size"], session))
+    return fp
+
+
+def local_fingerprint(zip_path: Path) -> dict:
+    """Impressão digital de um ZIP local (upload): tamanho e CRC32 dos membros."""
+    return {"size": zip_path.stat().st_size, "crc32": zip_members(zip_path)}
+
+
+# ------------------------------------------------------------------------------
+# Manifesto
+# ------------------------------------------------------------------------------
+def load_manifest() -> dict:
+    if not MANIFEST_PATH.exists():
+        return {}
+    return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+
+
+def get_entry(key: str) -> dict | None:
+    """Registro do manifesto para 'key' (ex.: 'empresas' ou 'estabelecimentos/Estabelecimentos3')."""
+    return load_manifest().get(key)
+
+
+def record(key: str, fingerprint: dict, parquet: Path) -> None:
+    """Grava (de forma atômica) a impressão digital da origem e o Parquet gerado para 'key'."""
+    with _lock:
+        manifest = load_manifest()
+        manifest[key] = {**fingerprint, "parquet": Path(parquet).as_posix(),
+                         "updated_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        _save_manifest(manifest)
+
+
+def move(key: str, parquet: Path) -> None:
+    """Aponta 'key' para outro caminho do mesmo Parquet (ex.: hardlink numa nova versão), mantendo a origem."""
+    with _lock:
+        manifest = load_manifest()
+        if key in manifest:
+            manifest[key]["parquet"] = Path(parquet).as_posix()
+            _save_manifest(manifest)
+
+
+def forget(key: str) -> None:
+    """Remove 'key' do manifesto (força a próxima carga)."""
+    with _lock:
+        manifest = load_manifest()
+        if manifest.pop(key, None) is not None:
+            _save_manifest(manifest)
+
+
+def _save_manifest(manifest: dict) -> None:
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    tmp.replace(MANIFEST_PATH)
+
+
+def is_unchanged(key: str, fingerprint: dict) -> bool:
+    """
+    True se a origem descrita por 'fingerprint' é a mesma já carregada em 'key' e o Parquet ainda existe.
+
+    A URL tem de ser a mesma (outra raiz ou espelho = outra origem, mesmo com tamanho e ETag iguais).
+    Com cabeçalhos HTTP: mesmo tamanho e mesmo ETag (ou Last-Modified) bastam. Se os cabeçalhos mudaram
+    (ex.: arquivo republicado idêntico), os CRC32 do diretório central decidem.
+    """
+    entry = get_entry(key)
+    if not entry or not Path(entry.get("parquet", "")).exists():
+        return False
+    if entry.get("url") != fingerprint.get("url") or entry.get("size") != fingerprint.get("size"):
+        return False
+    if fingerprint.get("etag") and entry.get("etag"):
+        if fingerprint["etag"] == entry["etag"]:
+            return True
+    elif fingerprint.get("last_modified") and fingerprint.get("last_modified") == entry.get("last_modified"):
+        return True
+    return bool(fingerprint.get("crc32")) and fingerprint.get("crc32") == entry.get("crc32")
+
+
+def check_remote(key: str, url: str, session: requests.Session | None = None) -> tuple[bool, dict]:
+    """
+    Compara o ZIP remoto com o manifesto: primeiro só o HEAD; os CRC32 do diretório central
+    (algumas requisições Range pequenas) só são lidos quando os cabeçalhos não bastam para decidir.
+    Retorna (inalterado, impressão digital).
+    """
+    fp = remote_fingerprint(url, session, with_crc=False)
+    if is_unchanged(key, fp):
+        return True, {**fp, "crc32": get_entry(key).get("crc32")}
+    entry = get_entry(key)
+    if entry and entry.get("size") == fp.get("size") and entry.get("crc32"):
+        try:
+            fp = remote_fingerprint(url, session, with_crc=True)
+        except (OSError, requests.RequestException, zipfile.BadZipFile):
+            return False, fp
+        return is_unchanged(key, fp), fp
+    return False, fp
@@ -0,0 +1,289 @@
+# lib/queries.py
+# SQL das páginas de consulta como funções: filtros da tela -> (sql, parâmetros, chave de paginação).
+# As páginas, os benchmarks (bench.queries) e a linha de comando montam exatamente as mesmas consultas.
+# O SQL não tem ORDER BY/LIMIT: a ordem e o tamanho da página vêm da paginação por chave
+# (lib.loaders.query_page) ou o resultado completo vai para a exportação (lib/export).
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence, Tuple
+
+from lib.search import search_sql
+from lib.util import cnpj_predicate, only_digits
+
+Consulta = Tuple[str, list, List[str]]
+
+DOMINIOS = ["paises", "municipios", "qualificacoes", "naturezas", "cnaes"]
+
+
+def consulta_geral(
+    cnpj: str = "", nome: str = "", uf: str = "", municipio: str = "", cnae_code: str = "", cnae_desc: str = "",
+) -> Consulta:
+    """Página 1: estabelecimentos por CNPJ, nome (índice de busca), UF, município e CNAE."""
+    cnae_code = only_digits(cnae_code)
+    # CNPJ: igualdade/faixa sobre as colunas ordenadas (cnpj14, cnpj_basico) da tabela enriquecida
+    cnpj_where, cnpj_params = cnpj_predicate(cnpj, "e.cnpj14", "e.cnpj_basico") if only_digits(cnpj) else ("1=1", [])
+
+    # Nome: índice de busca (lib/search) sobre razão social e nome fantasia, ordenado por relevância
+    if nome:
+        hits_sql, params = search_sql(nome, ["empresas", "estabelecimentos"])
+        hits = f"""
+hits AS ({hits_sql}),
+hit_est AS (SELECT cnpj14, MAX(score) AS score FROM hits WHERE fonte = 'estabelecimentos' GROUP BY cnpj14),
+hit_emp AS (SELECT cnpj_basico, MAX(score) AS score FROM hits WHERE fonte = 'empresas' GROUP BY cnpj_basico),"""
+        est_from = """estabelecimentos_enriched e
+  LEFT JOIN hit_est he ON he.cnpj14 = e.cnpj14
+  LEFT JOIN hit_emp hm ON hm.cnpj_basico = e.cnpj_basico"""
+        est_where = " AND (he.score IS NOT NULL OR hm.score IS NOT NULL)"
+        relevancia = "GREATEST(COALESCE(he.score, 0), COALESCE(hm.score, 0))"
+    else:
+        hits, params = "", []
+        est_from, est_where, relevancia = "estabelecimentos_enriched e", "", "NULL::DOUBLE"
+    params += cnpj_params
+
+    # estabelecimentos_enriched (lib/derived) já traz razão social e nome do município
+    sql = """
+WITH""" + hits + """
+res AS (
+  SELECT
+    e.cnpj14, e.razao_social as razao,
+    e.nome_fantasia, e.uf, e.municipio, e.municipio_nome, e.cnae_principal,
+    e.cnae_secundaria as cnae_sec, """ + relevancia + """ AS relevancia
+  FROM """ + est_from + """
+  WHERE """ + cnpj_where + est_where + """
+)
+SELECT * FROM res WHERE 1=1
+"""
+
+    # filtros simples
+    if uf:
+        sql += " AND res.uf = ?"; params.append(uf.upper())
+    if municipio:
+        sql += " AND (CAST(res.municipio AS TEXT) LIKE ? OR LOWER(res.municipio_nome) LIKE ?)"
+        params += [f"%{municipio}%", f"%{municipio.lower()}%"]
+    # CNAE (principal ou secundário): semi-junção com a tabela ponte estabelecimento_cnae (ordenada por CNAE)
+    if cnae_code:
+        sql += " AND res.cnpj14 IN (SELECT cnpj14 FROM estabelecimento_cnae WHERE cnae = ?)"
+        params.append(cnae_code)
+    if cnae_desc:
+        sql += """ AND res.cnpj14 IN (
+      SELECT ec.cnpj14 FROM estabelecimento_cnae ec JOIN cnaes c ON c.codigo = ec.cnae
+      WHERE LOWER(c.descricao) LIKE ?)"""
+        params.append(f"%{cnae_desc.lower()}%")
+
+    # por relevância quando há nome, senão por CNPJ
+    key = ["relevancia DESC", "cnpj14"] if nome else ["cnpj14"]
+    return sql, params, key
+
+
+def empresas(porte: Sequence[str] = (), natureza: str = "", razao: str = "") -> Consulta:
+    """Página 2: empresas por porte, prefixo da natureza jurídica e razão social (índice de busca)."""
+    params = []
+    hits, relevancia, join = "", "", ""
+    if razao:
+        hits_sql, params = search_sql(razao, ["empresas"])
+        hits = f"WITH hits AS ({hits_sql})"
+        relevancia = ",\n  hits.score AS relevancia"
+        join = "JOIN hits USING (cnpj_basico)"
+
+    sql = hits + """
+SELECT
+  LPAD(CAST(cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico,
+  razao_social,
+  natureza_juridica,
+  qualif_responsavel as qualif_resp,
+  capital_social,
+  porte,
+  efr""" + relevancia + """
+FROM empresas """ + join + """ WHERE 1=1
+"""
+    if porte: sql += f" AND porte IN ({','.join(['?']*len(porte))})"; params += list(porte)
+    if natureza: sql += " AND CAST(natureza_juridica AS TEXT) LIKE ?"; params.append(f"{natureza}%")
+    key = ["relevancia DESC", "cnpj_basico"] if razao else ["cnpj_basico"]
+    return sql, params, key
+
+
+def estabelecimentos(id_matriz_filial: str = "", uf: str = "", cnae: str = "", natureza_prefixo: str = "") -> Consulta:
+    """Página 3: estabelecimentos enriquecidos por matriz/filial, UF, CNAE principal e natureza jurídica."""
+    cnae = only_digits(cnae)
+    # estabelecimentos_enriched (lib/derived): junções com empresas e domínios feitas na carga
+    sql = """
+SELECT
+  cnpj14,
+  razao_social as razao, natureza_juridica as natura, natureza_nome,
+  nome_fantasia, uf, municipio, municipio_nome,
+  pais as pais_cod, pais_nome,
+  situacao, data_situacao as data_sit,
+  cnae_principal, cnae_secundaria as cnae_secund
+FROM estabelecimentos_enriched
+WHERE 1=1
+"""
+    params = []
+    if id_matriz_filial: sql += " AND id_matriz_filial = ?"; params.append(id_matriz_filial)
+    if uf: sql += " AND uf = ?"; params.append(uf.upper())
+    if cnae: sql += " AND cnae_principal = ?"; params.append(cnae)
+    if natureza_prefixo: sql += " AND CAST(natureza_juridica AS TEXT) LIKE ?"; params.append(f"{natureza_prefixo}%")
+    return sql, params, ["cnpj14"]
+
+
+def socios(nome: str = "", ident: str = "") -> Consulta:
+    """Página 4: sócios por nome (índice de busca) e identificador (PJ/PF/estrangeiro)."""
+    params = []
+    hits, relevancia, join = "", "", ""
+    if nome:
+        hits_sql, params = search_sql(nome, ["socios"])
+        hits = f"WITH hits AS ({hits_sql})"
+        relevancia = ",\n  hits.score AS relevancia"
+        join = "JOIN hits ON hits.cnpj_basico = s.cnpj_basico AND hits.nome = s.nome_razao"
+
+    sql = hits + """
+SELECT
+  LPAD(CAST(s.cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico,
+  ident_socio,
+  nome_razao,
+  cpf_cnpj_socio as doc,
+  qualif_socio as qualif,
+  data_entrada_soc,
+  faixa_etaria,
+  linha""" + relevancia + """
+FROM socios s """ + join + """ WHERE 1=1
+"""
+    if ident: sql += " AND ident_socio = ?"; params.append(ident)
+    # sócios não têm chave única e podem vir repetidos: 'linha' (gravada na conversão, lib/schema.NUMERACAO)
+    # desempata a chave de paginação, para que repetidos na virada da página não sumam
+    key = ["cnpj_basico", "nome_razao", "doc", "qualif", "data_entrada_soc", "ident_socio", "faixa_etaria", "linha"]
+    if nome: key = ["relevancia DESC"] + key
+    return sql, params, key
+
+
+def simples(opcao_simples: str = "", opcao_mei: str = "") -> Consulta:
+    """Página 5: opção pelo Simples/MEI."""
+    sql = """
+SELECT
+  LPAD(CAST(cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico,
+  opcao_simples,
+  data_opcao_simples as dt_op_simples,
+  data_exclusao_simples as dt_exc_simples,
+  opcao_mei,
+  data_opcao_mei as dt_op_mei,
+  data_exclusao_mei as dt_exc_mei
+FROM simples WHERE 1=1
+"""
+    params = []
+    if opcao_simples: sql += " AND opcao_simples = ?"; params.append(opcao_simples)
+    if opcao_mei: sql += " AND opcao_mei = ?"; params.append(opcao_mei)
+    return sql, params, ["cnpj_basico"]
+
+
+def dominio(tabela: str) -> Tuple[str, list]:
+    """Página 6: conteúdo de uma tabela de domínio."""
+    if tabela not in DOMINIOS:
+        raise ValueError(f"Domínio desconhecido: {tabela!r}")
+    return f"SELECT * FROM {tabela} LIMIT 5000", []
+
+
+def relatorio(cnpj_basico: str) -> Dict[str, Tuple[str, list]]:
+    """Página 7: as quatro consultas do relatório consolidado de um CNPJ básico (8 dígitos)."""
+    return {
+        # Empresa (com o domínio da natureza)
+        "empresa": ("""
+            SELECT
+              LPAD(CAST(e.cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico,
+              e.razao_social,
+              e.natureza_juridica AS natureza,
+              n.descricao AS natureza_nome,
+              e.capital_social,
+              e.porte,
+              e.efr
+            FROM empresas e
+            LEFT JOIN naturezas n ON n.codigo = e.natureza_juridica
+            WHERE e.cnpj_basico = ?
+        """, [cnpj_basico]),
+        # Estabelecimentos
+        "estabelecimentos": ("""
+            SELECT
+              cnpj14,
+              nome_fantasia, uf, municipio, municipio_nome, pais AS pais_cod, pais_nome,
+              situacao, data_situacao AS data_sit, cnae_principal, cnae_secundaria AS cnae_sec
+            FROM estabelecimentos_enriched WHERE cnpj_basico = ?
+            ORDER BY cnpj14
+        """, [cnpj_basico]),
+        # Sócios
+        "socios": ("""
+            SELECT
+              ident_socio,
+              nome_razao,
+              cpf_cnpj_socio AS doc,
+              qualif_socio AS qualif,
+              data_entrada_soc,
+              faixa_etaria
+            FROM socios WHERE cnpj_basico = ?
+        """, [cnpj_basico]),
+        # Simples
+        "simples": ("""
+            SELECT
+              opcao_simples, data_opcao_simples AS dt_op_simples,
+              data_exclusao_simples AS dt_exc_simples,
+              opcao_mei, data_opcao_mei AS dt_op_mei,
+              data_exclusao_mei AS dt_exc_mei
+            FROM simples WHERE cnpj_basico = ?
+        """, [cnpj_basico]),
+    }
+
+
+def relatorio_lote(lote: str = "lote") -> Dict[str, str]:
+    """
+    Relatório em lote (lib/reports): as seções de relatorio() para todos os CNPJs da tabela temporária
+    'lote' (cnpj_basico INTEGER, cnpj14 VARCHAR ou NULL), uma junção por seção. Cada seção traz a chave
+    cnpj_basico (8 dígitos) na 1ª coluna e vem ordenada por ela; com cnpj14 no lote, só aquele
+    estabelecimento entra na seção de estabelecimentos.
+    """
+    return {
+        "empresa": f"""
+            SELECT
+              LPAD(CAST(e.cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico,
+              e.razao_social,
+              e.natureza_juridica AS natureza,
+              n.descricao AS natureza_nome,
+              e.capital_social,
+              e.porte,
+              e.efr
+            FROM empresas e
+            LEFT JOIN naturezas n ON n.codigo = e.natureza_juridica
+            WHERE e.cnpj_basico IN (SELECT cnpj_basico FROM {lote})
+            ORDER BY e.cnpj_basico
+        """,
+        "estabelecimentos": f"""
+            SELECT
+              LPAD(CAST(cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico,
+              cnpj14,
+              nome_fantasia, uf, municipio, municipio_nome, pais AS pais_cod, pais_nome,
+              situacao, data_situacao AS data_sit, cnae_principal, cnae_secundaria AS cnae_sec
+            FROM estabelecimentos_enriched
+            WHERE cnpj_basico IN (SELECT cnpj_basico FROM {lote} WHERE cnpj14 IS NULL)
+               OR cnpj14 IN (SELECT cnpj14 FROM {lote} WHERE cnpj14 IS NOT NULL)
+            ORDER BY cnpj14
+        """,
+        "socios": f"""
+            SELECT
+              LPAD(CAST(cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico,
+              ident_socio,
+              nome_razao,
+              cpf_cnpj_socio AS doc,
+              qualif_socio AS qualif,
+              data_entrada_soc,
+              faixa_etaria
+            FROM socios WHERE cnpj_basico IN (SELECT cnpj_basico FROM {lote})
+            ORDER BY cnpj_basico
+        """,
+        "simples": f"""
+            SELECT
+              LPAD(CAST(cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico,
+              opcao_simples, data_opcao_simples AS dt_op_simples,
+              data_exclusao_simples AS dt_exc_simples,
+              opcao_mei, data_opcao_mei AS dt_op_mei,
+              data_exclusao_mei AS dt_exc_mei
+            FROM simples WHERE cnpj_basico IN (SELECT cnpj_basico FROM {lote})
+            ORDER BY cnpj_basico
+        """,
+    }
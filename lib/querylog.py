@@ -0,0 +1,190 @@
+# lib/querylog.py
+# Instrumentação das consultas (lib.loaders.query, query_page, count_rows): para cada execução grava
+# fingerprint do SQL (literais e listas de parâmetros colapsados), formato dos parâmetros, tempo de
+# parede, linhas e bytes devolvidos. Consultas acima de SLOW_QUERY_MS têm o plano capturado com
+# EXPLAIN ANALYZE numa thread à parte (no máximo uma vez por fingerprint a cada PLAN_INTERVAL_S).
+# Os registros vão para arquivos JSONL rotativos em data/querylog (funciona também com o banco
+# somente leitura e com vários processos). Desligado (CNPJ_QUERY_LOG=0), o custo é um if por consulta.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, List, Sequence
+
+import pandas as pd
+
+from lib import db
+from lib.cache import normalize_sql
+
+QUERY_LOG_ENABLED = os.environ.get("CNPJ_QUERY_LOG", "1").lower() not in ("0", "false", "nao", "não")
+
+# Captura de plano (EXPLAIN ANALYZE) para consultas lentas
+EXPLAIN_SLOW = os.environ.get("CNPJ_QUERY_EXPLAIN", "1").lower() not in ("0", "false", "nao", "não")
+SLOW_QUERY_MS = float(os.environ.get("CNPJ_SLOW_QUERY_MS", "500"))
+PLAN_INTERVAL_S = 600
+
+# Arquivos: querylog.jsonl (atual) + querylog.N.jsonl (anteriores), no máximo LOG_KEEP arquivos
+LOG_DIR = Path(os.environ.get("CNPJ_QUERY_LOG_DIR", str(Path("data") / "querylog")))
+LOG_MAX_BYTES = int(os.environ.get("CNPJ_QUERY_LOG_MB", "8")) * 1024 * 1024
+LOG_KEEP = 5
+
+# Texto do SQL guardado por registro (o fingerprint é calculado sobre o SQL inteiro)
+_SQL_MAX_CHARS = 4000
+
+_lock = threading.Lock()
+_last_plan: dict = {}
+
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTA = re.compile(r"\?(?:\s*,\s*\?)+")
+_TUPLAS = re.compile(r"\(\?\+?\)(?:\s*,\s*\(\?\+?\))+")
+
+
+# ------------------------------------------------------------------------------
+# Fingerprint
+# ------------------------------------------------------------------------------
+def fingerprint_sql(sql: str) -> str:
+    """SQL normalizado: espaços colapsados, literais viram ?, listas de ? viram ?+ (IN, VALUES)."""
+    norm = _LITERAIS.sub("?", normalize_sql(sql))
+    norm = _LISTA.sub("?+", norm)
+    return _TUPLAS.sub("(?+)+", norm)
+
+
+def fingerprint(sql: str) -> str:
+    """Identificador curto da forma da consulta (mesmo SQL com outros valores = mesmo fingerprint)."""
+    return hashlib.sha1(fingerprint_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+def param_shape(params: Sequence[Any] | None) -> str:
+    """Tipos dos parâmetros, sem os valores (ex.: "str,str,int")."""
+    return ",".join(type(p).__name__ for p in params or ())
+
+
+# ------------------------------------------------------------------------------
+# Gravação
+# ------------------------------------------------------------------------------
+def _path(i: int = 0) -> Path:
+    return LOG_DIR / ("querylog.jsonl" if i == 0 else f"querylog.{i}.jsonl")
+
+
+def _rotate() -> None:
+    for i in range(LOG_KEEP - 1, 0, -1):
+        if _path(i - 1).exists():
+            _path(i - 1).replace(_path(i))
+
+
+def _write(rec: dict) -> None:
+    line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+    with _lock:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        try:
+            if _path().stat().st_size + len(line) > LOG_MAX_BYTES:
+                _rotate()
+        except FileNotFoundError:
+            pass
+        with open(_path(), "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _capture_plan(fp: str, sql: str, params: list) -> None:
+    try:
+        with db.reader() as con:
+            rows = con.execute(f"EXPLAIN ANALYZE {sql}", params).fetchall()
+        plan = "\n".join(str(r[-1]) for r in rows)
+    except Exception as e:  # o plano é diagnóstico: falha não afeta a consulta original
+        plan = f"(EXPLAIN ANALYZE falhou: {e})"
+    _write({"kind": "plan", "ts": time.time(), "fingerprint": fp, "plan": plan})
+
+
+def record(
+    sql: str,
+    params: Sequence[Any] | None,
+    seconds: float,
+    rows: int | None = None,
+    nbytes: int | None = None,
+    source: str = "query",
+    error: str | None = None,
+) -> None:
+    """Registra uma execução (no-op com QUERY_LOG_ENABLED=False) e dispara a captura do plano se foi lenta."""
+    if not QUERY_LOG_ENABLED:
+        return
+    fp = fingerprint(sql)
+    ms = seconds * 1000
+    _write({
+        "kind": "query", "ts": time.time(), "fingerprint": fp, "source": source,
+        "sql": normalize_sql(sql)[:_SQL_MAX_CHARS], "params": param_shape(params),
+        "ms": round(ms, 3), "rows": rows, "bytes": nbytes, "error": error,
+    })
+    if EXPLAIN_SLOW and error is None and ms >= SLOW_QUERY_MS:
+        now = time.time()
+        with _lock:
+            if now - _last_plan.get(fp, 0) < PLAN_INTERVAL_S:
+                return
+            _last_plan[fp] = now
+        threading.Thread(
+            target=_capture_plan, args=(fp, sql, list(params or ())), name="cnpj-explain", daemon=True,
+        ).start()
+
+
+# ------------------------------------------------------------------------------
+# Leitura (página de diagnóstico)
+# ------------------------------------------------------------------------------
+def _records() -> List[dict]:
+    out = []
+    for i in range(LOG_KEEP - 1, -1, -1):
+        try:
+            with open(_path(i), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        out.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue  # linha cortada por outro processo escrevendo ao mesmo tempo
+        except FileNotFoundError:
+            continue
+    return out
+
+
+def load() -> pd.DataFrame:
+    """Todas as execuções registradas (arquivos atuais e rotacionados), da mais antiga para a mais recente."""
+    df = pd.DataFrame([r for r in _records() if r.get("kind") == "query"])
+    if df.empty:
+        return pd.DataFrame(columns=["ts", "fingerprint", "source", "sql", "params", "ms", "rows", "bytes", "error"])
+    df["ts"] = pd.to_datetime(df["ts"], unit="s")
+    return df.drop(columns=["kind"])
+
+
+def slowest(limit: int = 20) -> pd.DataFrame:
+    """Fingerprints ordenados pelo p95 da latência, com contagem, p50/p95/máximo, linhas e último SQL."""
+    df = load()
+    if df.empty:
+        return pd.DataFrame(columns=["fingerprint", "execucoes", "p50_ms", "p95_ms", "max_ms", "linhas_media", "sql"])
+    agg = df.groupby("fingerprint").agg(
+        execucoes=("ms", "size"),
+        p50_ms=("ms", lambda s: s.quantile(0.5)),
+        p95_ms=("ms", lambda s: s.quantile(0.95)),
+        max_ms=("ms", "max"),
+        linhas_media=("rows", "mean"),
+        erros=("error", "count"),
+        ultima=("ts", "max"),
+        sql=("sql", "last"),
+    )
+    return agg.sort_values("p95_ms", ascending=False).head(limit).reset_index()
+
+
+def plans(fp: str) -> List[dict]:
+    """Planos capturados (EXPLAIN ANALYZE) de um fingerprint, do mais recente para o mais antigo."""
+    found = [r for r in _records() if r.get("kind") == "plan" and r.get("fingerprint") == fp]
+    return sorted(found, key=lambda r: r["ts"], reverse=True)
+
+
+def clear() -> None:
+    """Apaga os registros (todos os arquivos)."""
+    with _lock:
+        for i in range(LOG_KEEP):
+            _path(i).unlink(missing_ok=True)
+        _last_plan.clear()
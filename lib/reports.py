@@ -0,0 +1,271 @@
+# lib/reports.py
+# Relatórios consolidados em lote (milhares de CNPJs de uma planilha): a lista é normalizada de uma vez
+# (qualquer máscara; 8 dígitos = CNPJ básico, 14 = estabelecimento), vira uma tabela temporária e cada
+# seção do relatório (empresa, estabelecimentos, sócios, Simples) sai de uma única junção com ela
+# (lib/queries.relatorio_lote), lida em lotes Arrow ordenados por CNPJ básico. Saída:
+#   - "zip": um ZIP com uma pasta por CNPJ básico ({cnpj_basico}/empresa.csv, ...), os mesmos CSVs do
+#     relatório da página, gravados em streaming (memória limitada ao maior CNPJ);
+#   - "parquet": um diretório com um Parquet por seção, particionado por faixa do CNPJ básico
+#     ({secao}/faixa=NN/) e ordenado por ele, gravado direto pelo DuckDB (COPY).
+# Nos dois casos vai junto nao_encontrados.csv: entradas inválidas, CNPJs básicos sem empresa e
+# CNPJs de 14 dígitos sem o estabelecimento.
+
+from __future__ import annotations
+
+import io
+import os
+import shutil
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from lib import db, queries
+
+REPORT_DIR = Path(os.environ.get("CNPJ_REPORT_DIR", str(Path("data") / "reports")))
+
+# Relatórios gerados são mantidos por este tempo (segundos), como as exportações
+REPORT_TTL_S = int(os.environ.get("CNPJ_REPORT_TTL_S", str(6 * 3600)))
+
+FORMATOS = ("zip", "parquet")
+
+# Linhas por lote Arrow lido de cada seção
+BATCH_ROWS = 100_000
+
+# Dígitos do CNPJ básico que formam a partição do Parquet (2 = até 100 faixas por seção). Uma
+# partição por CNPJ vira um arquivo por CNPJ e seção, e o sistema de arquivos passa a ser o gargalo.
+PARTITION_DIGITS = 2
+
+_CSV = pacsv.WriteOptions(include_header=True, delimiter=";")
+_CSV_BODY = pacsv.WriteOptions(include_header=False, delimiter=";")
+
+
+def cleanup(max_age_s: int | None = None) -> int:
+    """Apaga relatórios (arquivos e diretórios) mais antigos que max_age_s; retorna quantos."""
+    if not REPORT_DIR.exists():
+        return 0
+    limit = time.time() - (REPORT_TTL_S if max_age_s is None else max_age_s)
+    n = 0
+    for p in REPORT_DIR.iterdir():
+        if p.stat().st_mtime < limit:
+            shutil.rmtree(p, ignore_errors=True) if p.is_dir() else p.unlink(missing_ok=True)
+            n += 1
+    return n
+
+
+# ------------------------------------------------------------------------------
+# Lista de CNPJs
+# ------------------------------------------------------------------------------
+def read_list(source: str | Path | bytes | BinaryIO) -> List[str]:
+    """
+    Valores da lista enviada (arquivo, bytes ou UploadedFile): a 1ª célula de cada linha de um
+    CSV/TXT (separador ';', ',' ou tabulação). Cabeçalho e linhas sem dígitos são descartados depois.
+    """
+    if isinstance(source, (str, Path)):
+        raw = Path(source).read_bytes()
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        raw = bytes(source)
+    else:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        raw = source.read()
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = raw.decode("latin1")
+    lines = pd.Series(text.splitlines(), dtype="string")
+    return lines.str.split(r"[;,\t]", n=1, regex=True).str[0].str.strip().str.strip('"').tolist()
+
+
+def normalize(values: Iterable[str]) -> pd.DataFrame:
+    """
+    Normaliza a lista (vetorizado): colunas entrada, cnpj_basico (8 dígitos), cnpj14 (14 dígitos ou
+    nulo) e motivo ("inválido" ou nulo). 8 dígitos = CNPJ básico; 9 a 14 = CNPJ completo (zeros à
+    esquerda perdidos na planilha são repostos); menos de 8 ou mais de 14 = inválido. Entradas sem
+    dígitos (cabeçalho, linhas vazias) são descartadas.
+    """
+    s = pd.Series(list(values), dtype="string").fillna("")
+    digits = s.str.replace(r"\D+", "", regex=True)
+    n = digits.str.len()
+    full = (n >= 9) & (n <= 14)
+    cnpj14 = digits.str.zfill(14).where(full)
+    basico = digits.where(n == 8, cnpj14.str[:8])
+    out = pd.DataFrame({"entrada": s, "cnpj_basico": basico, "cnpj14": cnpj14})
+    out["motivo"] = pd.Series("inválido", index=out.index, dtype="string").where(basico.isna())
+    return out[n > 0].reset_index(drop=True)
+
+
+def _register(con, lista: pd.DataFrame) -> int:
+    """Cria a tabela temporária 'lote' (chaves distintas e válidas) no cursor 'con'; retorna o tamanho."""
+    valid = lista.loc[lista["motivo"].isna(), ["cnpj_basico", "cnpj14"]].astype(object)
+    con.register("lista_cnpjs", pa.Table.from_pandas(valid, preserve_index=False))
+    try:
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE lote AS
+            SELECT DISTINCT CAST(cnpj_basico AS INTEGER) AS cnpj_basico, CAST(cnpj14 AS VARCHAR) AS cnpj14
+            FROM lista_cnpjs
+        """)
+    finally:
+        con.unregister("lista_cnpjs")
+    return con.execute("SELECT COUNT(*) FROM lote").fetchone()[0]
+
+
+def _not_found(con, lista: pd.DataFrame) -> pd.DataFrame:
+    """Entradas sem relatório: inválidas, CNPJ básico sem empresa, CNPJ de 14 dígitos sem estabelecimento."""
+    missing = con.execute("""
+        SELECT LPAD(CAST(l.cnpj_basico AS VARCHAR), 8, '0') AS cnpj_basico, l.cnpj14,
+          CASE WHEN e.cnpj_basico IS NULL THEN 'CNPJ básico não encontrado'
+               ELSE 'estabelecimento não encontrado' END AS motivo_lote
+        FROM lote l
+        LEFT JOIN empresas e USING (cnpj_basico)
+        WHERE e.cnpj_basico IS NULL
+           OR (l.cnpj14 IS NOT NULL AND l.cnpj14 NOT IN (SELECT cnpj14 FROM estabelecimentos_enriched
+                                                         WHERE cnpj_basico IN (SELECT cnpj_basico FROM lote)))
+    """).fetchdf()
+    keys = lista.astype({"cnpj_basico": object, "cnpj14": object})
+    out = keys.merge(missing.astype(object), on=["cnpj_basico", "cnpj14"], how="left")
+    out["motivo"] = out["motivo"].astype(object).fillna(out["motivo_lote"])
+    return out.loc[out["motivo"].notna(), ["entrada", "cnpj_basico", "cnpj14", "motivo"]].reset_index(drop=True)
+
+
+# ------------------------------------------------------------------------------
+# Saídas
+# ------------------------------------------------------------------------------
+def _csv_bytes(table: pa.Table, header: bool = True) -> bytes:
+    buf = io.BytesIO()
+    pacsv.write_csv(table, buf, _CSV if header else _CSV_BODY)
+    return buf.getvalue()
+
+
+def _csv_groups(reader: pa.RecordBatchReader, drop: List[str]) -> Iterator[tuple[str, bytes]]:
+    """
+    (cnpj_basico, linhas em CSV sem cabeçalho) de um resultado ordenado pela 1ª coluna, sem as colunas
+    'drop'. Cada lote vira CSV de uma vez e é fatiado nas quebras de linha (um write_csv por CNPJ custa
+    mais que a consulta); grupos que atravessam lotes são emendados.
+    """
+    key, pending = None, []
+    for batch in reader:
+        n = batch.num_rows
+        if not n:
+            continue
+        keys = batch.column(0).to_numpy(zero_copy_only=False)
+        cuts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        starts, stops = np.concatenate(([0], cuts)), np.concatenate((cuts, [n]))
+        table = pa.Table.from_batches([batch]).drop_columns(drop)
+        body = _csv_bytes(table, header=False)
+        ends = np.flatnonzero(np.frombuffer(body, np.uint8) == 10) + 1
+        if len(ends) == n:
+            offsets = np.concatenate(([0], ends))
+            chunks = (body[offsets[a]:offsets[b]] for a, b in zip(starts, stops))
+        else:  # algum valor com quebra de linha: CSV por CNPJ
+            chunks = (_csv_bytes(table.slice(a, b - a), header=False) for a, b in zip(starts, stops))
+        for a, chunk in zip(starts, chunks):
+            if keys[a] != key and pending:
+                yield key, b"".join(pending)
+                pending = []
+            key = keys[a]
+            pending.append(chunk)
+    if pending:
+        yield key, b"".join(pending)
+
+
+def _write_zip(
+    con, sqls: dict, out: Path, missing: pd.DataFrame, on_progress: Callable[[str, int], None] | None
+) -> int:
+    """Uma pasta por CNPJ básico com os CSVs das seções (sem a chave, exceto na empresa, como na página)."""
+    found: set = set()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for secao, sql in sqls.items():  # "empresa" vem primeiro e define os CNPJs encontrados
+            reader = con.execute(sql).fetch_record_batch(BATCH_ROWS)
+            key = [] if secao == "empresa" else ["cnpj_basico"]
+            header = _csv_bytes(reader.schema.empty_table().drop_columns(key))
+            seen: set = set()
+            for basico, rows in _csv_groups(reader, key):
+                if key and basico not in found:
+                    continue
+                zf.writestr(f"{basico}/{secao}.csv", header + rows)
+                seen.add(basico)
+                if on_progress and len(seen) % 1000 == 0:
+                    on_progress(secao, len(seen))
+            if not key:
+                found = seen
+            # todo relatório tem as quatro seções, mesmo vazias (só o cabeçalho)
+            for basico in sorted(found - seen):
+                zf.writestr(f"{basico}/{secao}.csv", header)
+            if on_progress:
+                on_progress(secao, len(seen))
+        zf.writestr("nao_encontrados.csv", missing.to_csv(sep=";", index=False))
+    return len(found)
+
+
+def _write_parquet(
+    con, sqls: dict, out: Path, missing: pd.DataFrame, on_progress: Callable[[str, int], None] | None
+) -> int:
+    """Um Parquet por seção, particionado por faixa do CNPJ básico (COPY do DuckDB, sem passar pelo Python)."""
+    out.mkdir(parents=True)
+    for secao, sql in sqls.items():
+        con.execute(f"""
+            COPY (SELECT *, LEFT(cnpj_basico, {PARTITION_DIGITS}) AS faixa FROM ({sql}))
+            TO '{(out / secao).as_posix()}' (FORMAT PARQUET, COMPRESSION zstd, PARTITION_BY (faixa))
+        """)
+        if on_progress:
+            on_progress(secao, 0)
+    missing.to_csv(out / "nao_encontrados.csv", sep=";", index=False)
+    return con.execute(
+        "SELECT COUNT(DISTINCT cnpj_basico) FROM lote WHERE cnpj_basico IN (SELECT cnpj_basico FROM empresas)"
+    ).fetchone()[0]
+
+
+def generate(
+    values: Iterable[str],
+    fmt: str = "zip",
+    out_dir: Path | None = None,
+    on_progress: Callable[[str, int], None] | None = None,
+) -> dict:
+    """
+    Gera os relatórios de todos os CNPJs em 'values' (ver normalize) no formato 'fmt' ("zip" ou
+    "parquet") dentro de 'out_dir' (padrão REPORT_DIR). on_progress(secao, cnpjs_gravados) é chamado
+    durante a gravação. Retorna {"path", "format", "entradas", "cnpjs", "encontrados", "nao_encontrados",
+    "seconds", "cnpjs_por_s", "missing"} ("missing" é o DataFrame de nao_encontrados.csv).
+    """
+    if fmt not in FORMATOS:
+        raise ValueError(f"Formato deve ser um de {FORMATOS}, não {fmt!r}")
+    t0 = time.perf_counter()
+    lista = normalize(values)
+    base = out_dir or REPORT_DIR
+    if out_dir is None:
+        cleanup()
+    base.mkdir(parents=True, exist_ok=True)
+    stem = f"relatorios_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    out = base / (f"{stem}.zip" if fmt == "zip" else stem)
+
+    with db.reader() as con:
+        n = _register(con, lista)
+        missing = _not_found(con, lista)
+        writer = _write_zip if fmt == "zip" else _write_parquet
+        found = writer(con, queries.relatorio_lote("lote"), out, missing, on_progress)
+    secs = time.perf_counter() - t0
+    return {
+        "path": out.as_posix(), "format": fmt, "entradas": len(lista), "cnpjs": n, "encontrados": found,
+        "nao_encontrados": len(missing), "seconds": round(secs, 3),
+        "cnpjs_por_s": round(n / secs, 1) if secs else None, "missing": missing,
+    }
+
+
+def pack(path: str | Path) -> Path:
+    """ZIP (sem recompressão) de um relatório em Parquet, para download; ZIPs são devolvidos como estão."""
+    path = Path(path)
+    if path.is_file():
+        return path
+    out = path.with_suffix(".zip")
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for p in sorted(path.rglob("*")):
+            if p.is_file():
+                zf.write(p, p.relative_to(path).as_posix())
+    return out
@@ -71,4 +71,194 @@ DOMINIOS = {
     "qualificacoes": {"codigo": "CÓDIGO", "descricao": "DESCRIÇÃO"},
     "naturezas": {"codigo": "CÓDIGO", "descricao": "DESCRIÇÃO"},
     "cnaes": {"codigo": "CÓDIGO", "descricao": "DESCRIÇÃO"},
-}
\ No newline at end of file
+}
+
+# Tabelas principais (colunas na ordem do layout da RFB)
+TABELAS = {
+    "empresas": EMPRESAS_COLS,
+    "estabelecimentos": ESTABELECIMENTOS_COLS,
+    "socios": SOCIOS_COLS,
+    "simples": SIMPLES_COLS,
+}
+
+
+def column_names(table: str):
+    """
+    Nomes (snake_case, estáveis) das colunas de 'table' na ordem do layout.
+    Os arquivos da RFB não têm cabeçalho; os rótulos do layout ficam nos valores dos dicionários acima.
+    Retorna None para tabelas desconhecidas.
+    """
+    if table in DOMINIOS:
+        return list(DOMINIOS[table].keys())
+    if table in TABELAS:
+        return list(TABELAS[table].keys())
+    return None
+
+
+# ------------------------------------------------------------------------------
+# Tipos do modo de ingestão tipado
+# ------------------------------------------------------------------------------
+# "data": AAAAMMDD ('0'/'00000000' = nulo) -> DATE; "decimal": vírgula decimal -> DECIMAL(18,2);
+# tipos inteiros do DuckDB (UTINYINT/SMALLINT/INTEGER); lista -> ENUM (dicionário no Parquet).
+# Colunas não listadas continuam VARCHAR (ordem/DV/CEP com zeros à esquerda, textos livres).
+# cnpj_basico é numérico (cabe em INTEGER); o CNPJ completo com zeros fica em cnpj14 (ver DERIVADAS).
+UFS = [
+    "AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA", "PB", "PE", "PI",
+    "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO", "EX",
+]
+
+TIPOS = {
+    "empresas": {
+        "cnpj_basico": "INTEGER",
+        "natureza_juridica": "SMALLINT",
+        "qualif_responsavel": "SMALLINT",
+        "capital_social": "decimal",
+        "porte": "UTINYINT",
+    },
+    "estabelecimentos": {
+        "cnpj_basico": "INTEGER",
+        "id_matriz_filial": "UTINYINT",
+        "situacao": "UTINYINT",
+        "data_situacao": "data",
+        "motivo_situacao": "SMALLINT",
+        "pais": "SMALLINT",
+        "data_inicio_atividade": "data",
+        "cnae_principal": "INTEGER",
+        "uf": UFS,
+        "municipio": "SMALLINT",
+        "data_situacao_especial": "data",
+    },
+    "socios": {
+        "cnpj_basico": "INTEGER",
+        "ident_socio": "UTINYINT",
+        "qualif_socio": "SMALLINT",
+        "data_entrada_soc": "data",
+        "pais": "SMALLINT",
+        "qualif_rep_legal": "SMALLINT",
+        "faixa_etaria": "UTINYINT",
+    },
+    "simples": {
+        "cnpj_basico": "INTEGER",
+        "opcao_simples": ["S", "N"],
+        "data_opcao_simples": "data",
+        "data_exclusao_simples": "data",
+        "opcao_mei": ["S", "N"],
+        "data_opcao_mei": "data",
+        "data_exclusao_mei": "data",
+    },
+    "paises": {"codigo": "SMALLINT"},
+    "municipios": {"codigo": "SMALLINT"},
+    "qualificacoes": {"codigo": "SMALLINT"},
+    "naturezas": {"codigo": "SMALLINT"},
+    "cnaes": {"codigo": "INTEGER"},
+}
+
+
+# Colunas calculadas na ingestão (nos dois modos), a partir das colunas texto do arquivo
+DERIVADAS = {
+    "estabelecimentos": {
+        "cnpj14": "LPAD(cnpj_basico, 8, '0') || LPAD(cnpj_ordem, 4, '0') || LPAD(cnpj_dv, 2, '0')",
+    },
+}
+
+# Tabelas sem chave única (sócios podem vir repetidos): coluna gravada na conversão com o número da linha,
+# parte * 10^10 + posição no arquivo da RFB. Única e fixa até a próxima carga; desempata a paginação
+# por chave (lib/queries.socios).
+NUMERACAO = {
+    "socios": "linha",
+}
+
+# Ordem física (Parquet e tabela) e colunas indexadas, para buscas por CNPJ por faixa/igualdade
+ORDENACAO = {
+    "empresas": "cnpj_basico",
+    "estabelecimentos": "cnpj14",
+    "socios": "cnpj_basico",
+    "simples": "cnpj_basico",
+}
+
+INDICES = {
+    "empresas": ["cnpj_basico"],
+    "estabelecimentos": ["cnpj14"],
+    "socios": ["cnpj_basico", "linha"],
+    "simples": ["cnpj_basico"],
+}
+
+# Chave única por tabela para a carga incremental (diff mês a mês); tabelas fora daqui são sempre recriadas
+CHAVES = {
+    "empresas": "cnpj_basico",
+    "estabelecimentos": "cnpj14",
+    "simples": "cnpj_basico",
+}
+
+# Colunas de partição (layout Hive: {tabela}/uf=XX/situacao=YY/*.parquet) no armazenamento particionado
+PARTICOES = {
+    "estabelecimentos": ["uf", "situacao"],
+}
+
+# Catálogo de TIPOS (define a tabela, palavras-chave para achar o arquivo no ZIP e os
+# arquivos publicados mensalmente pela RFB: "rfb_file" + 0..parts-1, ou um único ZIP se parts=0)
+DATASETS = {
+    "empresas": {
+        "table": "empresas",
+        "rfb_file": "Empresas",
+        "parts": 10,
+        "keywords": ["empresas", "empresa", "empresas1", "empresa1"],
+        "hint": "Cadastro de empresas (CNPJ Básico, razão social, capital, porte, natureza, etc.)",
+    },
+    "estabelecimentos": {
+        "table": "estabelecimentos",
+        "rfb_file": "Estabelecimentos",
+        "parts": 10,
+        "keywords": ["estabelec", "estabelecimentos"],
+        "hint": "Estabelecimentos (CNPJ completo, nome fantasia, CNAE, endereço, UF/município, etc.)",
+    },
+    "socios": {
+        "table": "socios",
+        "rfb_file": "Socios",
+        "parts": 10,
+        "keywords": ["socios", "sócios", "socio", "socio1"],
+        "hint": "Sócios (identificador PF/PJ/estrangeiro, qualificação, datas, etc.)",
+    },
+    "simples": {
+        "table": "simples",
+        "rfb_file": "Simples",
+        "parts": 0,
+        "keywords": ["simples", "mei"],
+        "hint": "Opção pelo Simples/MEI (datas de opção/exclusão).",
+    },
+    "paises": {
+        "table": "paises",
+        "rfb_file": "Paises",
+        "parts": 0,
+        "keywords": ["paises", "países", "pais"],
+        "hint": "Tabela de domínio — Países.",
+    },
+    "municipios": {
+        "table": "municipios",
+        "rfb_file": "Municipios",
+        "parts": 0,
+        "keywords": ["municipio", "municípios", "municipios"],
+        "hint": "Tabela de domínio — Municípios.",
+    },
+    "qualificacoes": {
+        "table": "qualificacoes",
+        "rfb_file": "Qualificacoes",
+        "parts": 0,
+        "keywords": ["qualificacao", "qualificações", "qualificacoes"],
+        "hint": "Tabela de domínio — Qualificações.",
+    },
+    "naturezas": {
+        "table": "naturezas",
+        "rfb_file": "Naturezas",
+        "parts": 0,
+        "keywords": ["natureza", "naturezas"],
+        "hint": "Tabela de domínio — Naturezas Jurídicas.",
+    },
+    "cnaes": {
+        "table": "cnaes",
+        "rfb_file": "Cnaes",
+        "parts": 0,
+        "keywords": ["cnae", "cnaes"],
+        "hint": "Tabela de domínio — CNAEs.",
+    },
+}
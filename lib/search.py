@@ -0,0 +1,221 @@
+# lib/search.py
+# Busca por nome (razão social, nome fantasia, nome do sócio) com índice invertido de termos.
+# Na carga, cada tabela de origem gera três tabelas no DuckDB (no modo "view", Parquets; ver lib/db.rebuild):
+#   busca_{tabela}_docs   (doc, cnpj_basico, cnpj14, nome, nome_norm)  — nomes normalizados
+#   busca_{tabela}_vocab  (termo_id, termo, df)                         — vocabulário (pequeno)
+#   busca_{tabela}_termos (termo_id, doc)                               — postings, ordenadas por termo
+# Uma busca "contém" varre só o vocabulário (milhões de termos em vez de dezenas de milhões de nomes)
+# e resolve o resto por junção nas postings. Normalização: minúsculas, sem acentos, só [a-z0-9].
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import List, Tuple
+
+import pandas as pd
+
+from lib import cache, db
+from lib.schema import CHAVES
+
+# Tabela de origem -> coluna de nome e chaves levadas para o resultado
+FONTES = {
+    "empresas": {"nome": "razao_social", "cnpj14": False, "distinct": False},
+    "estabelecimentos": {"nome": "nome_fantasia", "cnpj14": True, "distinct": False},
+    "socios": {"nome": "nome_razao", "cnpj14": False, "distinct": True},
+}
+
+# (Re)constrói o índice da tabela sempre que ela é (re)carregada
+BUILD_ON_LOAD = True
+
+# Pesos por tipo de casamento do termo da consulta com o termo do índice
+_PESO_EXATO, _PESO_PREFIXO, _PESO_CONTEM = 3, 2, 1
+
+
+def normalize(text: str) -> str:
+    """Normalização usada no índice: minúsculas, sem acentos, separadores viram espaço."""
+    folded = unicodedata.normalize("NFKD", (text or "").lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", folded).strip()
+
+
+def _norm_sql(col: str) -> str:
+    """Mesma normalização de normalize(), em SQL."""
+    return f"TRIM(REGEXP_REPLACE(STRIP_ACCENTS(LOWER({col})), '[^a-z0-9]+', ' ', 'g'))"
+
+
+def _tables(table: str) -> Tuple[str, str, str]:
+    return f"busca_{table}_docs", f"busca_{table}_vocab", f"busca_{table}_termos"
+
+
+def has_index(table: str) -> bool:
+    """True se o índice de busca da tabela já foi construído."""
+    docs, vocab, termos = _tables(table)
+    with db.reader() as con:
+        n = con.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name IN (?, ?, ?)", (docs, vocab, termos)
+        ).fetchone()[0]
+    return n == 3
+
+
+# ------------------------------------------------------------------------------
+# Construção
+# ------------------------------------------------------------------------------
+def _docs_sql(table: str, where: str = "TRUE", first_doc: int = 0) -> str:
+    """Documentos (nomes normalizados) de 'table', numerados a partir de first_doc + 1."""
+    spec = FONTES[table]
+    nome = spec["nome"]
+    cnpj14 = "cnpj14" if spec["cnpj14"] else "NULL::VARCHAR AS cnpj14"
+    distinct = "DISTINCT " if spec["distinct"] else ""
+    return f"""
+        SELECT {first_doc} + ROW_NUMBER() OVER () AS doc, * FROM (
+          SELECT {distinct}cnpj_basico, {cnpj14}, {nome} AS nome, {_norm_sql(nome)} AS nome_norm
+          FROM {table} WHERE {nome} IS NOT NULL AND {where}
+        ) WHERE nome_norm <> ''
+    """
+
+
+def _tokens_sql(docs: str, where: str = "TRUE") -> str:
+    return f"""
+        CREATE OR REPLACE TEMP TABLE _busca_tokens AS
+        SELECT DISTINCT doc, termo FROM (
+          SELECT doc, UNNEST(STRING_SPLIT(nome_norm, ' ')) AS termo FROM {docs} WHERE {where}
+        ) WHERE termo <> ''
+    """
+
+
+def build_index(table: str) -> int:
+    """
+    (Re)constrói o índice de busca de 'table' (uma das FONTES) a partir da tabela carregada.
+    As três tabelas são trocadas de uma vez (lib/db.rebuild); retorna o número de documentos indexados.
+    """
+    docs, vocab, termos = _tables(table)
+    with db.rebuild() as rb:
+        rb.table(docs, _docs_sql(table))
+        rb.con.execute(_tokens_sql(docs))
+        rb.table(vocab, """
+            SELECT ROW_NUMBER() OVER (ORDER BY termo) AS termo_id, termo, COUNT(*) AS df
+            FROM _busca_tokens GROUP BY termo
+        """)
+        rb.table(termos, f"""
+            SELECT v.termo_id, t.doc FROM _busca_tokens t JOIN {vocab} v USING (termo)
+            ORDER BY v.termo_id, t.doc
+        """)
+        rb.con.execute("DROP TABLE _busca_tokens")
+        n = rb.con.execute(f"SELECT COUNT(*) FROM {docs}").fetchone()[0]
+    cache.bump()
+    return n
+
+
+def refresh_index(table: str, keys: str) -> int:
+    """
+    Atualização incremental do índice de 'table' depois de uma carga com diff (lib.loaders.upsert_table_from_parquet):
+    os documentos das chaves em 'keys' (subconsulta sobre a chave de lib/schema.CHAVES) saem do índice e
+    voltam com o nome atual; termos novos entram no fim do vocabulário e o df de cada termo é ajustado.
+    Retorna o número de documentos reindexados.
+    """
+    docs, vocab, termos = _tables(table)
+    key = CHAVES[table]
+    with db.writer() as con:
+        con.execute("BEGIN TRANSACTION")
+        try:
+            con.execute(f"CREATE OR REPLACE TEMP TABLE _busca_out AS SELECT doc FROM {docs} WHERE {key} IN {keys}")
+            con.execute(f"""
+                UPDATE {vocab} SET df = df - o.n
+                FROM (SELECT termo_id, COUNT(*) AS n FROM {termos} WHERE doc IN (SELECT doc FROM _busca_out)
+                      GROUP BY termo_id) o
+                WHERE {vocab}.termo_id = o.termo_id
+            """)
+            con.execute(f"DELETE FROM {termos} WHERE doc IN (SELECT doc FROM _busca_out)")
+            con.execute(f"DELETE FROM {docs} WHERE doc IN (SELECT doc FROM _busca_out)")
+            con.execute(f"DELETE FROM {vocab} WHERE df <= 0")
+            last_doc = con.execute(f"SELECT COALESCE(MAX(doc), 0) FROM {docs}").fetchone()[0]
+            con.execute(f"INSERT INTO {docs} {_docs_sql(table, f'{key} IN {keys}', last_doc)}")
+            con.execute(_tokens_sql(docs, f"doc > {last_doc}"))
+            last_term = con.execute(f"SELECT COALESCE(MAX(termo_id), 0) FROM {vocab}").fetchone()[0]
+            con.execute(f"""
+                INSERT INTO {vocab}
+                SELECT {last_term} + ROW_NUMBER() OVER (ORDER BY termo), termo, 0
+                FROM (SELECT DISTINCT termo FROM _busca_tokens) WHERE termo NOT IN (SELECT termo FROM {vocab})
+            """)
+            con.execute(f"""
+                UPDATE {vocab} SET df = df + t.n
+                FROM (SELECT termo, COUNT(*) AS n FROM _busca_tokens GROUP BY termo) t
+                WHERE {vocab}.termo = t.termo
+            """)
+            con.execute(f"INSERT INTO {termos} SELECT v.termo_id, t.doc FROM _busca_tokens t JOIN {vocab} v USING (termo)")
+            n = con.execute(f"SELECT COUNT(*) FROM {docs} WHERE doc > {last_doc}").fetchone()[0]
+            con.execute("DROP TABLE _busca_tokens")
+            con.execute("DROP TABLE _busca_out")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    cache.bump()
+    return n
+
+
+# ------------------------------------------------------------------------------
+# Consulta
+# ------------------------------------------------------------------------------
+def _indexed_sql(table: str, words: List[str]) -> Tuple[str, list]:
+    docs, vocab, termos = _tables(table)
+    values = ", ".join(f"({i}, ?)" for i in range(len(words)))
+    sql = f"""
+        SELECT '{table}' AS fonte, d.cnpj_basico, d.cnpj14, d.nome, h.score
+        FROM (
+          SELECT doc, SUM(peso) AS score FROM (
+            SELECT t.doc, m.i, MAX(m.peso) AS peso
+            FROM {termos} t
+            JOIN (
+              SELECT q.i, v.termo_id,
+                     CASE WHEN v.termo = q.w THEN {_PESO_EXATO}
+                          WHEN STARTS_WITH(v.termo, q.w) THEN {_PESO_PREFIXO}
+                          ELSE {_PESO_CONTEM} END * LN(1 + n.total / v.df) AS peso
+              FROM {vocab} v
+              JOIN (VALUES {values}) q(i, w) ON CONTAINS(v.termo, q.w)
+              CROSS JOIN (SELECT COUNT(*) AS total FROM {docs}) n
+            ) m USING (termo_id)
+            GROUP BY t.doc, m.i
+          ) GROUP BY doc HAVING COUNT(*) = {len(words)}
+        ) h
+        JOIN {docs} d USING (doc)
+    """
+    return sql, list(words)
+
+
+def _scan_sql(table: str, words: List[str]) -> Tuple[str, list]:
+    """Sem índice (tabela carregada antes dele existir): varredura com a mesma normalização."""
+    spec = FONTES[table]
+    nome = spec["nome"]
+    cnpj14 = "cnpj14" if spec["cnpj14"] else "NULL::VARCHAR AS cnpj14"
+    distinct = "DISTINCT " if spec["distinct"] else ""
+    where = " AND ".join([f"{_norm_sql(nome)} LIKE ?"] * len(words)) or "FALSE"
+    sql = f"""
+        SELECT {distinct}'{table}' AS fonte, cnpj_basico, {cnpj14}, {nome} AS nome, 1.0::DOUBLE AS score
+        FROM {table} WHERE {where}
+    """
+    return sql, [f"%{w}%" for w in words]
+
+
+def search_sql(term: str, tables: List[str] | None = None) -> Tuple[str, list]:
+    """
+    SQL (e parâmetros) com todos os nomes que contêm todas as palavras de 'term' (sem acento/caixa),
+    com colunas fonte, cnpj_basico, cnpj14 (só estabelecimentos), nome e score (maior = mais relevante:
+    termo exato > prefixo > trecho, ponderado pela raridade do termo). Para usar como CTE nas páginas.
+    """
+    words = normalize(term).split()
+    parts, params = [], []
+    for table in tables or list(FONTES):
+        sql, p = _indexed_sql(table, words) if words and has_index(table) else _scan_sql(table, words)
+        parts.append(sql)
+        params += p
+    return "\nUNION ALL BY NAME\n".join(parts), params
+
+
+def search(term: str, tables: List[str] | None = None, k: int = 50) -> pd.DataFrame:
+    """Top-k da busca por nome (ver search_sql), do mais relevante para o menos relevante."""
+    sql, params = search_sql(term, tables)
+    sql = f"SELECT * FROM ({sql}) ORDER BY score DESC, LENGTH(nome), nome LIMIT {int(k)}"
+    with db.reader() as con:
+        return con.execute(sql, params).fetchdf()
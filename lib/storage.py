@@ -0,0 +1,126 @@
+# lib/storage.py
+# Versões dos Parquets de cada dataset (troca blue/green). Uma carga que muda um dataset grava as partes
+# num diretório novo data/{dataset}/v{NNNN}/; as partes que não mudaram entram como hardlinks da versão
+# anterior (sem copiar bytes). A tabela (ou view) é trocada para a versão nova numa transação e só então
+# as versões antigas são removidas (gc), de modo que leitores nunca veem um dataset pela metade.
+# No modo "view" as consultas não abrem o cnpj.duckdb: as views sobre as versões atuais ficam num catálogo
+# de serviço (JSON ao lado do banco), publicado atomicamente, que lib/db aplica num DuckDB em memória.
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Iterable, List
+
+# Como as consultas leem cada dataset (lib.loaders.ensure_table_from_parquet com replace=True):
+#   - "table": cópia numa tabela nativa do cnpj.duckdb, ordenada por ORDENACAO e com os índices de INDICES;
+#   - "view": views sobre os Parquets da versão atual, servidas por um DuckDB em memória em cada processo
+#     (lib/db); o dado não é duplicado no banco, as buscas por CNPJ usam as estatísticas de row group dos
+#     Parquets (gravados ordenados por ORDENACAO) e as consultas não disputam o lock do arquivo com a carga.
+#     Derivadas e índices de busca também viram Parquets versionados (lib/db.rebuild).
+MODE = os.environ.get("CNPJ_STORAGE_MODE", "table").lower()
+
+_VERSION = re.compile(r"^v(\d{4,})$")
+
+
+def versions(dataset_dir: Path) -> List[Path]:
+    """Diretórios de versão de um dataset, do mais antigo para o mais novo."""
+    if not dataset_dir.is_dir():
+        return []
+    found = [p for p in dataset_dir.iterdir() if p.is_dir() and _VERSION.match(p.name)]
+    return sorted(found, key=lambda p: int(p.name[1:]))
+
+
+def version_of(path: Path) -> Path | None:
+    """Diretório de versão que contém 'path' (ou o próprio 'path'), se houver."""
+    for p in (Path(path), *Path(path).parents):
+        if _VERSION.match(p.name):
+            return p
+    return None
+
+
+def new_version(dataset_dir: Path) -> Path:
+    """Cria (vazio) o próximo diretório de versão do dataset e o retorna."""
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    existing = versions(dataset_dir)
+    n = int(existing[-1].name[1:]) + 1 if existing else 1
+    while True:
+        path = dataset_dir / f"v{n:04d}"
+        try:
+            path.mkdir()
+            return path
+        except FileExistsError:  # outra carga criou a mesma versão ao mesmo tempo
+            n += 1
+
+
+def _link(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:  # outro sistema de arquivos (ou sem suporte a hardlink): copia
+        shutil.copy2(src, dst)
+
+
+def link_into(src: Path, version_dir: Path, sidecars: Iterable[Path] = ()) -> Path:
+    """
+    Coloca o Parquet 'src' (arquivo ou diretório Hive) em 'version_dir' com o mesmo nome, por hardlink,
+    junto com os arquivos auxiliares 'sidecars' (ex.: relatório de validação) que existirem.
+    Retorna o novo caminho.
+    """
+    dst = version_dir / src.name
+    if src.is_dir():
+        shutil.rmtree(dst, ignore_errors=True)
+        shutil.copytree(src, dst, copy_function=_link)
+    else:
+        dst.unlink(missing_ok=True)
+        _link(src, dst)
+    for extra in sidecars:
+        if extra.exists():
+            target = version_dir / extra.name
+            target.unlink(missing_ok=True)
+            _link(extra, target)
+    return dst
+
+
+def gc(dataset_dir: Path, keep: Iterable[Path | None]) -> List[Path]:
+    """
+    Remove do dataset as versões fora de 'keep' e os Parquets soltos do layout sem versões
+    (data/{dataset}/{parte}.parquet). Retorna o que foi removido.
+    """
+    keep_names = {Path(k).name for k in keep if k is not None}
+    removed = []
+    if not dataset_dir.is_dir():
+        return removed
+    for p in dataset_dir.iterdir():
+        if p.name in keep_names:
+            continue
+        if p.is_dir() and not p.name.startswith("."):
+            shutil.rmtree(p, ignore_errors=True)
+        elif p.suffix in (".parquet", ".json"):
+            p.unlink(missing_ok=True)
+        else:
+            continue
+        removed.append(p)
+    return removed
+
+
+# ------------------------------------------------------------------------------
+# Catálogo de serviço (modo "view")
+# ------------------------------------------------------------------------------
+def read_catalog(path: Path) -> dict:
+    """Catálogo publicado: {"version": n, "views": {nome: SELECT}}; vazio se ainda não foi publicado."""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {"version": 0, "views": {}}
+
+
+def write_catalog(path: Path, catalog: dict) -> None:
+    """Grava o catálogo atomicamente (temporário + rename): leitores veem o anterior ou o novo, inteiro."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(catalog, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
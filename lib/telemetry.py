@@ -0,0 +1,292 @@
+# lib/telemetry.py
+# Telemetria da ingestão: cada etapa (download_zip, extract_tabular_from_zip, read_csv_semicolon_to_parquet,
+# ensure_table_from_parquet/upsert, índice de busca, derivadas e os prepare_from_*) gera um evento
+# estruturado com linhas, bytes lidos/gravados, duração, vazão (linhas/s, MB/s) e pico de RSS do processo.
+#
+# Os eventos vão para a tabela load_catalog do próprio banco DuckDB (lib/loaders.get_catalog resume por
+# parte) e para os ouvintes registrados com subscribe(), que recebem também o início de cada etapa
+# (acompanhamento ao vivo na página do wizard). Nos processos de conversão, que não abrem o banco,
+# os eventos são coletados (collect) e regravados pelo processo pai (replay).
+
+from __future__ import annotations
+
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Iterator, List
+
+import duckdb
+import pandas as pd
+
+from lib import db
+
+TELEMETRY_ENABLED = os.environ.get("CNPJ_TELEMETRY", "1").lower() not in ("0", "false", "nao", "não")
+
+CATALOG_TABLE = "load_catalog"
+
+# Intervalo de amostragem do RSS durante uma etapa
+RSS_SAMPLE_S = 0.05
+
+_COLUMNS = [
+    ("run_id", "VARCHAR"), ("year_month", "VARCHAR"), ("dataset", "VARCHAR"), ("part", "VARCHAR"),
+    ("stage", "VARCHAR"), ("status", "VARCHAR"), ("rows", "BIGINT"), ("bytes_in", "BIGINT"),
+    ("bytes_out", "BIGINT"), ("seconds", "DOUBLE"), ("rows_per_s", "DOUBLE"), ("mb_per_s", "DOUBLE"),
+    ("peak_rss_mb", "DOUBLE"), ("error", "VARCHAR"), ("detail", "VARCHAR"),
+    ("started_at", "TIMESTAMP"), ("finished_at", "TIMESTAMP"),
+]
+_NAMES = [c for c, _ in _COLUMNS]
+
+_context: ContextVar[dict] = ContextVar("cnpj_telemetry_context", default={})
+_collector: ContextVar[list | None] = ContextVar("cnpj_telemetry_collector", default=None)
+_listeners: List[Callable[[dict], None]] = []
+_lock = threading.Lock()
+_ready: set = set()
+
+
+class Cancelled(Exception):
+    """Levantada por um ouvinte ao receber o início de uma etapa: a carga para antes dessa etapa."""
+
+
+# ------------------------------------------------------------------------------
+# Memória
+# ------------------------------------------------------------------------------
+def _rss_bytes() -> int:
+    """RSS atual do processo (Linux: /proc; demais: pico desde o início, via getrusage)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextmanager
+def peak_rss(interval_s: float = RSS_SAMPLE_S) -> Iterator[dict]:
+    """Amostra o RSS numa thread enquanto o bloco roda; out["peak_rss_mb"] recebe o pico da etapa."""
+    out = {"peak": _rss_bytes()}
+    stop = threading.Event()
+
+    def sample() -> None:
+        while not stop.is_set():
+            out["peak"] = max(out["peak"], _rss_bytes())
+            stop.wait(interval_s)
+
+    th = threading.Thread(target=sample, daemon=True)
+    th.start()
+    try:
+        yield out
+    finally:
+        stop.set()
+        th.join()
+        out["peak_rss_mb"] = round(max(out.pop("peak"), _rss_bytes()) / 2**20, 1)
+
+
+# ------------------------------------------------------------------------------
+# Contexto (carga, mês, dataset, parte) herdado pelos eventos
+# ------------------------------------------------------------------------------
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def current_context() -> dict:
+    """Contexto atual, para repassar a threads de um pool (que não herdam contextvars)."""
+    return dict(_context.get())
+
+
+@contextmanager
+def context(**fields) -> Iterator[dict]:
+    """Campos (run_id, year_month, dataset, part, ...) anexados a todos os eventos emitidos no bloco."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield _context.get()
+    finally:
+        _context.reset(token)
+
+
+@contextmanager
+def run(**fields) -> Iterator[str]:
+    """Uma carga: novo run_id (a menos que o bloco já esteja dentro de outra carga) mais 'fields'."""
+    run_id = _context.get().get("run_id") or new_run_id()
+    with context(run_id=run_id, **fields):
+        yield run_id
+
+
+# ------------------------------------------------------------------------------
+# Eventos
+# ------------------------------------------------------------------------------
+@contextmanager
+def stage(name: str, **fields) -> Iterator[dict]:
+    """
+    Mede uma etapa. O bloco preenche no evento recebido "rows", "bytes_in" e "bytes_out" (e pode marcar
+    "status", ex. "inalterado"); duração, vazão e pico de RSS são calculados aqui. Exceções viram
+    status "erro" (com a mensagem) e seguem adiante. Campos extras vão para a coluna 'detail'.
+    """
+    if not TELEMETRY_ENABLED:
+        yield {}
+        return
+    ev = {"stage": name, "rows": None, "bytes_in": None, "bytes_out": None, **fields,
+          "event_id": uuid.uuid4().hex[:12], "started_at": datetime.now()}
+    _notify({**_context.get(), **ev, "status": "rodando"}, abortable=True)
+    error = None
+    t0 = time.perf_counter()
+    try:
+        with peak_rss() as rss:
+            yield ev
+    except BaseException as e:
+        error = str(e) or type(e).__name__
+        raise
+    finally:
+        secs = time.perf_counter() - t0
+        moved = ev["bytes_in"] if ev["bytes_in"] is not None else ev["bytes_out"]
+        ev.update(
+            status="erro" if error else ev.get("status") or "ok",
+            error=error,
+            seconds=round(secs, 4),
+            rows_per_s=round(ev["rows"] / secs, 1) if ev["rows"] is not None and secs else None,
+            mb_per_s=round(moved / 2**20 / secs, 2) if moved is not None and secs else None,
+            peak_rss_mb=rss.get("peak_rss_mb"),
+            finished_at=datetime.now(),
+        )
+        emit(ev)
+
+
+def emit(ev: dict) -> None:
+    """Publica um evento pronto (com o contexto atual): coletor, se houver; senão banco e ouvintes."""
+    rec = {**_context.get(), **ev}
+    collected = _collector.get()
+    if collected is not None:
+        collected.append(rec)
+        return
+    _persist(rec)
+    _notify(rec)
+
+
+def mark(name: str, status: str, error: str | None = None, **fields) -> None:
+    """Evento instantâneo, sem medição (ex.: parte enfileirada, falha fora de uma etapa medida)."""
+    if not TELEMETRY_ENABLED:
+        return
+    now = datetime.now()
+    emit({"stage": name, "status": status, "error": error, **fields, "started_at": now, "finished_at": now})
+
+
+def replay(events: List[dict]) -> None:
+    """Regrava eventos coletados em outro processo, completando-os com o contexto atual."""
+    for ev in events:
+        emit(ev)
+
+
+@contextmanager
+def collect() -> Iterator[List[dict]]:
+    """Guarda os eventos emitidos no bloco numa lista (processos sem acesso ao banco)."""
+    events: List[dict] = []
+    token = _collector.set(events)
+    try:
+        yield events
+    finally:
+        _collector.reset(token)
+
+
+@contextmanager
+def subscribe(callback: Callable[[dict], None]) -> Iterator[None]:
+    """
+    Registra 'callback' para os eventos do processo (início com status "rodando" e fim de cada etapa).
+    No início de uma etapa, o callback pode levantar Cancelled para interromper a carga (lib/jobs).
+    """
+    with _lock:
+        _listeners.append(callback)
+    try:
+        yield
+    finally:
+        with _lock:
+            _listeners.remove(callback)
+
+
+def _notify(rec: dict, abortable: bool = False) -> None:
+    with _lock:
+        listeners = list(_listeners)
+    for callback in listeners:
+        try:
+            callback(rec)
+        except Cancelled:
+            if abortable:
+                raise
+        except Exception:
+            pass  # um ouvinte com problema (ex.: página fechada) não interrompe a carga
+
+
+# ------------------------------------------------------------------------------
+# Persistência (tabela load_catalog)
+# ------------------------------------------------------------------------------
+def _ensure_table(con: duckdb.DuckDBPyConnection) -> None:
+    if db.DB_PATH in _ready:
+        return
+    cols = ", ".join(f"{c} {t}" for c, t in _COLUMNS)
+    con.execute(f"CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} ({cols})")
+    _ready.add(db.DB_PATH)
+
+
+def _persist(rec: dict) -> None:
+    if db.READ_ONLY:
+        return
+    extra = {k: v for k, v in rec.items() if k not in _NAMES and k != "event_id"}
+    row = [rec.get(c) for c in _NAMES]
+    row[_NAMES.index("detail")] = json.dumps(extra, ensure_ascii=False, default=str) if extra else None
+    try:
+        with db.writer() as con:
+            _ensure_table(con)
+            con.execute(f"INSERT INTO {CATALOG_TABLE} VALUES ({', '.join('?' * len(_NAMES))})", row)
+    except duckdb.Error:
+        _ready.discard(db.DB_PATH)  # telemetria não derruba a carga; a tabela é conferida de novo na próxima
+
+
+def table_exists() -> bool:
+    with db.file_reader() as con:
+        return bool(con.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?", (CATALOG_TABLE,)
+        ).fetchone())
+
+
+def events(run_id: str | None = None, limit: int = 5000) -> pd.DataFrame:
+    """Eventos gravados (da carga 'run_id' ou de todas), do mais recente para o mais antigo."""
+    if not table_exists():
+        return pd.DataFrame(columns=_NAMES)
+    where, params = ("WHERE run_id = ?", [run_id]) if run_id else ("", [])
+    with db.file_reader() as con:
+        return con.execute(
+            f"SELECT * FROM {CATALOG_TABLE} {where} ORDER BY finished_at DESC LIMIT {int(limit)}", params
+        ).fetchdf()
+
+
+def last_run_id() -> str | None:
+    if not table_exists():
+        return None
+    with db.file_reader() as con:
+        row = con.execute(
+            f"SELECT run_id FROM {CATALOG_TABLE} WHERE run_id IS NOT NULL ORDER BY finished_at DESC LIMIT 1"
+        ).fetchone()
+    return row[0] if row else None
+
+
+def stage_totals(df: pd.DataFrame) -> pd.DataFrame:
+    """Soma por etapa (tempo, linhas, bytes; pico de RSS = máximo), com a fração do tempo total."""
+    if df.empty:
+        return pd.DataFrame(columns=["stage", "eventos", "erros", "seconds", "rows", "bytes_in", "bytes_out",
+                                     "peak_rss_mb", "pct_tempo"])
+    out = df.groupby("stage").agg(
+        eventos=("stage", "size"),
+        erros=("status", lambda s: int((s == "erro").sum())),
+        seconds=("seconds", "sum"),
+        rows=("rows", lambda s: s.sum(min_count=1)),
+        bytes_in=("bytes_in", lambda s: s.sum(min_count=1)),
+        bytes_out=("bytes_out", lambda s: s.sum(min_count=1)),
+        peak_rss_mb=("peak_rss_mb", "max"),
+    ).reset_index()
+    # etapas aninhadas (prepare_from_* contém as demais) não entram no total
+    top = out[~out["stage"].str.startswith("prepare_from_")]["seconds"].sum()
+    out["pct_tempo"] = (out["seconds"] / top * 100).round(1) if top else None
+    return out.sort_values("seconds", ascending=False, ignore_index=True)
@@ -1,4 +1,8 @@
 # lib/ui.py
+from __future__ import annotations
+
+from pathlib import Path
+
 import streamlit as st
 
 def inject_global_css():
@@ -12,4 +16,143 @@ def inject_global_css():
     /* Dataframe borda suave */
     .stDataFrame { border: 1px solid #E6EBF2; border-radius: 8px; }
     </style>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+    """, unsafe_allow_html=True)
+
+def start_pagination(state_key: str, sql: str, params, key: list) -> None:
+    """
+    Guarda em st.session_state[state_key] a consulta a paginar (sem ORDER BY/LIMIT) e a chave de
+    ordenação/paginação 'key' (ver lib.loaders.query_page), a partir da 1ª página.
+    """
+    st.session_state[state_key] = {
+        "sql": sql, "params": list(params), "key": list(key), "after": None, "before": None, "page": 1,
+    }
+    st.session_state.pop(f"{state_key}_export", None)
+
+
+def paginated_dataframe(state_key: str, page_size: int | None = None):
+    """
+    Mostra a página atual da consulta guardada por start_pagination, com a contagem total
+    e botões Anterior/Próxima.
+    Retorna o DataFrame da página (None se não há consulta guardada).
+    """
+    from lib.loaders import count_rows, query_page, to_pandas
+
+    state = st.session_state.get(state_key)
+    if not state:
+        return None
+    page = query_page(state["sql"], state["params"], state["key"], state["after"], state["before"], page_size)
+    total, exact = count_rows(state["sql"], state["params"])
+    df = to_pandas(page["rows"])
+    if df.empty:
+        st.warning("Nenhum resultado.")
+        return df
+    st.success(f"{total:,} linha(s){'' if exact else ' ou mais'}.".replace(",", "."))
+    st.caption(f"Página {state['page']} — {len(df)} linha(s) nesta página.")
+    st.dataframe(df, use_container_width=True)
+    c1, c2, _ = st.columns([1, 1, 6])
+    if c1.button("◀ Anterior", key=f"{state_key}_prev", disabled=not page["has_prev"]):
+        state.update(after=None, before=page["first"], page=state["page"] - 1)
+        st.rerun()
+    if c2.button("Próxima ▶", key=f"{state_key}_next", disabled=not page["has_next"]):
+        state.update(after=page["last"], before=None, page=state["page"] + 1)
+        st.rerun()
+    return df
+
+
+def export_controls(state_key: str, file_stem: str) -> None:
+    """
+    Exportação do resultado completo (todas as páginas) da consulta guardada por start_pagination,
+    via lib.export (COPY do DuckDB para arquivo, memória constante), com andamento e botão de download.
+    """
+    from lib import export
+
+    state = st.session_state.get(state_key)
+    if not state:
+        return
+    st.markdown("#### ⬇️ Exportar resultado completo")
+    c1, c2 = st.columns([2, 1])
+    fmt = c1.selectbox("Formato", list(export.FORMATOS), key=f"{state_key}_fmt")
+    if c2.button("Gerar arquivo", key=f"{state_key}_gerar"):
+        status = st.empty()
+        try:
+            res = export.export(
+                state["sql"], state["params"], fmt, file_stem,
+                on_progress=lambda n, s: status.caption(f"Exportando… {n / 1e6:.1f} MB gravados em {s:.0f}s"),
+            )
+        except export.ExportBusyError as e:
+            status.warning(str(e))
+            return
+        status.empty()
+        st.session_state[f"{state_key}_export"] = res
+    res = st.session_state.get(f"{state_key}_export")
+    if not res or not Path(res["path"]).exists():
+        return
+    rows = f"{res['rows']:,}".replace(",", ".")
+    st.caption(f"{rows} linha(s), {res['bytes'] / 1e6:.1f} MB, gerado em {res['seconds']:.1f}s.")
+    if res["bytes"] <= export.DOWNLOAD_MAX_BYTES:
+        with open(res["path"], "rb") as f:
+            st.download_button(f"⬇️ Baixar {res['format']}", data=f, file_name=Path(res["path"]).name,
+                               mime=res["mime"], key=f"{state_key}_baixar")
+    else:
+        st.info(f"Arquivo grande demais para o navegador; disponível no servidor em {res['path']}.")
+
+
+_EVENT_COLS = ["stage", "dataset", "part", "status", "rows", "bytes_in", "bytes_out", "seconds",
+               "rows_per_s", "mb_per_s", "peak_rss_mb", "error"]
+
+
+def job_status(job_id: int, run_every: float = 2.0) -> dict | None:
+    """
+    Andamento de um job de lib/jobs: status, etapa atual, partes e etapas concluídas (eventos do
+    load_catalog) e botões de cancelar/tentar de novo. Enquanto o job está na fila ou rodando, só este
+    trecho da página é atualizado a cada 'run_every' s; ao terminar, a página inteira é reexecutada.
+    Retorna o job (None se não existe).
+    """
+    import pandas as pd
+
+    from lib import jobs, telemetry
+
+    job = jobs.get(job_id)
+    if job is None:
+        st.warning(f"Job {job_id} não encontrado.")
+        return None
+
+    @st.fragment(run_every=run_every if job["status"] in jobs.ATIVOS else None)
+    def panel() -> None:
+        cur = jobs.get(job_id)
+        if cur["status"] != job["status"] and cur["status"] in jobs.FINAIS:
+            st.rerun()
+        prog = cur["progress"] or {}
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric(f"Job {job_id}", cur["status"])
+        c2.metric("Etapa atual", cur["stage"] or "—")
+        c3.metric("Partes", f"{prog.get('partes', 0)}/{prog['total']}" if prog.get("total") else "—")
+        c4.metric("Tentativa", f"{cur['attempts']}/{cur['max_attempts']}")
+        if cur["error"]:
+            (st.error if cur["status"] == "erro" else st.warning)(cur["error"])
+        if cur["cancel_requested"] and cur["status"] == "rodando":
+            st.caption("Cancelamento pedido: o job para no início da próxima etapa.")
+        if cur["status"] in jobs.ATIVOS and st.button("⏹️ Cancelar", key=f"job_cancel_{job_id}"):
+            jobs.cancel(job_id)
+            st.rerun()
+        if cur["status"] in ("erro", "cancelado") and st.button("🔁 Tentar de novo", key=f"job_retry_{job_id}"):
+            jobs.retry(job_id)
+            st.rerun()
+        if cur["run_id"]:
+            ev = telemetry.events(cur["run_id"])
+            if not ev.empty:
+                st.dataframe(ev.reindex(columns=_EVENT_COLS), use_container_width=True, hide_index=True)
+
+    panel()
+    return job
+
+
+def jobs_table(limit: int = 20) -> None:
+    """Fila de cargas (lib/jobs): jobs mais recentes com status e andamento."""
+    from lib import jobs
+
+    df = jobs.list_jobs(limit)
+    if df.empty:
+        st.caption("Nenhum job na fila.")
+    else:
+        st.dataframe(df, use_container_width=True, hide_index=True)
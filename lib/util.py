@@ -14,4 +14,18 @@ def compose_cnpj(cnpj_basico, ordem, dv) -> str:
 def split_cnae_secundaria(s: str):
     if not s: return []
     # no layout, múltiplas ocorrências separadas por vírgula.  [oai_citation:2‡cnpj-metadados.pdf](file-service://file-4FbedjZ88gZTDVnRZxrVtG)
-    return [x.strip() for x in str(s).split(",") if x.strip()]
\ No newline at end of file
+    return [x.strip() for x in str(s).split(",") if x.strip()]
+
+def cnpj_predicate(cnpj: str, col14: str = "cnpj14", col_basico: str = "cnpj_basico"):
+    """
+    Filtro SQL (trecho, parâmetros) para busca por CNPJ digitado em qualquer formato.
+    Com 8+ dígitos é busca por prefixo, resolvida por faixa sobre as colunas ordenadas/indexadas
+    (cnpj_basico e cnpj14); com menos de 8 dígitos cai para "contém" (varredura).
+    """
+    d = only_digits(cnpj)[:14]
+    if len(d) == 14:
+        return f"{col14} = ?", [d]
+    if len(d) >= 8:
+        return (f"{col_basico} = ? AND {col14} BETWEEN ? AND ?",
+                [d[:8], d.ljust(14, "0"), d.ljust(14, "9")])
+    return f"{col14} LIKE ?", [f"%{d}%"]
@@ -1,7 +1,8 @@
 # pages/0_🪄_Wizard_Mês_Ano.py
 import streamlit as st
-from lib.loaders import prepare_all_for_month, get_catalog
-from lib.ui import inject_global_css
+from lib import jobs, telemetry
+from lib.loaders import get_catalog
+from lib.ui import inject_global_css, job_status, jobs_table
 
 st.set_page_config(page_title="🪄 Wizard — Baixar por Mês/Ano", page_icon="🪄", layout="wide")
 inject_global_css()
@@ -17,13 +18,26 @@ targets = st.multiselect(
     default=["empresas","estabelecimentos","socios","simples"]
 )
 if st.button("▶️ Baixar e preparar", type="primary"):
-    with st.spinner("Baixando e preparando..."):
-        prepared = prepare_all_for_month(int(year), int(month), targets or None)
-    if prepared:
-        st.success(f"Finalizado. Conjuntos preparados: {', '.join(sorted(set([d for d,_ in prepared])))}")
-    else:
-        st.warning("Nenhum pacote foi preparado. Verifique o mês/ano e os conjuntos.")
+    # a carga roda nos workers de lib/jobs, fora desta sessão: a página só enfileira e acompanha
+    st.session_state.wizard_job = jobs.enqueue_month(int(year), int(month), targets or None)
+
+jobs.start_workers()
+if st.session_state.get("wizard_job"):
+    job = job_status(st.session_state.wizard_job)
+    if job and job["status"] == "ok":
+        st.success(f"Finalizado. Conjuntos preparados: {', '.join(job['result']['datasets'])}")
+
+st.subheader("📋 Fila de cargas")
+jobs_table()
+
+st.subheader("⏱️ Etapas da última carga")
+last = telemetry.last_run_id()
+if last:
+    st.caption(f"Carga {last}")
+    st.dataframe(telemetry.stage_totals(telemetry.events(last)), use_container_width=True, hide_index=True)
+else:
+    st.caption("Nenhuma carga registrada.")
 
 st.subheader("📒 Catálogo de cargas")
 cat = get_catalog()
-st.dataframe(cat, use_container_width=True)
\ No newline at end of file
+st.dataframe(cat, use_container_width=True)
@@ -1,25 +1,16 @@
 import streamlit as st
-from lib.loaders import query
+from lib import queries
+from lib.ui import export_controls, paginated_dataframe, start_pagination
 
 st.title("💡 Simples/MEI")
 op_simples = st.selectbox("Opção Simples", ["", "S","N"])
 op_mei = st.selectbox("Opção MEI", ["", "S","N"])
 
-sql = """
-SELECT
-  "CNPJ BÁSICO" as cnpj_basico,
-  "OPÇÃO PELO SIMPLES" as opcao_simples,
-  "DATA DE OPÇÃO PELO SIMPLES" as dt_op_simples,
-  "DATA DE EXCLUSÃO DO SIMPLES" as dt_exc_simples,
-  "OPÇÃO PELO MEI" as opcao_mei,
-  "DATA DE OPÇÃO PELO MEI" as dt_op_mei,
-  "DATA DE EXCLUSÃO DO MEI" as dt_exc_mei
-FROM simples WHERE 1=1
-"""
-params = []
-if op_simples: sql += " AND \"OPÇÃO PELO SIMPLES\" = ?"; params.append(op_simples)
-if op_mei: sql += " AND \"OPÇÃO PELO MEI\" = ?"; params.append(op_mei)
-sql += " LIMIT 1000"
+sql, params, key = queries.simples(op_simples, op_mei)
 
 if st.button("Buscar"):
-    st.dataframe(query(sql, tuple(params)), use_container_width=True)
\ No newline at end of file
+    start_pagination("simples", sql, params, key)
+df = paginated_dataframe("simples")
+if df is not None and not df.empty:
+    # resultado completo (sem paginação) direto do DuckDB para arquivo (lib/export)
+    export_controls("simples", "simples")
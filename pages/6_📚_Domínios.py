@@ -1,8 +1,9 @@
 import streamlit as st
+from lib import queries
 from lib.loaders import query
 
 st.title("📚 Tabelas de Domínio (Países, Municípios, Qualificações, Naturezas, CNAEs)")
-tab = st.selectbox("Domínio", ["paises", "municipios", "qualificacoes", "naturezas", "cnaes"])
-sql = f"SELECT * FROM {tab} LIMIT 5000"
+tab = st.selectbox("Domínio", queries.DOMINIOS)
+sql, params = queries.dominio(tab)
 if st.button("Ver"):
-    st.dataframe(query(sql), use_container_width=True)
\ No newline at end of file
+    st.dataframe(query(sql, tuple(params)), use_container_width=True)
\ No newline at end of file
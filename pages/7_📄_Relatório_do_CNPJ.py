@@ -1,6 +1,11 @@
 # pages/7_📄_Relatório_do_CNPJ.py
+import io
 import re
+import zipfile
+from pathlib import Path
+import pandas as pd
 import streamlit as st
+from lib import export, queries, reports
 from lib.loaders import query, df_to_csv_bytes, df_to_parquet_bytes
 from lib.ui import inject_global_css
 
@@ -18,64 +23,9 @@ if st.button("Gerar Relatório", type="primary", disabled=not digits):
     else:
         cnpj_basico = digits[:8]
 
-        # Empresa
-        emp = query("""
-            SELECT
-              "CNPJ BÁSICO" AS cnpj_basico,
-              "RAZÃO SOCIAL / NOME EMPRESARIAL" AS razao_social,
-              "NATUREZA JURÍDICA" AS natureza,
-              "CAPITAL SOCIAL DA EMPRESA" AS capital_social,
-              "PORTE DA EMPRESA" AS porte,
-              "ENTE FEDERATIVO RESPONSÁVEL" AS efr
-            FROM empresas
-            WHERE "CNPJ BÁSICO" = ?
-        """, (cnpj_basico,))
-
-        # Domínio da natureza
-        nat = query("""SELECT descricao AS natureza_nome FROM naturezas WHERE CAST(codigo AS TEXT)=CAST(? AS TEXT) LIMIT 1""",
-                    (emp.iloc[0]["natureza"],)) if not emp.empty else None
-
-        # Estabelecimentos
-        est = query("""
-            WITH E AS (
-              SELECT "CNPJ BÁSICO" AS cnpj_basico, "CNPJ ORDEM" AS ordem, "CNPJ DV" AS dv,
-                     "NOME FANTASIA" AS nome_fantasia, "UF" AS uf, "MUNICÍPIO" AS municipio,
-                     "PAIS" AS pais_cod, "SITUAÇÃO CADASTRAL" AS situacao, "DATA SITUAÇÃO CADASTRAL" AS data_sit,
-                     "CNAE FISCAL PRINCIPAL" AS cnae_principal, "CNAE FISCAL SECUNDÁRIA" AS cnae_sec
-              FROM estabelecimentos WHERE "CNPJ BÁSICO" = ?
-            ),
-            M AS (SELECT CAST(codigo AS TEXT) AS codigo, descricao AS municipio_nome FROM municipios),
-            P AS (SELECT CAST(codigo AS TEXT) AS codigo, descricao AS pais_nome FROM paises)
-            SELECT
-              CONCAT(LPAD(E.cnpj_basico,8,'0'), LPAD(E.ordem,4,'0'), LPAD(E.dv,2,'0')) AS cnpj14,
-              E.nome_fantasia, E.uf, E.municipio, M.municipio_nome, E.pais_cod, P.pais_nome,
-              E.situacao, E.data_sit, E.cnae_principal, E.cnae_sec
-            FROM E
-            LEFT JOIN M ON M.codigo = CAST(E.municipio AS TEXT)
-            LEFT JOIN P ON P.codigo = CAST(E.pais_cod AS TEXT)
-        """, (cnpj_basico,))
-
-        # Sócios
-        socios = query("""
-            SELECT
-              "IDENTIFICADOR DE SÓCIO" AS ident_socio,
-              "NOME DO SÓCIO (NO CASO PF) OU RAZÃO SOCIAL (NO CASO PJ)" AS nome_razao,
-              "CNPJ/CPF DO SÓCIO" AS doc,
-              "QUALIFICAÇÃO DO SÓCIO" AS qualif,
-              "DATA DE ENTRADA SOCIEDADE" AS data_entrada_soc,
-              "FAIXA ETÁRIA" AS faixa_etaria
-            FROM socios WHERE "CNPJ BÁSICO" = ?
-        """, (cnpj_basico,))
-
-        # Simples
-        simples = query("""
-            SELECT
-              "OPÇÃO PELO SIMPLES" AS opcao_simples, "DATA DE OPÇÃO PELO SIMPLES" AS dt_op_simples,
-              "DATA DE EXCLUSÃO DO SIMPLES" AS dt_exc_simples,
-              "OPÇÃO PELO MEI" AS opcao_mei, "DATA DE OPÇÃO PELO MEI" AS dt_op_mei,
-              "DATA DE EXCLUSÃO DO MEI" AS dt_exc_mei
-            FROM simples WHERE "CNPJ BÁSICO" = ?
-        """, (cnpj_basico,))
+        # consultas do relatório (lib/queries): empresa, estabelecimentos, sócios e Simples
+        sqls = queries.relatorio(cnpj_basico)
+        emp, est, socios, simples = (query(sql, tuple(params)) for sql, params in sqls.values())
 
         # Render
         if emp.empty:
@@ -84,7 +34,7 @@ if st.button("Gerar Relatório", type="primary", disabled=not digits):
             st.subheader("🏢 Empresa")
             c1, c2, c3 = st.columns(3)
             c1.metric("Razão Social", emp.iloc[0]["razao_social"])
-            c2.metric("Natureza Jurídica", (nat.iloc[0]["natureza_nome"] if nat is not None and not nat.empty else emp.iloc[0]["natureza"]))
+            c2.metric("Natureza Jurídica", emp.iloc[0]["natureza_nome"] or emp.iloc[0]["natureza"])
             c3.metric("Porte", emp.iloc[0]["porte"])
             st.caption(f"EFR: {emp.iloc[0]['efr']}")
             st.caption(f"Capital Social: {emp.iloc[0]['capital_social']}")
@@ -109,7 +59,6 @@ if st.button("Gerar Relatório", type="primary", disabled=not digits):
                     "simples.csv": df_to_csv_bytes(simples),
                 }
                 # zip “manual” simples
-                import io, zipfile
                 buff = io.BytesIO()
                 with zipfile.ZipFile(buff, "w", compression=zipfile.ZIP_DEFLATED) as zf:
                     for name, data in payload.items():
@@ -117,7 +66,6 @@ if st.button("Gerar Relatório", type="primary", disabled=not digits):
                 st.download_button("Baixar ZIP (CSVs)", data=buff.getvalue(), file_name=f"relatorio_{cnpj_basico}.zip", mime="application/zip")
             with colY:
                 # parquet único (empresa repetida; prática: separar, mas vamos oferecer uma visão única)
-                import pandas as pd
                 combined = {
                     "empresa": emp.assign(_table="empresa"),
                     "estabelecimentos": est.assign(_table="estabelecimentos"),
@@ -126,4 +74,47 @@ if st.button("Gerar Relatório", type="primary", disabled=not digits):
                 }
                 big = pd.concat(combined.values(), ignore_index=True)
                 st.download_button("Baixar Parquet (consolidado)", data=df_to_parquet_bytes(big),
-                                   file_name=f"relatorio_{cnpj_basico}.parquet", mime="application/octet-stream")
\ No newline at end of file
+                                   file_name=f"relatorio_{cnpj_basico}.parquet", mime="application/octet-stream")
+# ------------------------------------------------------------------------------
+# Relatórios em lote (lista de CNPJs)
+# ------------------------------------------------------------------------------
+st.divider()
+st.subheader("📚 Relatórios em lote")
+st.caption("Uma lista de CNPJs (um por linha, com ou sem máscara; 8 dígitos = CNPJ básico, 14 = estabelecimento). "
+           "Todos os relatórios saem de uma consulta por seção (lista numa tabela temporária + joins).")
+
+up = st.file_uploader("Lista de CNPJs (CSV/TXT; usa a 1ª coluna)", type=["csv", "txt"], key="lote_upload")
+fmt_lote = st.radio("Formato", reports.FORMATOS, horizontal=True, key="lote_fmt",
+                    format_func=lambda f: {"zip": "ZIP (uma pasta de CSVs por CNPJ)",
+                                           "parquet": "Parquet particionado"}[f])
+if st.button("Gerar relatórios", disabled=up is None, key="lote_gerar"):
+    status = st.empty()
+    values = reports.read_list(up.getvalue())
+    with st.spinner(f"Gerando relatórios de {len(values):,} entrada(s)…".replace(",", ".")):
+        res = reports.generate(
+            values, fmt_lote,
+            on_progress=lambda secao, n: status.caption(f"{secao}: {n:,} CNPJ(s) gravados…".replace(",", ".")),
+        )
+    status.empty()
+    # o arquivo do download (ZIP; Parquet particionado vai empacotado) é montado uma vez, aqui
+    res["download"] = reports.pack(res["path"]).as_posix()
+    st.session_state.lote_res = res
+
+res = st.session_state.get("lote_res")
+if res and Path(res["download"]).exists():
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("CNPJs na lista", f"{res['cnpjs']:,}".replace(",", "."))
+    c2.metric("Encontrados", f"{res['encontrados']:,}".replace(",", "."))
+    c3.metric("Não encontrados / inválidos", f"{res['nao_encontrados']:,}".replace(",", "."))
+    c4.metric("CNPJs/s", f"{res['cnpjs_por_s'] or 0:,.0f}".replace(",", "."))
+    download = Path(res["download"])
+    size = download.stat().st_size
+    if size <= export.DOWNLOAD_MAX_BYTES:
+        with open(download, "rb") as f:
+            st.download_button(f"⬇️ Baixar relatórios ({size / 1e6:.1f} MB)", data=f, file_name=download.name,
+                               mime="application/zip", key="lote_baixar")
+    else:
+        st.info(f"Arquivo grande demais para o navegador; disponível no servidor em {download}.")
+    if not res["missing"].empty:
+        st.markdown("**Não encontrados**")
+        st.dataframe(res["missing"], use_container_width=True, hide_index=True)
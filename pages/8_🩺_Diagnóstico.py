@@ -0,0 +1,59 @@
+# pages/8_🩺_Diagnóstico.py
+import numpy as np
+import pandas as pd
+import streamlit as st
+from lib import querylog
+from lib.loaders import cache_stats
+from lib.ui import inject_global_css
+
+st.set_page_config(page_title="🩺 Diagnóstico", page_icon="🩺", layout="wide")
+inject_global_css()
+
+st.title("🩺 Diagnóstico — consultas lentas e cache")
+
+if not querylog.QUERY_LOG_ENABLED:
+    st.info("Log de consultas desligado (CNPJ_QUERY_LOG=0).")
+st.caption(
+    f"Planos (EXPLAIN ANALYZE) capturados acima de {querylog.SLOW_QUERY_MS:,.0f} ms"
+    + ("" if querylog.EXPLAIN_SLOW else " — captura desligada (CNPJ_QUERY_EXPLAIN=0)")
+    + f" · registros em {querylog.LOG_DIR}"
+)
+
+st.subheader("🐢 Fingerprints mais lentos (p95)")
+limit = st.number_input("Quantos", min_value=5, max_value=200, value=20, step=5)
+top = querylog.slowest(int(limit))
+if top.empty:
+    st.warning("Nenhuma consulta registrada ainda.")
+else:
+    st.dataframe(top.drop(columns=["sql"]), use_container_width=True)
+
+    fp = st.selectbox("Fingerprint", top["fingerprint"])
+    log = querylog.load()
+    runs = log[log["fingerprint"] == fp]
+    st.code(top.loc[top["fingerprint"] == fp, "sql"].iloc[0], language="sql")
+    st.caption(f"Formatos de parâmetros: {', '.join(sorted(set(runs['params']))) or '(nenhum)'}")
+
+    # Histograma de latência (faixas logarítmicas em ms)
+    ms = runs["ms"].clip(lower=0.01)
+    edges = np.unique(np.logspace(np.log10(ms.min()), np.log10(ms.max()), 16)) if len(ms) > 1 else np.array([ms.min(), ms.min() * 1.01])
+    counts, edges = np.histogram(ms, bins=edges)
+    hist = pd.DataFrame({"execucoes": counts}, index=[f"{e:,.1f}" for e in edges[:-1]])
+    hist.index.name = "ms (a partir de)"
+    st.bar_chart(hist)
+
+    plans = querylog.plans(fp)
+    if plans:
+        st.markdown(f"**Plano capturado em {pd.to_datetime(plans[0]['ts'], unit='s'):%Y-%m-%d %H:%M:%S}**")
+        st.code(plans[0]["plan"])
+    else:
+        st.caption("Sem plano capturado para este fingerprint (nenhuma execução acima do limite).")
+
+    with st.expander("Últimas execuções"):
+        st.dataframe(runs.sort_values("ts", ascending=False).head(200), use_container_width=True)
+
+if st.button("🧹 Limpar log de consultas"):
+    querylog.clear()
+    st.rerun()
+
+st.subheader("🗄️ Cache de resultados")
+st.dataframe(pd.DataFrame([cache_stats()]), use_container_width=True)
@@ -0,0 +1,55 @@
+# pages/9_🧩_Enriquecimento.py
+from pathlib import Path
+
+import streamlit as st
+from lib import enrich, export
+from lib.ui import inject_global_css
+
+st.set_page_config(page_title="🧩 Enriquecimento", page_icon="🧩", layout="wide")
+inject_global_css()
+
+st.title("🧩 Enriquecimento de arquivo de clientes")
+st.caption(
+    "Envie um CSV ou Parquet com uma coluna de CNPJs (qualquer máscara; 8 dígitos = CNPJ básico, usa a matriz). "
+    "O arquivo volta com as colunas escolhidas da RFB e 'resultado_rfb' (encontrado, nao_encontrado, invalido), "
+    "na mesma ordem, processado em lotes de "
+    + f"{enrich.BATCH_ROWS:,}".replace(",", ".") + " linhas."
+)
+
+up = st.file_uploader("Arquivo de clientes", type=["csv", "txt", "parquet"], key="enr_upload")
+c1, c2 = st.columns([3, 1])
+campos = c1.multiselect("Campos da RFB", list(enrich.CAMPOS), default=enrich.CAMPOS_PADRAO, key="enr_campos")
+fmt = c2.selectbox("Formato de saída", enrich.FORMATOS, key="enr_fmt")
+
+if up is not None:
+    names = enrich.columns(up)
+    coluna = st.selectbox("Coluna dos CNPJs", names, index=names.index(enrich.id_column(names)), key="enr_coluna")
+    if st.button("Enriquecer", type="primary", disabled=not campos, key="enr_gerar"):
+        status = st.empty()
+        try:
+            res = enrich.enrich(
+                up, coluna, campos, fmt,
+                on_progress=lambda n, s: status.caption(f"{n:,} linha(s) em {s:.0f}s…".replace(",", ".")),
+            )
+        except ValueError as e:
+            status.error(str(e))
+        else:
+            status.empty()
+            st.session_state.enr_res = res
+
+res = st.session_state.get("enr_res")
+if res and Path(res["path"]).exists():
+    fmt_n = lambda n: f"{n:,}".replace(",", ".")
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Linhas", fmt_n(res["rows"]))
+    m2.metric("Encontrados", fmt_n(res["encontrados"]))
+    m3.metric("Não encontrados", fmt_n(res["nao_encontrados"]))
+    m4.metric("Inválidos", fmt_n(res["invalidos"]))
+    st.caption(f"{res['bytes'] / 1e6:.1f} MB em {res['seconds']:.1f}s ({fmt_n(round(res['linhas_por_s'] or 0))} linhas/s), "
+               f"coluna '{res['coluna']}'.")
+    if res["bytes"] <= export.DOWNLOAD_MAX_BYTES:
+        with open(res["path"], "rb") as f:
+            st.download_button(f"⬇️ Baixar {res['format']}", data=f, file_name=Path(res["path"]).name,
+                               mime=res["mime"], key="enr_baixar")
+    else:
+        st.info(f"Arquivo grande demais para o navegador; disponível no servidor em {res['path']}.")
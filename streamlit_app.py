@@ -5,17 +5,13 @@
 #   [server]
 #   maxUploadSize = 500
 
-from pathlib import Path
-import io
 import streamlit as st
 
-from lib.loaders import (
-    download_zip,
-    extract_tabular_from_zip,
-    read_csv_semicolon_to_parquet,
-    ensure_table_from_parquet,
-    query,
-)
+from lib import jobs
+from lib.loaders import load_validation_report, query
+from lib.manifest import remote_fingerprint
+from lib.schema import DATASETS
+from lib.ui import job_status
 
 st.set_page_config(
     page_title="CNPJ — Preparação de Dados (RFB Dados Abertos)",
@@ -25,61 +21,23 @@ st.set_page_config(
 
 UPLOAD_LIMIT_MB = 500  # usado apenas para exibição e checagem no app
 
+# As cargas rodam nos workers de lib/jobs (um pool por processo do servidor, fora das sessões)
+jobs.start_workers()
+
 st.title("🗂️ CNPJ — Preparação e Consulta Básica")
 st.caption(
     "Carregue os conjuntos da RFB. O app lida com arquivos internos **sem extensão** e usa Parquet + DuckDB."
 )
 
-# ---------------------------------------------------------------------
-# Catálogo de TIPOS (define a tabela e palavras-chave para achar o arquivo no ZIP)
-# ---------------------------------------------------------------------
-DATASETS = {
-    "empresas": {
-        "table": "empresas",
-        "keywords": ["empresas", "empresa", "empresas1", "empresa1"],
-        "hint": "Cadastro de empresas (CNPJ Básico, razão social, capital, porte, natureza, etc.)",
-    },
-    "estabelecimentos": {
-        "table": "estabelecimentos",
-        "keywords": ["estabelec", "estabelecimentos"],
-        "hint": "Estabelecimentos (CNPJ completo, nome fantasia, CNAE, endereço, UF/município, etc.)",
-    },
-    "socios": {
-        "table": "socios",
-        "keywords": ["socios", "sócios", "socio", "socio1"],
-        "hint": "Sócios (identificador PF/PJ/estrangeiro, qualificação, datas, etc.)",
-    },
-    "simples": {
-        "table": "simples",
-        "keywords": ["simples", "mei"],
-        "hint": "Opção pelo Simples/MEI (datas de opção/exclusão).",
-    },
-    "paises": {
-        "table": "paises",
-        "keywords": ["paises", "países", "pais"],
-        "hint": "Tabela de domínio — Países.",
-    },
-    "municipios": {
-        "table": "municipios",
-        "keywords": ["municipio", "municípios", "municipios"],
-        "hint": "Tabela de domínio — Municípios.",
-    },
-    "qualificacoes": {
-        "table": "qualificacoes",
-        "keywords": ["qualificacao", "qualificações", "qualificacoes"],
-        "hint": "Tabela de domínio — Qualificações.",
-    },
-    "naturezas": {
-        "table": "naturezas",
-        "keywords": ["natureza", "naturezas"],
-        "hint": "Tabela de domínio — Naturezas Jurídicas.",
-    },
-    "cnaes": {
-        "table": "cnaes",
-        "keywords": ["cnae", "cnaes"],
-        "hint": "Tabela de domínio — CNAEs.",
-    },
-}
+def show_validation_report(parquet) -> None:
+    """Mostra as colunas com valores que não converteram para o tipo (modo tipado)."""
+    rep = load_validation_report(parquet)
+    if not rep or not rep.get("invalid_rows_max"):
+        return
+    bad = {c: v for c, v in rep["columns"].items() if v["invalid"]}
+    st.warning(f"{len(bad)} coluna(s) com valores que não converteram para o tipo e ficaram nulos.")
+    st.dataframe(bad, use_container_width=True)
+
 
 # ---------------------------------------------------------------------
 # Estado e UI — seleção do TIPO e FONTE (com BOTÕES)
@@ -133,25 +91,15 @@ with st.expander("⚙️ Preparar/Carregar dados", expanded=True):
         with st.popover("🔎 Ver arquivos dentro do ZIP (debug)"):
             if url:
                 try:
-                    import requests, zipfile
-                    r = requests.get(url, timeout=60)
-                    r.raise_for_status()
-                    bio = io.BytesIO(r.content)
-                    with zipfile.ZipFile(bio, "r") as z:
-                        st.write([m.filename for m in z.infolist()])
+                    # lê só o diretório central do ZIP remoto (Range), sem baixar o arquivo
+                    fp = remote_fingerprint(url)
+                    st.write(fp.get("crc32") or "O servidor não aceita Range; baixe o ZIP para listar.")
                 except Exception as e:
                     st.warning(f"Não foi possível listar: {e}")
 
+        force = st.checkbox("Forçar recarga (ignorar manifesto)", help="Baixa e recarrega mesmo se o ZIP não mudou.")
         if st.button("Baixar e preparar", type="primary", use_container_width=True, disabled=not url):
-            try:
-                zip_path = Path("data") / f"{table_name}.zip"
-                download_zip(url, zip_path)
-                fobj = extract_tabular_from_zip(zip_path, prefer_keywords=keywords)
-                parquet = read_csv_semicolon_to_parquet(fobj, table_name)
-                ensure_table_from_parquet(table_name, parquet, replace=True)
-                st.success(f"Tabela **{table_name}** preparada a partir de: `{parquet}`")
-            except Exception as e:
-                st.error(f"Falha ao preparar: {e}")
+            st.session_state.prep_job = jobs.enqueue_zip_url(url, table_name, prefer_keywords=keywords, force=force)
 
     elif fonte == "Upload ZIP":
         st.caption(f"Aceita até **{UPLOAD_LIMIT_MB} MB** (ajustado no config.toml).")
@@ -162,18 +110,8 @@ with st.expander("⚙️ Preparar/Carregar dados", expanded=True):
                 st.error(f"O arquivo tem {size_mb:.1f} MB e excede o limite de {UPLOAD_LIMIT_MB} MB.")
             else:
                 if st.button("Preparar do ZIP", type="primary", use_container_width=True):
-                    try:
-                        tmp_zip = Path("data") / f"tmp_upload_{table_name}.zip"
-                        tmp_zip.write_bytes(up_zip.read())
-                        try:
-                            fobj = extract_tabular_from_zip(tmp_zip, prefer_keywords=keywords)
-                            parquet = read_csv_semicolon_to_parquet(fobj, table_name)
-                            ensure_table_from_parquet(table_name, parquet, replace=True)
-                            st.success(f"Tabela **{table_name}** preparada (upload ZIP): `{parquet}`")
-                        finally:
-                            tmp_zip.unlink(missing_ok=True)
-                    except Exception as e:
-                        st.error(f"Falha ao preparar: {e}")
+                    # o UploadedFile é copiado para disco em blocos (sem .read() do arquivo inteiro)
+                    st.session_state.prep_job = jobs.enqueue_upload(up_zip, table_name, "zip", prefer_keywords=keywords)
         else:
             st.info("Envie um arquivo ZIP para prosseguir.")
 
@@ -186,12 +124,7 @@ with st.expander("⚙️ Preparar/Carregar dados", expanded=True):
                 st.error(f"O arquivo tem {size_mb:.1f} MB e excede o limite de {UPLOAD_LIMIT_MB} MB.")
             else:
                 if st.button("Preparar do CSV", type="primary", use_container_width=True):
-                    try:
-                        parquet = read_csv_semicolon_to_parquet(io.BytesIO(up_csv.read()), table_name)
-                        ensure_table_from_parquet(table_name, parquet, replace=True)
-                        st.success(f"Tabela **{table_name}** preparada (upload CSV): `{parquet}`")
-                    except Exception as e:
-                        st.error(f"Falha ao preparar: {e}")
+                    st.session_state.prep_job = jobs.enqueue_upload(up_csv, table_name, "csv")
         else:
             st.info("Envie um arquivo CSV para prosseguir.")
 
@@ -201,6 +134,14 @@ with st.expander("⚙️ Preparar/Carregar dados", expanded=True):
             "As consultas usarão essas tabelas no DuckDB."
         )
 
+    # andamento da última carga enfileirada nesta sessão (a carga segue mesmo se a aba fechar)
+    if st.session_state.get("prep_job"):
+        job = job_status(st.session_state.prep_job)
+        if job and job["status"] == "ok":
+            parquet = job["result"]["parquet"]
+            st.success(f"Tabela **{job['params']['name']}** preparada a partir de: `{parquet}`")
+            show_validation_report(parquet)
+
 # ---------------------------------------------------------------------
 # Pré-visualização (LIMIT 50)
 # ---------------------------------------------------------------------
@@ -226,6 +167,6 @@ if st.button("Exibir amostra da tabela", use_container_width=True):
 # ---------------------------------------------------------------------
 st.divider()
 st.caption(
-    f"Observações: leitura em chunks com separador `;`, tolerante a arquivo interno sem extensão; "
+    f"Observações: extração do ZIP em streaming para disco e leitura paralela com separador `;`, tolerante a arquivo interno sem extensão; "
     f"conversão para Parquet e carga no DuckDB. Limite de upload configurado para {UPLOAD_LIMIT_MB} MB."
 )
\ No newline at end of file
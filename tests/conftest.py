@@ -0,0 +1,152 @@
+# tests/conftest.py
+# Fixtures comuns: servidor HTTP descartável com Range/ETag (no lugar da RFB), diretório de trabalho isolado
+# (data/ e o banco ficam em tmp_path) e um mês sintético pequeno já carregado (copiado para cada teste).
+
+from __future__ import annotations
+
+import http.server
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from bench import synth
+from lib import db, loaders
+
+# Escala do mês de month_template (~1.200 empresas)
+SCALE = 0.00002
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve os arquivos de server.root com Accept-Ranges, ETag (o conteúdo muda -> muda a ETag) e If-Range.
+    server.requests guarda (método, caminho, Range) de cada pedido. Falhas simuladas:
+      - server.drop_after: corta a conexão depois desse número de bytes de corpo e o servidor fica fora do ar
+        (503) até server.down voltar a False (queda no meio do download);
+      - server.max_body: respostas 206 bem formadas, mas com no máximo esse número de bytes da faixa pedida.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _file(self):
+        path = self.server.root / self.path.lstrip("/")
+        if not path.is_file():
+            self.send_error(404)
+            return None
+        st = path.stat()
+        return path, st.st_size, f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+    def do_HEAD(self) -> None:
+        self.server.requests.append(("HEAD", self.path, None))
+        info = self._file()
+        if info is None:
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(info[1]))
+        self.send_header("ETag", info[2])
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        rng = self.headers.get("Range")
+        self.server.requests.append(("GET", self.path, rng))
+        if self.server.down:
+            self.send_error(503)
+            return
+        info = self._file()
+        if info is None:
+            return
+        path, size, etag = info
+        start, end, code = 0, size - 1, 200
+        if_range = self.headers.get("If-Range")
+        if rng and (if_range is None or if_range == etag):
+            m = re.match(r"bytes=(\d+)-(\d*)", rng)
+            start, end, code = int(m.group(1)), int(m.group(2) or size - 1), 206
+            if self.server.max_body is not None:
+                end = min(end, start + self.server.max_body - 1)
+        self.send_response(code)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", etag)
+        if code == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        if self.server.drop_after is not None:
+            self.wfile.write(body[: self.server.drop_after])
+            self.close_connection = True
+            self.server.down = True
+            return
+        self.wfile.write(body)
+
+
+@contextmanager
+def _serve(root: Path) -> Iterator[http.server.ThreadingHTTPServer]:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.root, server.requests = root, []
+    server.drop_after, server.down, server.max_body = None, False, None
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def rfb_server(tmp_path):
+    """Servidor em 127.0.0.1 (porta livre) sobre tmp_path/'srv'; .url é a base para download_zip/base_url."""
+    root = tmp_path / "srv"
+    root.mkdir()
+    with _serve(root) as server:
+        yield server
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Roda o teste em tmp_path/'app' (data/ relativo ao diretório atual) com o banco em data/cnpj.duckdb."""
+    app = tmp_path / "app"
+    (app / "data").mkdir(parents=True)
+    monkeypatch.chdir(app)
+    previous = db.DB_PATH
+    db.configure(path=app / "data" / "cnpj.duckdb")
+    yield app
+    db.configure(path=previous)
+
+
+@pytest.fixture(scope="session")
+def month_template(tmp_path_factory) -> Path:
+    """data/ de um mês sintético (bench/synth.py, SCALE) carregado uma vez por prepare_all_for_month."""
+    base = tmp_path_factory.mktemp("mes")
+    synth.generate(base / "srv", scale=SCALE, year_month="2025-06")
+    app = base / "app"
+    (app / "data").mkdir(parents=True)
+    cwd, previous = Path.cwd(), db.DB_PATH
+    os.chdir(app)
+    db.configure(path=app / "data" / "cnpj.duckdb")
+    try:
+        with _serve(base / "srv") as server:
+            loaders.prepare_all_for_month(2025, 6, base_url=server.url, convert_workers=2, threads=1)
+    finally:
+        db.configure(path=previous)
+        os.chdir(cwd)
+    return app / "data"
+
+
+@pytest.fixture
+def loaded(month_template, workdir) -> Path:
+    """workdir com uma cópia do mês de month_template (o teste pode alterá-la à vontade)."""
+    shutil.copytree(month_template, workdir / "data", dirs_exist_ok=True)
+    return workdir
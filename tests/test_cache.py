@@ -0,0 +1,50 @@
+# tests/test_cache.py
+# lib/cache: a versão dos dados trocada por outro processo invalida o cache deste.
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+
+from lib import cache
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _bump_elsewhere(cwd: Path, n: int = 1, procs: int = 1) -> list:
+    """Versões gravadas por 'procs' processos, cada um chamando bump() 'n' vezes, ao mesmo tempo."""
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    code = f"from lib import cache\nfor _ in range({n}): print(cache.bump())\n"
+    running = [
+        subprocess.Popen([sys.executable, "-c", code], cwd=cwd, env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(procs)
+    ]
+    out = [p.communicate(timeout=60)[0].split() for p in running]
+    assert all(p.returncode == 0 for p in running)
+    return [v for versions in out for v in versions]
+
+
+def test_bump_in_other_process_invalidates(workdir):
+    calls = []
+
+    def run():
+        calls.append(1)
+        return pa.table({"n": [len(calls)]})
+
+    assert cache.fetch("SELECT 1", None, run).column("n")[0].as_py() == 1
+    assert cache.fetch("SELECT  1", None, run).column("n")[0].as_py() == 1  # mesma chave
+    before = cache.version()
+
+    _bump_elsewhere(workdir)
+    assert cache.version() != before
+    assert cache.fetch("SELECT 1", None, run).column("n")[0].as_py() == 2
+
+
+def test_concurrent_bumps_never_repeat_a_version(workdir):
+    versions = _bump_elsewhere(workdir, n=50, procs=2)
+    assert len(versions) == 100
+    assert len(set(versions)) == 100
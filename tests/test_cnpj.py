@@ -0,0 +1,41 @@
+# tests/test_cnpj.py
+# Chave cnpj14 e lib/util.cnpj_predicate sobre o mês de tests/conftest.py: a busca por faixa devolve o
+# mesmo que a comparação direta com o CNPJ completo.
+
+from __future__ import annotations
+
+import pytest
+
+from lib import db
+from lib.util import cnpj_predicate, mask_cnpj
+
+
+@pytest.fixture
+def cnpj14(loaded) -> str:
+    with db.reader() as con:
+        return con.execute(
+            "SELECT cnpj14 FROM estabelecimentos WHERE id_matriz_filial = 2 ORDER BY cnpj14 DESC LIMIT 1"
+        ).fetchone()[0]
+
+
+def _matches(where: str, params: list) -> set:
+    with db.reader() as con:
+        return {r[0] for r in con.execute(f"SELECT cnpj14 FROM estabelecimentos WHERE {where}", params).fetchall()}
+
+
+def test_cnpj14_key(loaded):
+    with db.reader() as con:
+        bad = con.execute("""
+            SELECT COUNT(*) FROM estabelecimentos
+            WHERE cnpj14 <> LPAD(CAST(cnpj_basico AS VARCHAR), 8, '0') || cnpj_ordem || cnpj_dv
+        """).fetchone()[0]
+    assert bad == 0
+
+
+@pytest.mark.parametrize("digits", [14, 12, 10, 8, 6])
+def test_cnpj_predicate(cnpj14, digits):
+    masked = mask_cnpj(cnpj14)
+    typed = masked[: [i for i, c in enumerate(masked) if c.isdigit()][digits - 1] + 1]  # como o usuário digita
+    expected = _matches("cnpj14 LIKE ?", [f"{cnpj14[:digits]}%" if digits >= 8 else f"%{cnpj14[:digits]}%"])
+    assert cnpj14 in expected
+    assert _matches(*cnpj_predicate(typed)) == expected
@@ -0,0 +1,47 @@
+# tests/test_db.py
+# lib/db: o banco fica fechado (sem WAL) depois que a linha de comando sai, e uma leitura reaplica o WAL
+# deixado por um processo interrompido.
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from bench import synth
+from lib import db
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _python(*args: str, cwd: Path) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True, timeout=600)
+
+
+def test_cli_closes_database(rfb_server, workdir):
+    synth.generate(rfb_server.root, scale=0.00002, datasets=["empresas", "naturezas"], year_month="2025-06")
+    r = _python("-m", "lib", "month", "2025-06", "--targets", "empresas", "naturezas",
+                "--base-url", rfb_server.url, "--workers", "2", "--threads", "1", cwd=workdir)
+    assert r.returncode == 0, r.stderr
+    assert not Path(db.DB_PATH + ".wal").exists()
+    with db.reader() as con:
+        assert con.execute("SELECT COUNT(*) FROM empresas").fetchone()[0] > 0
+
+
+def test_reader_replays_leftover_wal(workdir):
+    # índice no WAL: a abertura somente leitura não consegue reaplicá-lo sozinha
+    r = _python("-c", (
+        "import duckdb, os, sys\n"
+        "con = duckdb.connect(sys.argv[1])\n"
+        "con.execute(\"SET checkpoint_threshold = '1GB'\")\n"
+        "con.execute('CREATE TABLE t AS SELECT range AS a FROM range(100000)')\n"
+        "con.execute('CREATE INDEX t_a_idx ON t (a)')\n"
+        "os._exit(0)\n"
+    ), db.DB_PATH, cwd=workdir)
+    assert r.returncode == 0, r.stderr
+    assert Path(db.DB_PATH + ".wal").exists()
+    with db.reader() as con:
+        assert con.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 100_000
+    assert not Path(db.DB_PATH + ".wal").exists()
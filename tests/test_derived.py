@@ -0,0 +1,81 @@
+# tests/test_derived.py
+# Derivadas (lib/derived) sobre o mês de tests/conftest.py: estabelecimento_cnae e estabelecimentos_enriched
+# batem com as origens, inclusive depois da atualização só das chaves alteradas (refresh_for).
+
+from __future__ import annotations
+
+from lib import db, derived, loaders
+
+
+def _bridge(con, where: str = "TRUE") -> set:
+    return set(con.execute(f"SELECT cnpj14, cnae, principal FROM estabelecimento_cnae WHERE {where}").fetchall())
+
+
+def _expected_bridge(con, where: str = "TRUE") -> set:
+    rows = con.execute(
+        f"SELECT cnpj14, cnae_principal, cnae_secundaria FROM estabelecimentos WHERE {where}"
+    ).fetchall()
+    expected = set()
+    for cnpj14, principal, secundarias in rows:
+        if principal is not None:
+            expected.add((cnpj14, principal, True))
+        expected |= {(cnpj14, int(c), False) for c in (secundarias or "").split(",") if c.strip()}
+    return expected
+
+
+def test_estabelecimento_cnae(loaded):
+    with db.reader() as con:
+        assert _bridge(con) == _expected_bridge(con)
+        cnaes = [r[0] for r in con.execute("SELECT cnae FROM estabelecimento_cnae").fetchall()]
+    assert cnaes == sorted(cnaes)  # gravada ordenada por CNAE
+
+
+def test_estabelecimentos_enriched(loaded):
+    with db.reader() as con:
+        n = con.execute("SELECT COUNT(*) FROM estabelecimentos").fetchone()[0]
+        assert con.execute("SELECT COUNT(*) FROM estabelecimentos_enriched").fetchone()[0] == n
+        wrong = con.execute("""
+            SELECT COUNT(*) FROM estabelecimentos_enriched x
+            JOIN empresas emp USING (cnpj_basico)
+            LEFT JOIN municipios mun ON mun.codigo = x.municipio
+            WHERE x.razao_social IS DISTINCT FROM emp.razao_social
+               OR x.municipio_nome IS DISTINCT FROM mun.descricao
+        """).fetchone()[0]
+        assert wrong == 0
+        indexes = con.execute(
+            "SELECT expressions FROM duckdb_indexes() WHERE table_name = 'estabelecimentos_enriched'"
+        ).fetchall()
+    assert indexes == [("[cnpj14]",)]
+
+
+def test_refresh_only_changed_keys(loaded):
+    with db.reader() as con:
+        cnpj14, basico = con.execute(
+            "SELECT cnpj14, cnpj_basico FROM estabelecimentos ORDER BY cnpj14 LIMIT 1"
+        ).fetchone()
+    with db.writer() as con:
+        con.execute("UPDATE estabelecimentos SET cnae_secundaria = '4711302,,5611201' WHERE cnpj14 = ?", (cnpj14,))
+        con.execute("UPDATE empresas SET razao_social = 'NOVA RAZAO' WHERE cnpj_basico = ?", (basico,))
+    derived.refresh_for("estabelecimentos", f"(SELECT '{cnpj14}')")
+    built = derived.refresh_for("empresas", f"(SELECT {basico})")
+    assert built == []  # as duas derivadas têm atualização incremental
+
+    with db.reader() as con:
+        secundarias = {c for _, c, principal in _bridge(con, f"cnpj14 = '{cnpj14}'") if not principal}
+        assert secundarias == {4711302, 5611201}
+        assert _bridge(con) == _expected_bridge(con)
+        assert {r[0] for r in con.execute(
+            "SELECT razao_social FROM estabelecimentos_enriched WHERE cnpj_basico = ?", (basico,)
+        ).fetchall()} == {"NOVA RAZAO"}
+
+
+def test_rebuild_waits_for_all_sources(workdir):
+    # cnpj_basico;ordem;dv;matriz;fantasia;situacao;data;motivo;cidade_ext;pais;inicio;cnae;secundarias;...
+    linha = ['"00000001"', '"0001"', '"91"', '"1"', '""', '"02"', '"20200101"', '"00"', '""', '""', '"20200101"',
+             '"4711302"', '"5611201"'] + ['""'] * 17
+    loaders.prepare_from_uploaded_csv_bytes((";".join(linha) + "\n").encode("latin1"), "estabelecimentos")
+    with db.reader() as con:
+        tables = {r[0] for r in con.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+        assert "estabelecimento_cnae" in tables
+        assert "estabelecimentos_enriched" not in tables  # faltam empresas e domínios
+        assert _bridge(con) == {("00000001000191", 4711302, True), ("00000001000191", 5611201, False)}
@@ -0,0 +1,112 @@
+# tests/test_download.py
+# lib/download.download_zip contra o servidor de tests/conftest.py: retomada, segmentos e troca de ETag.
+
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+
+from lib import download
+
+
+def _publish(server, name: str, size: int) -> bytes:
+    data = os.urandom(size)
+    (server.root / name).write_bytes(data)
+    return data
+
+
+def _interrupted(server, url: str, out, drop_after: int) -> None:
+    """Download que cai depois de 'drop_after' bytes (e o servidor fora do ar): deixa .part e .state.json."""
+    server.drop_after = drop_after
+    with pytest.raises(download.DownloadError):
+        download.download_zip(url, out, progress=False, retries=0)
+    server.drop_after, server.down = None, False
+    server.requests.clear()
+
+
+def _state(out) -> dict:
+    return json.loads(out.with_name(out.name + ".state.json").read_text(encoding="utf-8"))
+
+
+def test_resume_from_partial(rfb_server, workdir, monkeypatch):
+    monkeypatch.setattr(download, "DOWNLOAD_CHUNK", 16 * 1024)
+    data = _publish(rfb_server, "Empresas0.zip", 300_000)
+    url, out = f"{rfb_server.url}/Empresas0.zip", workdir / "zips" / "Empresas0.zip"
+
+    _interrupted(rfb_server, url, out, drop_after=100_000)
+    assert out.with_name("Empresas0.zip.part").exists()
+    [[start, end, done]] = _state(out)["segments"]
+    assert (start, end) == (0, 300_000) and 0 < done <= 100_000
+
+    download.download_zip(url, out, progress=False)
+    assert out.read_bytes() == data
+    assert not out.with_name("Empresas0.zip.part").exists()
+    assert _state(out)["complete"] is True
+    # só o que faltava foi pedido
+    assert [r for m, _, r in rfb_server.requests if m == "GET"] == [f"bytes={done}-299999"]
+
+    # arquivo remoto inalterado: nova chamada não baixa nada
+    rfb_server.requests.clear()
+    download.download_zip(url, out, progress=False)
+    assert [m for m, _, _ in rfb_server.requests] == ["HEAD"]
+
+
+def test_segments_are_stitched(rfb_server, workdir, monkeypatch):
+    monkeypatch.setattr(download, "MIN_SEGMENT_BYTES", 64 * 1024)
+    data = _publish(rfb_server, "Socios0.zip", 1_000_003)
+    out = workdir / "zips" / "Socios0.zip"
+
+    download.download_zip(f"{rfb_server.url}/Socios0.zip", out, progress=False, segments=4)
+    assert out.read_bytes() == data
+    segments = _state(out)["segments"]
+    assert len(segments) == 4
+    assert segments[0][0] == 0 and segments[-1][1] == len(data)
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+    assert sorted(r for m, _, r in rfb_server.requests if m == "GET") == sorted(
+        f"bytes={start}-{end - 1}" for start, end, _ in segments
+    )
+
+
+def test_etag_change_discards_partial(rfb_server, workdir, monkeypatch):
+    monkeypatch.setattr(download, "DOWNLOAD_CHUNK", 16 * 1024)
+    _publish(rfb_server, "Simples.zip", 200_000)
+    url, out = f"{rfb_server.url}/Simples.zip", workdir / "zips" / "Simples.zip"
+    _interrupted(rfb_server, url, out, drop_after=50_000)
+    old = _state(out)
+    assert old["segments"][0][2] > 0
+
+    data = _publish(rfb_server, "Simples.zip", 200_000)  # mesmo tamanho, conteúdo (e ETag) novo
+    download.download_zip(url, out, progress=False)
+    assert out.read_bytes() == data
+    assert _state(out)["etag"] != old["etag"]
+    # o parcial foi descartado: recomeça do byte 0
+    assert [r for m, _, r in rfb_server.requests if m == "GET"] == ["bytes=0-199999"]
+
+
+def test_short_responses_resume_until_done(rfb_server, workdir):
+    data = _publish(rfb_server, "Paises.zip", 10_000)
+    rfb_server.max_body = 1_000  # cada 206 traz só 1.000 bytes da faixa pedida
+    out = workdir / "zips" / "Paises.zip"
+    download.download_zip(f"{rfb_server.url}/Paises.zip", out, progress=False, retries=0)
+    assert out.read_bytes() == data
+    assert len([m for m, _, _ in rfb_server.requests if m == "GET"]) == 10
+
+
+def test_short_responses_are_capped(rfb_server, workdir, monkeypatch):
+    monkeypatch.setattr(download.time, "sleep", lambda s: None)
+    monkeypatch.setattr(download, "SEGMENT_MAX_RESUMES", 5)
+    _publish(rfb_server, "Cnaes.zip", 10_000)
+    url, out = f"{rfb_server.url}/Cnaes.zip", workdir / "zips" / "Cnaes.zip"
+
+    rfb_server.max_body = 0  # 206 sem corpo: nenhum progresso
+    with pytest.raises(download.DownloadError, match="resposta incompleta"):
+        download.download_zip(url, out, progress=False, retries=3)
+    assert len([m for m, _, _ in rfb_server.requests if m == "GET"]) == 4
+
+    rfb_server.max_body = 100  # progride, mas precisaria de 100 retomadas
+    rfb_server.requests.clear()
+    with pytest.raises(download.DownloadError):
+        download.download_zip(url, out, progress=False, retries=3)
+    assert len([m for m, _, _ in rfb_server.requests if m == "GET"]) == 6
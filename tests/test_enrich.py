@@ -0,0 +1,62 @@
+# tests/test_enrich.py
+# lib/enrich.enrich sobre o mês de tests/conftest.py: resultado_rfb linha a linha, na ordem da entrada.
+
+from __future__ import annotations
+
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import pytest
+
+from lib import db, enrich
+
+
+@pytest.fixture
+def clientes(loaded):
+    with db.reader() as con:
+        cnpj14, razao = con.execute(
+            "SELECT cnpj14, razao_social FROM estabelecimentos_enriched ORDER BY cnpj14 LIMIT 1"
+        ).fetchone()
+        basico, matriz = con.execute(
+            "SELECT LPAD(CAST(cnpj_basico AS VARCHAR), 8, '0'), razao_social FROM estabelecimentos_enriched "
+            "WHERE id_matriz_filial = 1 ORDER BY cnpj14 DESC LIMIT 1"
+        ).fetchone()
+    rows = [
+        ("1", f"{cnpj14[:2]}.{cnpj14[2:5]}.{cnpj14[5:8]}/{cnpj14[8:12]}-{cnpj14[12:]}", "encontrado", razao),
+        ("2", "99999999", "nao_encontrado", None),
+        ("3", basico, "encontrado", matriz),  # CNPJ básico: dados da matriz
+        ("4", "abc", "invalido", None),
+        ("5", "", "invalido", None),
+        ("6", cnpj14[:8] + "999999", "nao_encontrado", None),
+        ("7", "1234567", "invalido", None),
+    ]
+    path = loaded / "clientes.csv"
+    path.write_text("cliente;cnpj\n" + "".join(f"{c};{v}\n" for c, v, _, _ in rows), encoding="utf-8")
+    return path, rows
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_enrich_rows(clientes, tmp_path, fmt):
+    path, rows = clientes
+    out = tmp_path / f"saida.{fmt}"
+    res = enrich.enrich(path, campos=["razao_social", "uf"], fmt=fmt, out=out, batch_rows=3)
+    assert res["coluna"] == "cnpj"
+    assert (res["rows"], res["encontrados"], res["nao_encontrados"], res["invalidos"]) == (7, 2, 2, 3)
+
+    table = (pacsv.read_csv(out, parse_options=pacsv.ParseOptions(delimiter=";"),
+                            convert_options=pacsv.ConvertOptions(column_types={"cliente": "string"},
+                                                                 strings_can_be_null=True))
+             if fmt == "csv" else pq.read_table(out))
+    assert table.column_names == ["cliente", "cnpj", "resultado_rfb", "razao_social", "uf"]
+    # ordem da entrada preservada entre os lotes
+    assert table.column("cliente").to_pylist() == [c for c, _, _, _ in rows]
+    assert table.column("resultado_rfb").to_pylist() == [r for _, _, r, _ in rows]
+    assert table.column("razao_social").to_pylist() == [z for _, _, _, z in rows]
+    assert not out.with_name(out.name + ".part").exists()
+
+
+def test_enrich_rejects_unknown_fields(clientes, tmp_path):
+    path, _ = clientes
+    with pytest.raises(ValueError, match="Campos desconhecidos"):
+        enrich.enrich(path, campos=["razao_social", "telefone"], out=tmp_path / "saida.csv")
+    with pytest.raises(ValueError, match="não existe"):
+        enrich.enrich(path, column="documento", out=tmp_path / "saida.csv")
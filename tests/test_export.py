@@ -0,0 +1,67 @@
+# tests/test_export.py
+# lib/export.export: o resultado completo gravado por COPY em cada formato, sem .part deixado para trás,
+# e o limite de exportações simultâneas.
+
+from __future__ import annotations
+
+import gzip
+import threading
+from pathlib import Path
+
+import duckdb
+import pyarrow.parquet as pq
+import pytest
+
+from lib import export, loaders
+
+N = 1_000
+SQL = "SELECT cnpj_basico, razao_social FROM empresas WHERE cnpj_basico > ? ORDER BY cnpj_basico"
+
+
+@pytest.fixture
+def empresas(workdir, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_DIR", workdir / "data" / "exports")
+    csv = "".join(f'"{b:08d}";"EMPRESA {b}";"2062";"49";"0,00";"01";""\n' for b in range(1, N + 1))
+    loaders.prepare_from_uploaded_csv_bytes(csv.encode("latin1"), "empresas")
+    return workdir
+
+
+@pytest.mark.parametrize("fmt", ["csv", "csv.gz", "parquet"])
+def test_export_formats(empresas, fmt):
+    progress = []
+    res = export.export(SQL, [10], fmt=fmt, name="empresas", on_progress=lambda b, s: progress.append(b),
+                        poll_s=0.01)
+    assert res["rows"] == N - 10
+    assert res["path"].endswith("." + export.FORMATOS[fmt]["ext"]) and res["bytes"] > 0
+    if fmt == "parquet":
+        table = pq.read_table(res["path"])
+        assert table.num_rows == N - 10
+        assert table.column("cnpj_basico")[0].as_py() == 11
+    else:
+        data = Path(res["path"]).read_bytes()
+        lines = (gzip.decompress(data) if fmt == "csv.gz" else data).decode("utf-8").splitlines()
+        assert lines[0] == "cnpj_basico;razao_social"
+        assert lines[1] == "11;EMPRESA 11" and len(lines) == N - 10 + 1
+    assert progress  # ao menos uma chamada, ao fim do COPY
+    assert not list(export.EXPORT_DIR.glob("*.part"))
+
+
+def test_failed_export_leaves_nothing(empresas):
+    with pytest.raises(duckdb.Error):
+        export.export("SELECT nao_existe FROM empresas", fmt="csv")
+    assert not list(export.EXPORT_DIR.iterdir())
+
+
+def test_busy(empresas, monkeypatch):
+    monkeypatch.setattr(export, "_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(export, "EXPORT_WAIT_S", 0.1)
+    export._slots.acquire()  # uma exportação em andamento ocupa a única vaga
+    try:
+        with pytest.raises(export.ExportBusyError):
+            export.export(SQL, [0])
+    finally:
+        export._slots.release()
+    # a vaga é devolvida ao fim, mesmo quando a exportação falha
+    with pytest.raises(duckdb.Error):
+        export.export("SELECT nao_existe FROM empresas")
+    assert export.export(SQL, [0])["rows"] == N
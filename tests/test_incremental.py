@@ -0,0 +1,112 @@
+# tests/test_incremental.py
+# Carga incremental (lib/loaders.upsert_table_from_parquet via prepare_all_for_month(incremental=True)):
+# o diff de um mês sobre o mês de tests/conftest.py, o change_log e as derivadas/índice nas chaves alteradas.
+
+from __future__ import annotations
+
+import zipfile
+
+import pytest
+
+from bench import synth
+from lib import db, loaders, search
+
+SCALE = 0.00002  # a de month_template (tests/conftest.py)
+NOVA = "EMPRESA INCLUIDA NO MES"
+ALTERADA = "RAZAO SOCIAL ALTERADA"
+
+
+def _edit_zip(path, edit) -> None:
+    with zipfile.ZipFile(path) as z:
+        [member] = z.namelist()
+        lines = z.read(member).decode("latin1").splitlines()
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr(member, ("\n".join(edit(lines)) + "\n").encode("latin1"))
+
+
+def _fields(line: str) -> list:
+    return [v.strip('"') for v in line.split(";")]
+
+
+def _line(fields: list) -> str:
+    return ";".join(f'"{v}"' for v in fields)
+
+
+@pytest.fixture
+def julho(loaded, rfb_server):
+    """Empresas de 2025-07 = 2025-06 com uma exclusão, uma alteração e uma inclusão (em Empresas0)."""
+    synth.generate(rfb_server.root, scale=SCALE, datasets=["empresas"], year_month="2025-07")
+    diff = {}
+
+    def edit(lines):
+        removed, changed, model = (_fields(l) for l in lines[:3])
+        diff.update(delete=int(removed[0]), update=int(changed[0]), insert=99999990)
+        changed[1] = ALTERADA
+        model[0], model[1] = "99999990", NOVA
+        return [_line(changed)] + lines[2:] + [_line(model)]
+
+    _edit_zip(rfb_server.root / "2025-07" / "Empresas0.zip", edit)
+    return rfb_server, diff
+
+
+def _log(month: str) -> dict:
+    with db.reader() as con:
+        return {
+            (op, int(key)): cols for key, op, cols in con.execute(
+                "SELECT key, op, changed_columns FROM change_log WHERE month = ? AND tabela = 'empresas'", (month,)
+            ).fetchall()
+        }
+
+
+def test_incremental_month(julho):
+    server, diff = julho
+    with db.reader() as con:
+        before = con.execute("SELECT COUNT(*) FROM empresas").fetchone()[0]
+
+    loaders.prepare_all_for_month(2025, 7, targets=["empresas"], base_url=server.url, incremental=True,
+                                  convert_workers=2, threads=1)
+    assert _log("2025-07") == {
+        ("delete", diff["delete"]): None,
+        ("update", diff["update"]): ["razao_social"],
+        ("insert", diff["insert"]): None,
+    }
+    summary = loaders.get_change_log("2025-07", "empresas")
+    assert dict(zip(summary["op"], summary["linhas"])) == {"delete": 1, "insert": 1, "update": 1}
+
+    with db.reader() as con:
+        assert con.execute("SELECT COUNT(*) FROM empresas").fetchone()[0] == before
+        names = dict(con.execute(
+            "SELECT cnpj_basico, razao_social FROM empresas WHERE cnpj_basico IN (?, ?, ?)",
+            (diff["delete"], diff["update"], diff["insert"]),
+        ).fetchall())
+        assert names == {diff["update"]: ALTERADA, diff["insert"]: NOVA}
+        # derivada atualizada nas chaves alteradas
+        assert {r[0] for r in con.execute(
+            "SELECT DISTINCT razao_social FROM estabelecimentos_enriched WHERE cnpj_basico = ?", (diff["update"],)
+        ).fetchall()} <= {ALTERADA}
+        keys = loaders.changed_keys_sql("empresas", "2025-07", ("insert", "update"))
+        changed = con.execute(f"SELECT cnpj_basico FROM empresas WHERE cnpj_basico IN {keys}").fetchall()
+        assert {r[0] for r in changed} == {diff["update"], diff["insert"]}
+    # índice de busca atualizado só nas chaves alteradas
+    assert diff["insert"] in set(search.search(NOVA, ["empresas"])["cnpj_basico"].astype(int))
+    assert diff["update"] in set(search.search(ALTERADA, ["empresas"])["cnpj_basico"].astype(int))
+
+
+def test_reapplying_month_replaces_log(julho):
+    server, diff = julho
+    month = dict(targets=["empresas"], base_url=server.url, incremental=True, convert_workers=2, threads=1)
+    loaders.prepare_all_for_month(2025, 7, **month)
+
+    # o mesmo mês republicado com a alteração desfeita: o change_log de 2025-07 passa a ter só o novo diff
+    def undo(lines):
+        fields = _fields(lines[0])
+        fields[1] = "RAZAO SOCIAL CORRIGIDA"
+        return [_line(fields)] + lines[1:]
+
+    _edit_zip(server.root / "2025-07" / "Empresas0.zip", undo)
+    loaders.prepare_all_for_month(2025, 7, **month)
+    assert _log("2025-07") == {("update", diff["update"]): ["razao_social"]}
+    with db.reader() as con:
+        assert con.execute(
+            "SELECT razao_social FROM empresas WHERE cnpj_basico = ?", (diff["update"],)
+        ).fetchone()[0] == "RAZAO SOCIAL CORRIGIDA"
@@ -0,0 +1,76 @@
+# tests/test_jobs.py
+# Fila de cargas (lib/jobs): deduplicação, trava por dataset, execução por um worker, novas tentativas
+# e cancelamento.
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from lib import db, jobs
+
+EMPRESAS = b'"00000001";"ALFA";"2062";"49";"0,00";"01";""\n"00000002";"BETA";"2062";"49";"0,00";"01";""\n'
+
+
+@pytest.fixture
+def fila(workdir, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_PATH", workdir / "data" / "jobs.sqlite")
+    monkeypatch.setattr(jobs, "UPLOAD_DIR", workdir / "data" / "jobs" / "uploads")
+    monkeypatch.setattr(jobs, "RETRY_BACKOFF_S", 0)
+    return workdir
+
+
+def _drain() -> None:
+    jobs.work("teste", threading.Event(), once=True)
+
+
+def test_upload_job_runs_once(fila):
+    job_id = jobs.enqueue_upload(EMPRESAS, "empresas", kind="csv")
+    assert jobs.enqueue_upload(EMPRESAS, "empresas", kind="csv") == job_id  # mesmo arquivo: mesmo job
+    assert len(list(jobs.UPLOAD_DIR.iterdir())) == 1
+
+    _drain()
+    job = jobs.get(job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("ok", 1, None)
+    assert job["result"]["parquet"].endswith("empresas.parquet")
+    assert not list(jobs.UPLOAD_DIR.iterdir())  # o upload sai quando o job termina
+    with db.reader() as con:
+        assert con.execute("SELECT COUNT(*) FROM empresas").fetchone()[0] == 2
+
+    # terminado, o mesmo arquivo pode ser enfileirado de novo
+    assert jobs.enqueue_upload(EMPRESAS, "empresas", kind="csv") != job_id
+
+
+def test_dataset_lock(fila):
+    first = jobs.enqueue_zip_url("http://127.0.0.1:9/Empresas0.zip", "empresas")
+    second = jobs.enqueue_upload(EMPRESAS, "empresas", kind="csv")
+    other = jobs.enqueue_zip_url("http://127.0.0.1:9/Cnaes.zip", "cnaes")
+
+    assert jobs.claim("w1")["id"] == first
+    assert jobs.claim("w2")["id"] == other  # 'second' espera: empresas está travado por 'first'
+    assert jobs.claim("w3") is None
+    assert jobs.get(second)["status"] == "na_fila"
+
+
+def test_failed_job_is_retried(fila):
+    job_id = jobs.enqueue("zip_url", {"url": "http://127.0.0.1:9/Empresas0.zip", "name": "empresas"},
+                          ["empresas"], max_attempts=2)
+    _drain()
+    job = jobs.get(job_id)
+    assert (job["status"], job["attempts"]) == ("erro", 2)
+    assert job["error"]
+
+    assert jobs.retry(job_id)
+    assert (jobs.get(job_id)["status"], jobs.get(job_id)["attempts"]) == ("na_fila", 0)
+
+
+def test_cancel_queued(fila):
+    job_id = jobs.enqueue_upload(EMPRESAS, "empresas", kind="csv")
+    assert jobs.cancel(job_id)
+    assert jobs.get(job_id)["status"] == "cancelado"
+    assert not list(jobs.UPLOAD_DIR.iterdir())
+    assert not jobs.cancel(job_id)  # já terminou
+    assert not jobs.retry(job_id)  # o arquivo enviado já foi apagado
+    _drain()
+    assert jobs.get(job_id)["status"] == "cancelado"
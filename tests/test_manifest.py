@@ -0,0 +1,42 @@
+# tests/test_manifest.py
+# lib/manifest: partes inalteradas não são baixadas de novo, a menos que a origem (URL) mude.
+
+from __future__ import annotations
+
+from bench import synth
+from lib import loaders, manifest
+
+
+def _downloads(server) -> list:
+    """ZIPs baixados por inteiro (os CRC32 do diretório central são lidos com Ranges pequenos)."""
+    size = {f"/2025-06/{p.name}": p.stat().st_size for p in (server.root / "2025-06").iterdir()}
+    return [path for method, path, rng in server.requests if method == "GET" and rng == f"bytes=0-{size[path] - 1}"]
+
+
+def test_unchanged_parts_are_skipped_per_url(rfb_server, workdir):
+    synth.generate(rfb_server.root, datasets=["naturezas", "paises"], year_month="2025-06")
+    loaders.prepare_all_for_month(2025, 6, ["naturezas", "paises"], base_url=rfb_server.url, convert_workers=1)
+    assert sorted(_downloads(rfb_server)) == ["/2025-06/Naturezas.zip", "/2025-06/Paises.zip"]
+
+    # mesma origem, mesmos cabeçalhos: nada é baixado
+    rfb_server.requests.clear()
+    loaders.prepare_all_for_month(2025, 6, ["naturezas", "paises"], base_url=rfb_server.url, convert_workers=1)
+    assert _downloads(rfb_server) == []
+
+    # mesmo servidor (mesmo tamanho e ETag) por outra URL: é outra origem, baixa de novo
+    mirror = rfb_server.url.replace("127.0.0.1", "localhost")
+    rfb_server.requests.clear()
+    loaders.prepare_all_for_month(2025, 6, ["naturezas"], base_url=mirror, convert_workers=1)
+    assert _downloads(rfb_server) == ["/2025-06/Naturezas.zip"]
+    assert manifest.get_entry("naturezas/Naturezas")["url"] == f"{mirror}/2025-06/Naturezas.zip"
+
+
+def test_republished_identical_zip_is_skipped(rfb_server, workdir):
+    synth.generate(rfb_server.root, datasets=["paises"], year_month="2025-06")
+    loaders.prepare_all_for_month(2025, 6, ["paises"], base_url=rfb_server.url, convert_workers=1)
+    # mesmo conteúdo gravado de novo: ETag muda, os CRC32 do diretório central decidem (sem baixar)
+    zip_path = rfb_server.root / "2025-06" / "Paises.zip"
+    zip_path.write_bytes(zip_path.read_bytes())
+    rfb_server.requests.clear()
+    loaders.prepare_all_for_month(2025, 6, ["paises"], base_url=rfb_server.url, convert_workers=1)
+    assert _downloads(rfb_server) == []
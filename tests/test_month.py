@@ -0,0 +1,42 @@
+# tests/test_month.py
+# lib/loaders.prepare_all_for_month sobre os ZIPs de bench/synth.py servidos por tests/conftest.py.
+
+from __future__ import annotations
+
+import zipfile
+
+from bench import synth
+from lib import db, loaders
+from lib.schema import DATASETS
+
+SCALE = 0.00002
+
+
+def _lines(zip_path) -> int:
+    with zipfile.ZipFile(zip_path) as z:
+        return sum(z.read(name).count(b"\n") for name in z.namelist())
+
+
+def test_prepare_all_for_month(rfb_server, workdir):
+    synth.generate(rfb_server.root, scale=SCALE, year_month="2025-06")
+    parts = loaders.month_parts(2025, 6, base_url=rfb_server.url)
+
+    done = loaders.prepare_all_for_month(
+        2025, 6, base_url=rfb_server.url, download_workers=2, convert_workers=2, threads=1
+    )
+    assert sorted(done) == sorted((dataset, part) for dataset, part, _ in parts)
+    expected = dict.fromkeys(DATASETS, 0)
+    for dataset, part, _ in parts:
+        expected[dataset] += _lines(rfb_server.root / "2025-06" / f"{part}.zip")
+    with db.reader() as con:
+        loaded = {d: con.execute(f"SELECT COUNT(*) FROM {d}").fetchone()[0] for d in DATASETS}
+    assert loaded == expected
+
+    catalog = loaders.get_catalog()
+    assert len(catalog) == len(parts)
+    assert set(catalog["status"]) == {"carregado"}
+
+    # mês inalterado: nenhuma parte é baixada de novo
+    rfb_server.requests.clear()
+    loaders.prepare_all_for_month(2025, 6, base_url=rfb_server.url, download_workers=2, convert_workers=2)
+    assert not [r for r in rfb_server.requests if r[0] == "GET"]
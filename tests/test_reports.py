@@ -0,0 +1,80 @@
+# tests/test_reports.py
+# lib/reports.generate sobre o mês de tests/conftest.py: encontrados, não encontrados e inválidos.
+
+from __future__ import annotations
+
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from lib import db, reports
+
+
+@pytest.fixture
+def lista(loaded) -> dict:
+    with db.reader() as con:
+        basicos = [r[0] for r in con.execute(
+            "SELECT LPAD(CAST(cnpj_basico AS VARCHAR), 8, '0') FROM empresas ORDER BY cnpj_basico LIMIT 3"
+        ).fetchall()]
+        cnpj14 = con.execute(
+            "SELECT cnpj14 FROM estabelecimentos_enriched WHERE cnpj_basico > 100 ORDER BY cnpj14 LIMIT 1"
+        ).fetchone()[0]
+    return {
+        "basicos": basicos,
+        "cnpj14": cnpj14,
+        "valores": [
+            "CNPJ",  # cabeçalho: descartado
+            f"{basicos[0][:2]}.{basicos[0][2:5]}.{basicos[0][5:]}",  # com máscara
+            basicos[1],
+            basicos[1],  # repetido: um relatório só
+            cnpj14.lstrip("0"),  # zeros à esquerda perdidos na planilha
+            "99999999",  # CNPJ básico sem empresa
+            cnpj14[:8] + "999999",  # empresa existe, estabelecimento não
+            "123",  # inválido (menos de 8 dígitos)
+            "1" * 15,  # inválido (mais de 14)
+        ],
+    }
+
+
+def _motivos(missing: pd.DataFrame) -> dict:
+    return dict(zip(missing["entrada"], missing["motivo"]))
+
+
+def test_zip_report(lista, tmp_path):
+    res = reports.generate(lista["valores"], "zip", out_dir=tmp_path / "rel")
+    found = {lista["basicos"][0], lista["basicos"][1], lista["cnpj14"][:8]}
+    assert res["entradas"] == 8
+    assert res["encontrados"] == len(found)
+    assert _motivos(res["missing"]) == {
+        "99999999": "CNPJ básico não encontrado",
+        lista["cnpj14"][:8] + "999999": "estabelecimento não encontrado",
+        "123": "inválido",
+        "1" * 15: "inválido",
+    }
+    with zipfile.ZipFile(res["path"]) as z:
+        names = set(z.namelist())
+        assert {n.split("/")[0] for n in names if "/" in n} == found
+        for basico in found:
+            assert {f"{basico}/{s}.csv" for s in ("empresa", "estabelecimentos", "socios", "simples")} <= names
+        missing = pd.read_csv(io.BytesIO(z.read("nao_encontrados.csv")), sep=";", dtype=str)
+    assert len(missing) == 4
+
+
+def test_parquet_report(lista, tmp_path):
+    res = reports.generate(lista["valores"], "parquet", out_dir=tmp_path / "rel")
+    assert res["encontrados"] == 3
+    with db.memory() as con:
+        basicos = {r[0] for r in con.execute(
+            f"SELECT DISTINCT cnpj_basico FROM read_parquet('{res['path']}/empresa/*/*.parquet')"
+        ).fetchall()}
+    assert basicos == {lista["basicos"][0], lista["basicos"][1], lista["cnpj14"][:8]}
+    assert reports.pack(res["path"]).suffix == ".zip"
+
+
+def test_only_basic_cnpjs(lista, tmp_path):
+    # lista só de CNPJs básicos: cnpj14 todo nulo na tabela do lote
+    res = reports.generate(lista["basicos"] + ["99999999"], "zip", out_dir=tmp_path / "rel")
+    assert res["encontrados"] == 3
+    assert _motivos(res["missing"]) == {"99999999": "CNPJ básico não encontrado"}
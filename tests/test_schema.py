@@ -0,0 +1,60 @@
+# tests/test_schema.py
+# Carga tipada (lib/schema.TIPOS): tipos das colunas, conversões e o relatório de validação dos valores
+# que não converteram.
+
+from __future__ import annotations
+
+import datetime
+from decimal import Decimal
+
+from lib import db, loaders
+
+# cnpj_basico;razao_social;natureza;qualif;capital;porte;efr
+EMPRESAS = (
+    '"00000001";"ALFA";"2062";"49";"1000,50";"01";""\n'
+    '"00000002";"BETA";"XX";"49";"abc";"03";""\n'  # natureza e capital inválidos
+    '"00000003";"GAMA";"2135";"";"0,00";"05";""\n'
+)
+# cnpj_basico;opcao_simples;data_opcao;data_exclusao;opcao_mei;data_opcao_mei;data_exclusao_mei
+SIMPLES = (
+    '"00000001";"S";"20200131";"00000000";"N";"0";"0"\n'
+    '"00000002";"N";"20201340";"";"N";"";""\n'  # data de opção inválida
+)
+
+
+def _types(con, table: str) -> dict:
+    return dict(con.execute(
+        "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = ?", (table,)
+    ).fetchall())
+
+
+def test_typed_columns_and_validation_report(workdir):
+    parquet = loaders.prepare_from_uploaded_csv_bytes(EMPRESAS.encode("latin1"), "empresas")
+    with db.reader() as con:
+        types = _types(con, "empresas")
+        rows = con.execute(
+            "SELECT cnpj_basico, natureza_juridica, qualif_responsavel, capital_social FROM empresas ORDER BY 1"
+        ).fetchall()
+    assert (types["cnpj_basico"], types["natureza_juridica"], types["capital_social"]) == (
+        "INTEGER", "SMALLINT", "DECIMAL(18,2)"
+    )
+    assert rows == [(1, 2062, 49, Decimal("1000.50")), (2, None, 49, None), (3, 2135, None, Decimal("0.00"))]
+
+    report = loaders.load_validation_report(parquet)
+    assert report["rows"] == 3 and report["invalid_rows_max"] == 1
+    assert report["columns"]["natureza_juridica"] == {"type": "SMALLINT", "invalid": 1, "example": "XX"}
+    assert report["columns"]["capital_social"] == {"type": "decimal", "invalid": 1, "example": "abc"}
+    assert report["columns"]["qualif_responsavel"]["invalid"] == 0  # vazio é nulo, não inválido
+
+
+def test_dates(workdir):
+    parquet = loaders.prepare_from_uploaded_csv_bytes(SIMPLES.encode("latin1"), "simples")
+    with db.reader() as con:
+        assert _types(con, "simples")["data_opcao_simples"] == "DATE"
+        rows = con.execute(
+            "SELECT data_opcao_simples, data_exclusao_simples FROM simples ORDER BY cnpj_basico"
+        ).fetchall()
+    assert rows == [(datetime.date(2020, 1, 31), None), (None, None)]
+    report = loaders.load_validation_report(parquet)
+    assert report["columns"]["data_opcao_simples"] == {"type": "data", "invalid": 1, "example": "20201340"}
+    assert report["columns"]["data_exclusao_simples"]["invalid"] == 0  # '00000000' é nulo
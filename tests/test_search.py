@@ -0,0 +1,52 @@
+# tests/test_search.py
+# Busca por nome (lib/search) sobre o mês de tests/conftest.py: o índice de termos devolve os mesmos nomes
+# que a varredura, sem acento nem caixa, e o termo exato vem antes do trecho.
+
+from __future__ import annotations
+
+import pytest
+
+from lib import db, loaders, search
+
+
+def _scan(term: str, table: str) -> set:
+    sql, params = search._scan_sql(table, search.normalize(term).split())
+    with db.reader() as con:
+        return {(r[1], r[3]) for r in con.execute(sql, params).fetchall()}
+
+
+def _indexed(term: str, table: str) -> set:
+    sql, params = search.search_sql(term, [table])
+    with db.reader() as con:
+        rows = con.execute(f"SELECT fonte, cnpj_basico, cnpj14, nome FROM ({sql})", params).fetchall()
+    return {(r[1], r[3]) for r in rows}
+
+
+@pytest.fixture
+def nome(loaded) -> str:
+    """Uma razão social com acento (as buscas abaixo são sem acento e em minúsculas)."""
+    with db.reader() as con:
+        return con.execute(
+            "SELECT razao_social FROM empresas WHERE razao_social <> STRIP_ACCENTS(razao_social) "
+            "ORDER BY cnpj_basico LIMIT 1"
+        ).fetchone()[0]
+
+
+def test_index_matches_scan(nome):
+    assert all(search.has_index(t) for t in search.FONTES)
+    words = search.normalize(nome).split()
+    for term in (" ".join(words), words[0][:3], words[-1].upper()):
+        for table in search.FONTES:
+            assert _indexed(term, table) == _scan(term, table), (term, table)
+    found = search.search(search.normalize(nome), ["empresas"], k=1000)
+    assert nome in set(found["nome"])
+
+
+def test_ranking_and_accents(workdir):
+    nomes = ["COMPAO LTDA", "PAOLA COMERCIO", "PADARIA PAO QUENTE", "PANIFICAÇÃO SÃO JOÃO"]
+    csv = "".join(f'"{b:08d}";"{n}";"2062";"49";"0,00";"01";""\n' for b, n in enumerate(nomes, 1))
+    loaders.prepare_from_uploaded_csv_bytes(csv.encode("latin1"), "empresas")
+    assert search.has_index("empresas")
+    # termo exato > prefixo > trecho
+    assert list(search.search("pao", ["empresas"])["nome"]) == ["PADARIA PAO QUENTE", "PAOLA COMERCIO", "COMPAO LTDA"]
+    assert list(search.search("Sao  JOAO!", ["empresas"])["nome"]) == ["PANIFICAÇÃO SÃO JOÃO"]
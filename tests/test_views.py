@@ -0,0 +1,79 @@
+# tests/test_views.py
+# Modo "view" (lib/storage.MODE): cada carga grava uma versão nova dos Parquets, troca as views publicadas
+# no catálogo de serviço e remove as versões antigas; leitores de qualquer processo passam a ver a nova.
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from lib import db, loaders, search, storage
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _empresas(n: int, nome: str) -> bytes:
+    # cnpj_basico;razao_social;natureza;qualif;capital;porte;efr
+    linhas = (f'"{b:08d}";"{nome} {b}";"2062";"49";"1000,00";"01";""\n' for b in range(1, n + 1))
+    return "".join(linhas).encode("latin1")
+
+
+def _count(con) -> int:
+    return con.execute("SELECT COUNT(*) FROM empresas").fetchone()[0]
+
+
+@pytest.fixture
+def views(workdir, monkeypatch):
+    monkeypatch.setattr(storage, "MODE", "view")
+    return workdir
+
+
+def test_loads_swap_versions(views):
+    seen = []
+    for n in (10, 20, 30):
+        parquet = loaders.prepare_from_uploaded_csv_bytes(_empresas(n, "EMPRESA"), "empresas")
+        with db.reader() as con:
+            assert _count(con) == n
+        assert str(storage.version_of(parquet)) in db.published("empresas")
+        seen.append(storage.version_of(parquet).name)
+        # fica a versão atual e a anterior (consultas que começaram antes da troca)
+        assert [v.name for v in storage.versions(views / "data" / "empresas")] == seen[-2:]
+
+    # o dado não é copiado para o arquivo do banco
+    with db.file_reader() as con:
+        assert not con.execute("SELECT 1 FROM information_schema.tables WHERE table_name = 'empresas'").fetchone()
+
+    # derivadas do índice de busca: versionadas do mesmo jeito, publicadas na última
+    docs = search._tables("empresas")[0]
+    derived = storage.versions(views / "data" / "derivadas" / docs)
+    assert 1 <= len(derived) <= 2
+    assert str(derived[-1]) in db.published(docs)
+    assert len(search.search("EMPRESA 30", ["empresas"])) >= 1
+
+
+def test_reader_sees_load_from_another_process(views):
+    loaders.prepare_from_uploaded_csv_bytes(_empresas(10, "ANTIGA"), "empresas")
+    with db.reader() as con:
+        assert _count(con) == 10
+    db.close()  # libera o lock do arquivo para a carga do outro processo
+
+    csv = views / "empresas.csv"
+    csv.write_bytes(_empresas(25, "NOVA"))
+    env = {**os.environ, "PYTHONPATH": str(ROOT), "CNPJ_STORAGE_MODE": "view"}
+    r = subprocess.run([sys.executable, "-c", (
+        "import sys\n"
+        "from lib import db, loaders\n"
+        "db.configure(path=sys.argv[1])\n"
+        "loaders.prepare_from_uploaded_csv_bytes(open(sys.argv[2], 'rb').read(), 'empresas')\n"
+    ), db.DB_PATH, str(csv)], cwd=views, env=env, capture_output=True, text=True, timeout=600)
+    assert r.returncode == 0, r.stderr
+
+    # as views deste processo foram sincronizadas antes da carga: a próxima leitura pega o catálogo novo
+    with db.reader() as con:
+        assert _count(con) == 25
+        assert con.execute("SELECT MIN(razao_social) FROM empresas").fetchone()[0].startswith("NOVA")
+    assert len(storage.versions(views / "data" / "empresas")) == 2